@@ -1,16 +1,14 @@
 
-import re
+import numpy as np
+from model_engine import parse_parameters
+from validation.standardizer import FIELD_MAP
+
 def extract_parameters(text):
-    patterns = {
-        "Hemoglobin": r"HEMOGLOBIN\s*:\s*(\d+\.?\d*)",
-        "Glucose": r"GLUCOSE\s*:\s*(\d+)",
-        "Cholesterol": r"CHOLESTEROL\s*:\s*(\d+)",
-        "WBC": r"TOTAL LEUKOCYTE COUNT\s*:\s*(\d+)",
-        "Platelets": r"PLATELET COUNT\s*:\s*(\d+\.?\d*)"
-    }
+    # one parser for the whole project: model_engine's, reported under the Milestone-1 names
+    parsed = parse_parameters(text)
     data = {}
-    for k,p in patterns.items():
-        m = re.search(p, text, re.I)
-        if m:
-            data[k] = float(m.group(1))
+    for k,field in FIELD_MAP.items():
+        v = parsed.get(field, np.nan)
+        if not np.isnan(v):
+            data[k] = v
     return data
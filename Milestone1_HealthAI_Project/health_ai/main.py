@@ -1,25 +1,59 @@
 import os
-from extraction.ocr_engine import extract_text
-from extraction.parameter_extractor import extract_parameters
-from validation.standardizer import standardize
+import sys
+
+# the pipeline and model_engine live at the repo root, shared with the app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from pipeline import default_pipeline
+from executor import PipelinedExecutor
+from profiling import PROFILE_ENV, format_hotspots, profile_from_env
+from report_cache import dedupe_directory
+from extraction import ocr_engine  # noqa: F401  (points pytesseract at the local Tesseract install)
 from models.model1_parameter_interpreter import interpret
 
 IMAGE_FOLDER = "data/images"
 
 print("\n===== Milestone-1: Batch Blood Report Analysis =====\n")
 
-for file in os.listdir(IMAGE_FOLDER):
-    if file.endswith(".png") or file.endswith(".jpg"):
-        image_path = os.path.join(IMAGE_FOLDER, file)
+# --profile [DIR] (or HEALTH_AI_PROFILE=DIR): per-stage cProfile stats, collapsed stacks and hotspots
+if "--profile" in sys.argv:
+    i = sys.argv.index("--profile")
+    nxt = sys.argv[i + 1] if i + 1 < len(sys.argv) else ""
+    os.environ[PROFILE_ENV] = nxt if nxt and not nxt.startswith("--") else "profile_out"
 
-        print(f"Processing: {file}")
+pipeline, profiler = profile_from_env(default_pipeline())
 
-        text = extract_text(image_path)
-        params = extract_parameters(text)
-        clean = standardize(params)
-        result = interpret(clean)
+# byte-identical copies of one scan are processed once
+batch = dedupe_directory(IMAGE_FOLDER, extensions=(".png", ".jpg"))
+for kept, dupes in batch["duplicates"].items():
+    print(f"Skipping {len(dupes)} duplicate(s) of {os.path.basename(kept)}: "
+          f"{', '.join(os.path.basename(p) for p in dupes)}")
 
-        for k, v in result.items():
-            print(f"  {k}: {v['value']} -> {v['status']}")
+docs = [{"path": path} for path in batch["unique"]]
 
+# OCR of the next images overlaps parsing/scoring of the previous ones
+executor = PipelinedExecutor(pipeline, stop="synthesize")
+
+for doc in executor.run(docs):
+    print(f"Processing: {doc['name']}")
+    if "error" in doc:
+        print(f"  Failed: {doc['error']}")
         print("-" * 50)
+        continue
+
+    result = interpret(doc["parsed"])
+
+    for k, v in result.items():
+        print(f"  {k}: {v['value']} -> {v['status']}")
+    print(f"  Findings: {doc['report_row']['Findings_Paragraph']}")
+
+    print("-" * 50)
+
+print("\nStage throughput:")
+for stage, s in executor.stats().items():
+    print(f"  {stage}: {s['docs']} docs, {s['busy_s']}s busy, {s['docs_per_s']} docs/s per worker")
+
+if profiler is not None:
+    profiler.stop()
+    print(f"\nProfile written to {profiler.dump()}/")
+    print(format_hotspots(profiler.hotspots(top=5)))
@@ -1,3 +1,17 @@
 
-def standardize(data):
-    return {k:v for k,v in data.items() if isinstance(v,(int,float))}
+from unit_normalizer import normalize_units
+
+# Milestone-1 parameter names -> model_engine fields (whose names carry the canonical unit)
+FIELD_MAP = {
+    "Hemoglobin": "Hemoglobin_g_dL",
+    "Glucose": "Fasting_Glucose_mg_dL",
+    "Cholesterol": "Total_Cholesterol_mg_dL",
+    "WBC": "WBC_cells_uL",
+    "Platelets": "Platelets_lakh_uL",
+}
+
+def standardize(data, text=""):
+    clean = {k:v for k,v in data.items() if isinstance(v,(int,float))}
+    fields = {FIELD_MAP.get(k,k):v for k,v in clean.items()}
+    norm = normalize_units(fields, text)
+    return {k:norm[FIELD_MAP.get(k,k)] for k in clean}
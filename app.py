@@ -1,15 +1,16 @@
 # app.py
 import streamlit as st
-import pandas as pd
-import numpy as np
-from io import BytesIO
-from PIL import Image
-import pytesseract
-from pdf2image import convert_from_bytes
-import requests
-import json
 import traceback
 import html as _html
+import os
+
+from report_cache import ReportCache
+from pipeline import build_pipeline
+from profiling import profile_from_env
+from llm_client import OllamaClient, is_health_related, recommendation_prompt
+from retrieval import ChatRetriever
+from jobs import JobQueue, STATUS_DONE, FINISHED
+import report_service
 
 # ---------------------------
 # Try to import model_engine (preferred). If it fails, create fallbacks so UI still works.
@@ -21,200 +22,140 @@ try:
         parse_parameters,
         generate_pdf_bytes_from_row,
     )
+    from unit_normalizer import UnitProfiles, normalize_batch
+    from ocr_confidence import extract_with_confidence
+    from reference_ranges import ReferenceRanges
     IMPORT_ERROR = None
 except Exception as e:
     IMPORT_ERROR = str(e)
 
     # --- Minimal fallback parse / model / pdf functions (keeps UI working) ---
-    def parse_parameters(text: str) -> dict:
-        import re
-
-        def extract_numeric(labels):
-            for lab in labels:
-                m = re.search(rf"{re.escape(lab)}[^\d\.\-]*([\-+]?\d*\.?\d+)", text, re.IGNORECASE)
-                if m:
-                    try:
-                        return float(m.group(1))
-                    except:
-                        pass
-            return np.nan
-
-        def extract_text(labels):
-            for lab in labels:
-                m = re.search(rf"{re.escape(lab)}[^\n\r:]*[:\-]?\s*([^\n\r]+)", text, re.IGNORECASE)
-                if m:
-                    return m.group(1).strip()
-            return ""
-
-        out = {}
-        out["Patient_ID"] = extract_text(["Patient ID", "Patient No", "Patient Number"]) or ""
-        out["Patient_Name"] = extract_text(["Patient Name", "Name"]) or "Patient"
-        age = extract_numeric(["Age"])
-        out["Age"] = int(age) if not np.isnan(age) else np.nan
-        out["Gender"] = extract_text(["Gender", "Sex"]) or ""
-
-        out["Hemoglobin_g_dL"] = extract_numeric(["Hemoglobin", r"\bHb\b"])
-        out["Triglycerides_mg_dL"] = extract_numeric(["Triglycerides", "TG"])
-        out["LDL_mg_dL"] = extract_numeric(["LDL"])
-        out["HDL_mg_dL"] = extract_numeric(["HDL"])
-        out["CRP_mg_L"] = extract_numeric(["CRP", "C-reactive protein"])
-        out["eGFR_mL_min_1_73m2"] = extract_numeric(["eGFR"])
-        out["Peripheral_Smear_Result"] = extract_text(["Peripheral Smear Result", "Peripheral Smear"])
-        out["Provisional_Diagnosis"] = extract_text(["Provisional Diagnosis", "Diagnosis"])
-        return out
-
-    def run_models_on_df(df):
-        df = df.copy()
-        df["Triglycerides_mg_dL"] = pd.to_numeric(df.get("Triglycerides_mg_dL"), errors="coerce")
-        df["LDL_mg_dL"] = pd.to_numeric(df.get("LDL_mg_dL"), errors="coerce")
-        df["HDL_mg_dL"] = pd.to_numeric(df.get("HDL_mg_dL"), errors="coerce")
-
-        def cardio_score(r):
-            s = 0
-            ldl = r.get("LDL_mg_dL")
-            hdl = r.get("HDL_mg_dL")
-            tg = r.get("Triglycerides_mg_dL")
-            if pd.notna(ldl) and ldl > 160:
-                s += 3
-            elif pd.notna(ldl) and ldl > 130:
-                s += 2
-            if pd.notna(hdl) and hdl < 40:
-                s += 2
-            if pd.notna(tg) and tg > 200:
-                s += 1
-            return s
-
-        df["Cardiovascular_Risk_Score"] = df.apply(cardio_score, axis=1)
-        df["Infection_Severity"] = df.get("CRP_mg_L").apply(
-            lambda x: "High" if pd.notna(x) and x > 100 else ("Moderate" if pd.notna(x) and x > 10 else "Low")
-        ) if "CRP_mg_L" in df else "Low"
-        df["Liver_Injury_Flag"] = False
-        df["Kidney_Risk_Stage"] = None
-        df["Metabolic_Syndrome_Flags"] = 0
-        df["TC_HDL_Ratio"] = np.nan
-        df["Adjusted_Cardiovascular_Risk"] = df["Cardiovascular_Risk_Score"]
-        return df
-
-    def synthesize_and_recommend_df(df):
-        rows = []
-        for _, r in df.iterrows():
-            findings = []
-            severity_score = 0
-            tg = r.get("Triglycerides_mg_dL")
-            if pd.notna(tg) and tg > 200:
-                findings.append(("high_tg", f"High triglycerides ({int(tg)} mg/dL)"))
-                severity_score += 1
-            ldl = r.get("LDL_mg_dL")
-            if pd.notna(ldl) and ldl >= 160:
-                findings.append(("high_ldl", f"Markedly elevated LDL ({int(ldl)} mg/dL)"))
-                severity_score += 3
-            cv = r.get("Cardiovascular_Risk_Score", 0)
-            if cv and cv > 0:
-                findings.append(("cv_score", f"Cardiovascular Risk score: {int(cv)}"))
-                severity_score += int(cv)
-            if severity_score >= 8:
-                sev = "high"
-            elif severity_score >= 4:
-                sev = "moderate"
-            else:
-                sev = "low"
-            paragraph = " | ".join([f[1] for f in findings]) if findings else "No significant findings detected."
-            recs = []
-            for code, text in findings:
-                if code in ("high_tg", "high_ldl", "cv_score"):
-                    recs.append({
-                        "finding_code": code,
-                        "finding_text": text,
-                        "recommendation": ("Lifestyle: reduce saturated fats and trans fats, increase dietary fiber and oily fish; "
-                                           "Exercise: aim for 150 min/week. Follow-up: repeat lipid panel in 6-12 weeks."),
-                        "urgency": "routine"
-                    })
-            rows.append({**r.to_dict(), "Findings_Paragraph": paragraph, "Recommendations_Structured": recs, "Overall_Severity": sev})
-        return pd.DataFrame(rows)
-
-    def generate_pdf_bytes_from_row(row_dict: dict) -> bytes:
-        """Fallback PDF builder (ReportLab) which supports LLM recommendations and chat history if present."""
-        try:
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, ListFlowable, ListItem
-            from reportlab.lib.styles import getSampleStyleSheet
-            from reportlab.lib.pagesizes import A4
-            from reportlab.lib.units import cm
-        except Exception:
-            return b""
-
-        buf = BytesIO()
-        doc = SimpleDocTemplate(buf, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
-        styles = getSampleStyleSheet()
-        story = []
-
-        # Title
-        story.append(Paragraph("<b>Personalized Health Recommendation Report</b>", styles["Title"]))
-        story.append(Spacer(1, 12))
-
-        # Findings
-        story.append(Paragraph("<b>Synthesized Findings</b>", styles["Heading2"]))
-        story.append(Spacer(1, 6))
-        story.append(Paragraph(row_dict.get("Findings_Paragraph", "No findings."), styles["BodyText"]))
-        story.append(Spacer(1, 12))
-
-        # Overall severity
-        story.append(Paragraph(f"<b>Overall Severity:</b> {str(row_dict.get('Overall_Severity','unknown')).capitalize()}", styles["BodyText"]))
-        story.append(Spacer(1, 12))
-
-        # Deterministic recommendations
-        recs = row_dict.get("Recommendations_Structured", [])
-        if recs:
-            story.append(Paragraph("<b>Recommendations</b>", styles["Heading2"]))
-            story.append(Spacer(1, 6))
-            items = []
-            for r in recs:
-                text = f"<b>Finding:</b> {r.get('finding_text','')}<br/><b>Recommendation:</b> {r.get('recommendation','')}<br/><b>Urgency:</b> {r.get('urgency','routine').capitalize()}"
-                items.append(ListItem(Paragraph(text, styles["BodyText"])))
-            story.append(ListFlowable(items, bulletType="bullet"))
-            story.append(Spacer(1, 12))
-
-        # LLM expanded recommendations (if provided)
-        llm_text = row_dict.get("LLM_Expanded_Recommendations")
-        if llm_text:
-            story.append(Paragraph("<b>LLM Expanded Recommendations</b>", styles["Heading2"]))
-            story.append(Spacer(1, 6))
-            for chunk in (llm_text if isinstance(llm_text, list) else [llm_text]):
-                story.append(Paragraph(str(chunk), styles["BodyText"]))
-                story.append(Spacer(1, 6))
-
-        # Chat history
-        chat = row_dict.get("Chat_History")
-        if chat:
-            story.append(Paragraph("<b>Assistant Conversation (chat)</b>", styles["Heading2"]))
-            story.append(Spacer(1, 6))
-            for role, text in chat:
-                entry = f"<b>{role.capitalize()}:</b> {text}"
-                story.append(Paragraph(entry, styles["BodyText"]))
-                story.append(Spacer(1, 4))
-
-        # Disclaimer
-        story.append(Spacer(1, 12))
-        story.append(Paragraph("<b>Disclaimer</b>", styles["Heading3"]))
-        story.append(Paragraph("This report is generated by an automated system for research and educational purposes only. It does not replace professional medical advice. Always consult a qualified healthcare provider before making medical decisions.", styles["BodyText"]))
-
-        doc.build(story)
-        buf.seek(0)
-        return buf.read()
+    from fallback_engine import (
+        run_models_on_df,
+        synthesize_and_recommend_df,
+        parse_parameters,
+        generate_pdf_bytes_from_row,
+        normalize_batch,
+    )
+    UnitProfiles = None
+    extract_with_confidence = None
+    ReferenceRanges = None
 
 # -------------------------
 # page config and session
 # -------------------------
 st.set_page_config(page_title="AI Health Diagnostics", page_icon="🩺", layout="wide")
 
-# session defaults
-if "report_row" not in st.session_state:
-    st.session_state["report_row"] = None  # will hold a plain dict when present
+# session defaults: only ids, the chat and this user's outputs; reports live in the shared cache
 if "pdf" not in st.session_state:
     st.session_state["pdf"] = None
 if "chat_history" not in st.session_state:
     st.session_state["chat_history"] = []  # list of tuples (role, text)
 if "last_llm_recommendation" not in st.session_state:
     st.session_state["last_llm_recommendation"] = None
+if "llm_state" not in st.session_state:
+    st.session_state["llm_state"] = None  # Ollama context of this session's chat (reused between turns)
+if "report_key" not in st.session_state:
+    st.session_state["report_key"] = None  # ReportCache entry id of the current report
+if "jobs" not in st.session_state:
+    st.session_state["jobs"] = {}  # slot ("ocr", "llm", "pdf") -> {"id": background job id, ...}
+
+
+# Process-wide: a report already processed for any session is reused on re-upload
+@st.cache_resource
+def get_report_cache():
+    return ReportCache(max_entries=256)
+
+
+report_cache = get_report_cache()
+
+
+# One pooled HTTP session to the local Ollama server for all users
+@st.cache_resource
+def get_llm_client():
+    return OllamaClient()
+
+
+llm_client = get_llm_client()
+
+
+# BM25 index over the bundled guideline corpus; per-report indexes live on the cache entries
+@st.cache_resource
+def get_retriever():
+    return ChatRetriever()
+
+
+retriever = get_retriever()
+
+# Word-level OCR with per-field confidence and targeted re-reads (OCR_CONFIDENCE=0 for plain image_to_string)
+OCR_CONFIDENCE = os.environ.get("OCR_CONFIDENCE", "1") != "0"
+
+
+# PDF rasterization: pages rendered one at a time, grayscale, DPI capped (RASTER_DPI, default 200).
+# LAB_PAGES_ONLY=1 probes each page first and skips blank and non-lab pages (an extra tesseract pass per page)
+RASTER_OPTIONS = {"dpi": int(os.environ.get("RASTER_DPI", "200")),
+                  "lab_pages_only": os.environ.get("LAB_PAGES_ONLY", "0") == "1"}
+
+
+# Optional per-lab default units (JSON: {"Lab name": {"Field": "unit"}}), shared by all sessions
+@st.cache_resource
+def get_unit_profiles():
+    if UnitProfiles is None:
+        return None
+    path = os.environ.get("UNIT_PROFILES_PATH", "unit_profiles.json")
+    return UnitProfiles.load(path) if os.path.exists(path) else UnitProfiles()
+
+
+# The shared ingest -> ocr -> parse -> validate -> score -> synthesize -> render pipeline,
+# built on model_engine (or the fallbacks above)
+@st.cache_resource
+def get_pipeline():
+    """(pipeline, profiler); the profiler is None unless HEALTH_AI_PROFILE is set."""
+    return profile_from_env(build_pipeline(
+        parse_parameters, run_models_on_df, synthesize_and_recommend_df, generate_pdf_bytes_from_row,
+        normalize=normalize_batch,
+        extract=extract_with_confidence if OCR_CONFIDENCE else None,
+        profiles=get_unit_profiles(),
+        ranges=ReferenceRanges() if ReferenceRanges is not None else None,
+        raster=RASTER_OPTIONS,
+    ))
+
+
+pipeline, profiler = get_pipeline()
+
+# Slow operations (OCR, LLM recommendations, PDF) run as background jobs so a rerun
+# does not block on them or lose them (BACKGROUND_JOBS=0 runs them inline instead).
+# Jobs use model_engine in worker processes, so the fallback analyzer always runs inline.
+BACKGROUND_JOBS = os.environ.get("BACKGROUND_JOBS", "1") != "0" and IMPORT_ERROR is None
+
+
+@st.cache_resource
+def get_job_queue():
+    return JobQueue() if BACKGROUND_JOBS else None
+
+
+job_queue = get_job_queue()
+
+
+def poll_job(slot: str):
+    """
+    (status, job) for this session's job in `slot`: status is None (no job),
+    "queued"/"running", "done" (job["result"] set) or "failed" (job["error"]).
+    A finished job is removed from the session.
+    """
+    job = st.session_state["jobs"].get(slot)
+    if job is None:
+        return None, None
+    info = job_queue.status(job["id"])
+    if info is None:
+        st.session_state["jobs"].pop(slot, None)
+        return "failed", dict(job, error="The background job was lost.")
+    if info["status"] not in FINISHED:
+        return info["status"], job
+    st.session_state["jobs"].pop(slot, None)
+    if info["status"] == STATUS_DONE:
+        return STATUS_DONE, dict(job, result=job_queue.result(job["id"]))
+    return "failed", dict(job, error=info["error"] or info["status"])
 
 # -------------------------
 # Styling (dark look)
@@ -260,23 +201,50 @@ if not uploaded_file:
 
 file_bytes = uploaded_file.read()
 file_name = uploaded_file.name.lower()
-
-# OCR extraction
-extracted_text = ""
-try:
-    if file_name.endswith(".pdf"):
-        images = convert_from_bytes(file_bytes)
-        for img in images:
-            extracted_text += pytesseract.image_to_string(img)
+page_range = ""
+if file_name.endswith(".pdf"):
+    page_range = st.text_input("PDF pages to read (e.g. 1-3,5; empty = all pages)", "", key="page_range").strip()
+
+# OCR extraction (skipped when these exact bytes were OCR'd before, by any session)
+ocr_entry_id, ocr_entry = report_service.cached_ocr(report_cache, file_bytes, page_range)
+if ocr_entry is None and job_queue is None:
+    try:
+        ocr_entry_id, ocr_entry = report_service.ocr_upload(pipeline, report_cache, file_name, file_bytes, page_range)
+    except Exception as e:
+        st.error(f"OCR failed: {e}")
+        st.stop()
+elif ocr_entry is None:
+    # OCR jobs are keyed by the upload: a reloaded page (new session) or another user
+    # with the same file picks up the job already queued, running or finished
+    upload = report_service.upload_key(file_bytes, page_range)
+    job = st.session_state["jobs"].get("ocr")
+    if job is None or job["upload"] != upload:
+        # not cancelled when replaced: other sessions may be waiting on the same job
+        job_id = job_queue.find("ocr", upload) or job_queue.submit(
+            "ocr", file_name, file_bytes, page_range, key=upload, confidence=OCR_CONFIDENCE, raster=RASTER_OPTIONS)
+        st.session_state["jobs"]["ocr"] = {"id": job_id, "upload": upload}
+    status, job = poll_job("ocr")
+    if status == "failed":
+        st.error(f"OCR failed: {job['error']}")
+        st.stop()
+    if status == STATUS_DONE:
+        ocr_entry_id, ocr_entry = report_service.store_ocr(report_cache, file_bytes, page_range, job["result"])
     else:
-        image = Image.open(BytesIO(file_bytes)).convert("RGB")
-        extracted_text = pytesseract.image_to_string(image)
-except Exception as e:
-    st.error(f"OCR failed: {e}")
-    st.stop()
+        # nothing else to show until the text is in
+        st.info(f"Reading the report in the background ({status}).")
+        st.button("Check again", key="ocr_poll_btn")
+        st.stop()
+extracted_text = ocr_entry["ocr_text"]
+page_sources = ocr_entry.get("page_sources") or {}
 
 # Provide non-empty label for accessibility
 st.markdown("### OCR Output (Editable)")
+if page_sources:
+    by_source = {}
+    for page, source in page_sources.items():
+        by_source.setdefault(source, []).append(str(page))
+    labels = {"text": "PDF text layer", "ocr": "OCR", "skipped": "skipped (no lab table)"}
+    st.caption(" · ".join(f"{labels.get(src, src)}: page {', '.join(p)}" for src, p in by_source.items()))
 txt_area_val = st.text_area("OCR output (edit if needed)", extracted_text, height=300, key="ocr_text")
 
 # Right-aligned Run button
@@ -290,35 +258,31 @@ if run_clicked:
     else:
         with st.spinner("Parsing and running models..."):
             try:
-                parsed = parse_parameters(txt_area_val)
-                df_single = pd.DataFrame([parsed])
-
-                # ensure necessary defaults
-                for col in ["Cardiovascular_Risk_Score", "Adjusted_Cardiovascular_Risk", "Metabolic_Syndrome_Flags",
-                            "Infection_Severity", "Liver_Injury_Flag", "Kidney_Risk_Stage", "TC_HDL_Ratio"]:
-                    if col not in df_single.columns:
-                        df_single[col] = "Low" if col == "Infection_Severity" else 0
-
-                df_processed = run_models_on_df(df_single)
-                df_m3 = synthesize_and_recommend_df(df_processed)
-
-                # store as plain dict (avoid pandas Series truth ambiguity)
-                row0_series = df_m3.iloc[0]
-                st.session_state["report_row"] = row0_series.to_dict()
+                # parse + unit normalization + reference ranges, then scoring unless seen before
+                report_id, _ = report_service.run_report(pipeline, report_cache, file_name, txt_area_val, ocr_entry_id)
+                st.session_state["report_key"] = report_id
                 st.session_state["pdf"] = None
                 st.session_state["chat_history"] = []
+                st.session_state["llm_state"] = None
                 st.session_state["last_llm_recommendation"] = None
                 st.success("Report ready — preview below.")
+                if profiler is not None:
+                    profiler.dump()  # cumulative over every run of this server process
             except Exception as e:
                 st.error(f"Model processing failed: {e}")
                 st.error(traceback.format_exc())
-                st.session_state["report_row"] = None
+                st.session_state["report_key"] = None
 
 # -------------------------
 # Preview and LLM + Chat (if report exists)
 # -------------------------
-if st.session_state.get("report_row") is not None:
-    row = st.session_state["report_row"]
+report_entry = report_cache.get(st.session_state.get("report_key"))
+if st.session_state.get("report_key") is not None and (report_entry is None or report_entry.get("report_row") is None):
+    st.info("This report is no longer in the shared cache. Click Run Report again.")
+    st.session_state["report_key"] = None
+
+if st.session_state.get("report_key") is not None:
+    row = report_entry["report_row"]
 
     severity = str(row.get("Overall_Severity", "low")).lower()
     badge_class = "badge-low"
@@ -339,6 +303,12 @@ if st.session_state.get("report_row") is not None:
     </div>
     """, unsafe_allow_html=True)
 
+    if row.get("Low_Confidence_Fields"):
+        st.warning(f"Low OCR confidence for: {row['Low_Confidence_Fields']}. Check these values in the OCR text and re-run if needed.")
+
+    if row.get("Out_Of_Range"):
+        st.markdown(f"**Outside reference range (age/sex-specific):** {_html.escape(str(row['Out_Of_Range']))}")
+
     # Findings
     st.markdown("### Synthesized Findings")
     st.markdown('<div class="report-box">', unsafe_allow_html=True)
@@ -380,60 +350,38 @@ if st.session_state.get("report_row") is not None:
     with colC:
         run_llm_recs = st.button("Generate LLM Recommendations (local)", key="llm_recs_btn", use_container_width=True)
 
-    # Ollama helper (local only)
-    def ask_ollama_raw(prompt: str, model: str = "phi3:mini", timeout: int = 180) -> str:
-        try:
-            url = "http://127.0.0.1:11434/api/generate"
-            payload = {"model": model, "prompt": prompt, "stream": False}
-            res = requests.post(url, json=payload, timeout=timeout)
-            if res.status_code == 200:
-                body = res.json()
-                # Best-effort extraction
-                if isinstance(body, dict):
-                    for k in ("response", "text", "result", "content"):
-                        if k in body and isinstance(body[k], str):
-                            return body[k]
-                    if "choices" in body and isinstance(body["choices"], list) and body["choices"]:
-                        ch = body["choices"][0]
-                        if isinstance(ch, dict) and "text" in ch:
-                            return ch["text"]
-                return json.dumps(body)
-            else:
-                return f"Ollama API returned HTTP {res.status_code}: {res.text}"
-        except Exception as e:
-            return f"Could not contact local Ollama API: {e}"
-
-    def generate_recommendations_via_ollama(summary: str) -> str:
-        prompt = f"""
-You are a responsible AI health assistant.
-
-Based on this structured health analysis:
-
-{summary}
-
-Provide:
-- General lifestyle suggestions (concise).
-- Diet recommendations (concise).
-- Exercise advice (concise).
-
-IMPORTANT:
-- Do NOT diagnose diseases.
-- Do NOT replace medical professionals.
-- Use supportive and safe language.
-"""
-        return ask_ollama_raw(prompt)
-
-    if run_llm_recs:
+    if run_llm_recs and job_queue is None:
         # Only call LLM when user explicitly asked
         with st.spinner("Generating LLM recommendations..."):
             try:
-                summary = row.get("Findings_Paragraph", "") or "No findings."
-                llm_text = generate_recommendations_via_ollama(summary)
+                llm_text = report_service.llm_recommendations(llm_client, report_cache, st.session_state["report_key"], row)
                 st.session_state["last_llm_recommendation"] = llm_text
                 st.success("LLM recommendations generated.")
             except Exception as e:
                 st.error(f"LLM generation failed: {e}")
                 st.session_state["last_llm_recommendation"] = None
+    elif run_llm_recs:
+        llm_text = report_service.cached_llm(report_cache, st.session_state["report_key"])
+        if llm_text:
+            st.session_state["last_llm_recommendation"] = llm_text
+        elif "llm" not in st.session_state["jobs"]:
+            system, prompt = recommendation_prompt(row)
+            job_id = job_queue.submit("llm", prompt, system=system,
+                                      client_options={"url": llm_client.url, "model": llm_client.model})
+            st.session_state["jobs"]["llm"] = {"id": job_id, "report_id": st.session_state["report_key"]}
+
+    if job_queue is not None:
+        status, job = poll_job("llm")
+        if status == STATUS_DONE:
+            report_service.store_llm(report_cache, job["report_id"], job["result"]["text"])
+            if job["report_id"] == st.session_state["report_key"]:
+                st.session_state["last_llm_recommendation"] = job["result"]["text"]
+                st.success("LLM recommendations generated.")
+        elif status == "failed":
+            st.error(f"LLM generation failed: {job['error']}")
+        elif status is not None:
+            st.info(f"LLM recommendations are being generated in the background ({status}).")
+            st.button("Check again", key="llm_poll_btn")
 
     # show the LLM block if present
     if st.session_state.get("last_llm_recommendation"):
@@ -447,17 +395,43 @@ IMPORTANT:
     with col3:
         gen_clicked = st.button("📄 Generate PDF", key="generate_pdf_btn", use_container_width=True)
 
-    if gen_clicked:
+    if gen_clicked and job_queue is not None:
+        merged = report_service.pdf_row(row, llm_text=st.session_state.get("last_llm_recommendation"),
+                                        chat=st.session_state.get("chat_history"))
+        pdf_bytes = report_service.cached_pdf(report_cache, st.session_state["report_key"], merged)
+        if pdf_bytes:
+            st.session_state["pdf"] = pdf_bytes
+            st.success("PDF generated. Use the Download button to save.")
+        else:
+            # a newer request replaces one still waiting for a worker
+            previous = st.session_state["jobs"].get("pdf")
+            if previous is not None:
+                job_queue.cancel(previous["id"])
+            st.session_state["jobs"]["pdf"] = {"id": job_queue.submit("pdf", merged),
+                                               "report_id": st.session_state["report_key"], "row": merged}
+
+    if job_queue is not None:
+        status, job = poll_job("pdf")
+        if status == STATUS_DONE and job["result"]:
+            report_service.store_pdf(report_cache, job["report_id"], job["row"], job["result"])
+            if job["report_id"] == st.session_state["report_key"]:
+                st.session_state["pdf"] = job["result"]
+                st.success("PDF generated. Use the Download button to save.")
+        elif status == STATUS_DONE:
+            st.error("PDF generation returned empty bytes.")
+        elif status == "failed":
+            st.error(f"PDF generation failed: {job['error']}")
+        elif status is not None:
+            st.info(f"The PDF is being rendered in the background ({status}).")
+            st.button("Check again", key="pdf_poll_btn")
+
+    if gen_clicked and job_queue is None:
         try:
-            # Merge row dict with LLM text and chat
-            merged = dict(row)  # copy
-            if st.session_state.get("last_llm_recommendation"):
-                merged["LLM_Expanded_Recommendations"] = st.session_state["last_llm_recommendation"]
-            if st.session_state.get("chat_history"):
-                merged["Chat_History"] = st.session_state["chat_history"]
-
-            # call generator (fallback or model_engine's)
-            pdf_bytes = generate_pdf_bytes_from_row(merged)
+            pdf_bytes = report_service.render_pdf(
+                pipeline, report_cache, st.session_state["report_key"], row,
+                llm_text=st.session_state.get("last_llm_recommendation"),
+                chat=st.session_state.get("chat_history"),
+            )
             if pdf_bytes and len(pdf_bytes) > 0:
                 st.session_state["pdf"] = pdf_bytes
                 st.success("PDF generated. Use the Download button to save.")
@@ -478,26 +452,6 @@ IMPORTANT:
     st.divider()
     st.markdown("## 💬 Ask About Your Report (guarded)")
 
-    # Health-related quick filter:
-    def is_health_related(question: str) -> bool:
-        q = question.lower()
-        blocked = ["code", "python", "program", "linux", "windows", "politics", "president", "crypto", "bitcoin", "stock", "movie", "game", "weather"]
-        for word in blocked:
-            if word in q:
-                return False
-        allowed_keywords = ["blood", "cholesterol", "ldl", "hdl", "triglycerides", "crp", "infection", "hemoglobin", "platelet", "kidney", "liver", "risk", "diagnosis", "report", "lab", "treatment", "recommendation", "disease", "symptom", "condition", "severity"]
-        return any(k in q for k in allowed_keywords)
-
-    def generate_general_health_response(user_input: str) -> str:
-        prompt = f"""
-Answer this health-related question in an informational way.
-Do not diagnose. Encourage consulting a doctor if needed.
-
-Question:
-{user_input}
-"""
-        return ask_ollama_raw(prompt)
-
     # Display previous conversation above input (like a messaging app)
     if st.session_state.get("chat_history"):
         st.markdown("### Conversation")
@@ -509,6 +463,7 @@ Question:
                 st.markdown(f"<div style='text-align:left;padding:8px;'><b>Assistant:</b><div class='msg-assistant'>{safe_text}</div></div>", unsafe_allow_html=True)
         if st.button("Clear Chat", key="clear_chat_btn"):
             st.session_state["chat_history"] = []
+            st.session_state["llm_state"] = None
             st.session_state["last_llm_recommendation"] = None
 
     # Chat input
@@ -518,27 +473,15 @@ Question:
         ask_clicked = st.button("Ask", key="ask_btn", use_container_width=True)
 
     if ask_clicked and user_q and user_q.strip():
-        if not is_health_related(user_q):
+        if not is_health_related(user_q, retriever):
             st.warning("I can only answer questions related to the medical report (values, risk, conditions, recommendations).")
         else:
-            # use constrained prompt and only call LLM if Ollama present
-            prompt = f"""
-You are a cautious clinical assistant. STRICT RULES:
-- ONLY use the report context below to answer.
-- DO NOT answer unrelated questions or provide programming/political/financial content.
-- If the question is not about the report, respond with:
-  "I can only answer questions related to the provided medical report."
-
-Report findings: {row.get('Findings_Paragraph')}
-Overall severity: {row.get('Overall_Severity')}
-Identified conditions: {row.get('Suspected_Diseases') or row.get('Provisional_Diagnosis')}
-
-User question: {user_q}
-
-Answer succinctly, avoid speculation, and add a short suggestion to consult a clinician if appropriate.
-"""
+            # constrained prompt with only the report entries and guideline notes relevant to the question
             with st.spinner("Consulting local assistant..."):
-                reply = ask_ollama_raw(prompt)
+                reply, st.session_state["llm_state"] = report_service.chat_answer(
+                    llm_client, report_cache, retriever, st.session_state["report_key"], row, user_q,
+                    chat=st.session_state["chat_history"], state=st.session_state["llm_state"],
+                )
             st.session_state["chat_history"].append(("user", user_q))
             st.session_state["chat_history"].append(("assistant", reply))
             st.success("Assistant responded — see Conversation above.")
@@ -0,0 +1,194 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+# ----------------------
+# Columnar I/O for scored cohorts
+# ----------------------
+# synthesize_and_recommend_df leaves Recommendations_Structured as Python
+# lists of dicts in an object column. Here it becomes a nested Arrow
+# list<struct> column (or a side table keyed by Row_ID), so cohorts can be
+# written to Parquet / Arrow IPC and queried without re-running the engine.
+
+REC_COLUMN = "Recommendations_Structured"
+ROW_ID = "Row_ID"
+LAYOUT_KEY = b"health_ai.layout"  # schema metadata: which layout wrote the file
+
+
+def _rec_keys(recs_col) -> list:
+    keys = []
+    for recs in recs_col:
+        if isinstance(recs, list):
+            for r in recs:
+                if isinstance(r, dict):
+                    for k in r:
+                        if k not in keys:
+                            keys.append(k)
+    return keys or ["finding", "recommendation"]
+
+
+def _rec_array(recs_col) -> pa.Array:
+    keys = _rec_keys(recs_col)
+    struct_type = pa.struct([(k, pa.string()) for k in keys])
+    rows = []
+    for recs in recs_col:
+        if not isinstance(recs, list):
+            rows.append([])
+            continue
+        rows.append([
+            {k: (None if r.get(k) is None else str(r.get(k))) for k in keys}
+            for r in recs if isinstance(r, dict)
+        ])
+    return pa.array(rows, type=pa.list_(struct_type))
+
+
+def _with_row_id(df: pd.DataFrame) -> pd.DataFrame:
+    if ROW_ID in df.columns:
+        return df
+    df = df.reset_index(drop=True)
+    df.insert(0, ROW_ID, np.arange(len(df), dtype=np.int64))
+    return df
+
+
+def _scalar_table(df: pd.DataFrame) -> pa.Table:
+    """Everything except the recommendations column, with mixed object columns made Arrow-safe."""
+    flat = df.drop(columns=[REC_COLUMN], errors="ignore")
+    cols = {}
+    for col in flat.columns:
+        s = flat[col]
+        try:
+            cols[col] = pa.array(s, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # e.g. Kidney_Risk_Stage mixing None and str with NaN, or OCR numbers stored as text
+            cols[col] = pa.array([None if pd.isna(v) else str(v) for v in s], type=pa.string())
+    return pa.table(cols)
+
+
+def to_arrow_table(df: pd.DataFrame) -> pa.Table:
+    """Scored cohort -> Arrow table with recommendations as a nested list<struct> column."""
+    df = _with_row_id(df)
+    table = _scalar_table(df)
+    if REC_COLUMN in df.columns:
+        table = table.append_column(REC_COLUMN, _rec_array(df[REC_COLUMN]))
+    return table
+
+
+def recommendations_table(df: pd.DataFrame) -> pa.Table:
+    """One row per (Row_ID, finding/recommendation) pair."""
+    df = _with_row_id(df)
+    if REC_COLUMN not in df.columns:
+        return pa.table({ROW_ID: pa.array([], type=pa.int64()), "Rec_Index": pa.array([], type=pa.int32())})
+    return _flatten_recs(_rec_array(df[REC_COLUMN]), pa.array(df[ROW_ID].to_numpy()))
+
+
+def _flatten_recs(nested: pa.ListArray, row_ids: pa.Array) -> pa.Table:
+    parents = pc.list_parent_indices(nested)
+    # offsets of a sliced array need not start at 0
+    starts = pc.subtract(pc.take(nested.offsets, parents), nested.offsets[0])
+    positions = pc.subtract(pa.array(np.arange(len(parents), dtype=np.int32)), starts)
+    flat = pc.list_flatten(nested)
+    cols = {ROW_ID: pc.take(row_ids, parents), "Rec_Index": positions}
+    for i, field in enumerate(flat.type):
+        cols[field.name] = flat.field(i)
+    return pa.table(cols)
+
+
+# ----------------------
+# Writers
+# ----------------------
+def write_scored_cohort(df: pd.DataFrame, path: str, layout: str = "nested", compression: str = "zstd"):
+    """
+    Write a scored cohort to Parquet.
+
+    layout="nested": one file, recommendations as a list<struct> column.
+    layout="side": recommendations go to `<path stem>.recommendations.parquet`,
+    keyed by Row_ID; the main file holds only flat columns.
+    """
+    if layout == "nested":
+        pq.write_table(_with_layout(to_arrow_table(df), layout), path, compression=compression)
+        # a side table left by an earlier "side" write of this path is stale now
+        if os.path.exists(_side_path(path)):
+            os.remove(_side_path(path))
+    elif layout == "side":
+        df = _with_row_id(df)
+        pq.write_table(_with_layout(_scalar_table(df), layout), path, compression=compression)
+        pq.write_table(recommendations_table(df), _side_path(path), compression=compression)
+    else:
+        raise ValueError(f"Unknown layout: {layout!r} (expected 'nested' or 'side')")
+
+
+def _with_layout(table: pa.Table, layout: str) -> pa.Table:
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), LAYOUT_KEY: layout.encode()})
+
+
+def write_scored_cohort_ipc(df: pd.DataFrame, path: str):
+    """
+    Write an uncompressed Arrow IPC file. Unlike Parquet it needs no decoding,
+    so read_scored_cohort can memory-map it and hand out zero-copy columns.
+    """
+    table = _with_layout(to_arrow_table(df), "nested")
+    with pa.OSFile(path, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _side_path(path: str) -> str:
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.recommendations{ext or '.parquet'}"
+
+
+# ----------------------
+# Readers
+# ----------------------
+def read_scored_table(path: str, columns=None, memory_map: bool = True) -> pa.Table:
+    if path.endswith((".arrow", ".feather", ".ipc")):
+        source = pa.memory_map(path, "r") if memory_map else pa.OSFile(path, "rb")
+        table = ipc.open_file(source).read_all()
+        return table.select(columns) if columns else table
+    return pq.read_table(path, columns=columns, memory_map=memory_map)
+
+
+def _layout(path: str) -> str:
+    """Layout recorded in the file; files written before it was recorded fall back to the side file's presence."""
+    if path.endswith((".arrow", ".feather", ".ipc")):
+        return "nested"
+    metadata = pq.read_schema(path).metadata or {}
+    if LAYOUT_KEY in metadata:
+        return metadata[LAYOUT_KEY].decode()
+    return "side" if os.path.exists(_side_path(path)) else "nested"
+
+
+def read_scored_cohort(path: str, columns=None, memory_map: bool = True, arrow_dtypes: bool = True) -> pd.DataFrame:
+    """
+    Read a cohort written by write_scored_cohort(_ipc).
+
+    With arrow_dtypes=True (default) columns stay Arrow-backed (pd.ArrowDtype):
+    no conversion to NumPy/Python objects, and for memory-mapped IPC files
+    the data is never copied off the mapping. Set False for classic
+    NumPy/object columns, e.g. to feed generate_pdf_bytes_from_row.
+    """
+    table = read_scored_table(path, columns=columns, memory_map=memory_map)
+    if arrow_dtypes:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    df = table.to_pandas()
+    if REC_COLUMN in df.columns:
+        df[REC_COLUMN] = [list(v) if v is not None else [] for v in df[REC_COLUMN]]
+    return df
+
+
+def read_recommendations(path: str, memory_map: bool = True) -> pd.DataFrame:
+    """
+    Flattened recommendations for a cohort file, one row per recommendation.
+    Works for both layouts, without materializing the nested column as Python objects.
+    """
+    side = _side_path(path)
+    if _layout(path) == "side":
+        return pq.read_table(side, memory_map=memory_map).to_pandas(types_mapper=pd.ArrowDtype)
+    table = read_scored_table(path, columns=[ROW_ID, REC_COLUMN], memory_map=memory_map)
+    flat = _flatten_recs(table.column(REC_COLUMN).combine_chunks(), table.column(ROW_ID).combine_chunks())
+    return flat.to_pandas(types_mapper=pd.ArrowDtype)
@@ -0,0 +1,201 @@
+import os
+import time
+import queue
+import threading
+
+# ----------------------
+# Pipelined executor
+# ----------------------
+# Pipeline.run pushes a batch through every stage before the next batch
+# starts, so total time is the sum of the stages. Here each stage gets its own
+# workers and a bounded input queue: OCR of document n+1 overlaps scoring of
+# document n, throughput converges to the slowest stage, and a full queue
+# blocks the stage upstream of it (backpressure) instead of piling up pages
+# in memory. The number of documents in flight is capped as well, so a slow
+# document at the head of an ordered run cannot grow the reorder buffer
+# without bound.
+
+_DONE = object()
+
+
+class StageSpec:
+    """
+    How one stage is run.
+
+    workers    -- parallel workers for the stage
+    batch_size -- documents handed to the stage function per call (the score
+                  stage is a batcher: one engine call for up to batch_size docs)
+    max_wait   -- seconds a worker waits to fill a batch before running a partial one
+    """
+
+    __slots__ = ("workers", "batch_size", "max_wait")
+
+    def __init__(self, workers: int = 1, batch_size: int = 1, max_wait: float = 0.05):
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait = max_wait
+
+
+# OCR shells out to the tesseract binary, so threads already run it in parallel;
+# parsing and scoring are cheap per document and are batched.
+DEFAULT_SPECS = {
+    "ingest": StageSpec(workers=2),
+    "ocr": StageSpec(workers=os.cpu_count() or 2),
+    "parse": StageSpec(workers=1, batch_size=16),
+    "validate": StageSpec(workers=1, batch_size=16),
+    "interpret": StageSpec(workers=1, batch_size=64),
+    "score": StageSpec(workers=1, batch_size=64),
+    "synthesize": StageSpec(workers=1, batch_size=64),
+    "render": StageSpec(workers=2),
+}
+
+
+def _isolate_failures(name, fn, docs, error):
+    """After stage `fn` raised `error` on a batch, rerun its documents one by one so only the failing ones carry "error"."""
+    if len(docs) == 1:
+        docs[0]["error"] = f"{name}: {error!r}"
+        return docs
+    out = []
+    for d in docs:
+        try:
+            out.extend(fn([d]))
+        except Exception as e:
+            d["error"] = f"{name}: {e!r}"
+            out.append(d)
+    return out
+
+
+class PipelinedExecutor:
+    def __init__(self, pipeline, specs: dict = None, queue_size: int = 16, max_in_flight: int = None,
+                 start=None, stop=None):
+        """
+        Run `pipeline` (a pipeline.Pipeline) with one bounded queue and one
+        worker pool per stage. `specs` overrides DEFAULT_SPECS per stage name;
+        `start`/`stop` select a stage range as in Pipeline.run. At most
+        `max_in_flight` documents (default: the largest batch size, at least
+        queue_size) are between the input and the caller at any time.
+        """
+        self.stages = pipeline._select(start, stop)
+        merged = dict(DEFAULT_SPECS)
+        merged.update(specs or {})
+        self.specs = [merged.get(name, StageSpec()) for name, _ in self.stages]
+        self.queue_size = queue_size
+        self.max_in_flight = max_in_flight or max([queue_size] + [spec.batch_size for spec in self.specs])
+        self._stats = {}
+
+    def stats(self) -> dict:
+        """Per stage: documents processed, busy seconds summed over workers, docs/sec per worker."""
+        out = {}
+        for name, s in self._stats.items():
+            busy = s["busy"]
+            out[name] = {"docs": s["docs"], "busy_s": round(busy, 3),
+                         "docs_per_s": round(s["docs"] / busy, 2) if busy > 0 else None}
+        return out
+
+    def run(self, docs, ordered: bool = True):
+        """
+        Yield processed documents. With ordered=True they come out in input
+        order (a small reorder buffer); otherwise as soon as each finishes.
+        A document whose stage raised carries "error" and skips later stages;
+        when a batch raises, its documents are retried one by one so only the failing ones do.
+        """
+        n_stages = len(self.stages)
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(n_stages + 1)]
+        self._stats = {name: {"docs": 0, "busy": 0.0} for name, _ in self.stages}
+        stats_lock = threading.Lock()
+        # released when a document is handed to the caller
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        threads = []
+
+        def feed():
+            for seq, d in enumerate(docs):
+                in_flight.acquire()
+                d["_seq"] = seq
+                queues[0].put(d)
+            for _ in range(self.specs[0].workers if n_stages else 1):
+                queues[0].put(_DONE)
+
+        def next_batch(q, spec):
+            """Block for one doc, then top up to batch_size within max_wait. Returns (batch, saw_done)."""
+            first = q.get()
+            if first is _DONE:
+                return [], True
+            batch = [first]
+            deadline = time.monotonic() + spec.max_wait
+            while len(batch) < spec.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    return batch, True
+                batch.append(item)
+            return batch, False
+
+        def worker(i, remaining_workers):
+            name, fn = self.stages[i]
+            spec = self.specs[i]
+            q_in, q_out = queues[i], queues[i + 1]
+            while True:
+                batch, done = next_batch(q_in, spec)
+                failed = [d for d in batch if "error" in d]
+                todo = [d for d in batch if "error" not in d]
+                if todo:
+                    t0 = time.perf_counter()
+                    try:
+                        out = fn(todo)
+                    except Exception as e:
+                        out = _isolate_failures(name, fn, todo, e)
+                    with stats_lock:
+                        self._stats[name]["docs"] += len(todo)
+                        self._stats[name]["busy"] += time.perf_counter() - t0
+                    for d in out:
+                        q_out.put(d)
+                for d in failed:
+                    q_out.put(d)
+                if done:
+                    break
+            # last worker of this stage to finish releases the next stage's workers
+            with remaining_workers["lock"]:
+                remaining_workers["n"] -= 1
+                last = remaining_workers["n"] == 0
+            if last:
+                n_next = self.specs[i + 1].workers if i + 1 < n_stages else 1
+                for _ in range(n_next):
+                    q_out.put(_DONE)
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        threads.append(feeder)
+        for i, spec in enumerate(self.specs):
+            remaining = {"n": spec.workers, "lock": threading.Lock()}
+            for _ in range(spec.workers):
+                t = threading.Thread(target=worker, args=(i, remaining), daemon=True)
+                t.start()
+                threads.append(t)
+
+        pending = {}
+        next_seq = 0
+        while True:
+            d = queues[-1].get()
+            if d is _DONE:
+                break
+            seq = d.pop("_seq")
+            if not ordered:
+                in_flight.release()
+                yield d
+                continue
+            pending[seq] = d
+            while next_seq in pending:
+                in_flight.release()
+                yield pending.pop(next_seq)
+                next_seq += 1
+        for seq in sorted(pending):
+            in_flight.release()
+            yield pending[seq]
+
+    def run_all(self, docs) -> list:
+        return list(self.run(docs, ordered=True))
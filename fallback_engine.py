@@ -0,0 +1,204 @@
+import re
+from io import BytesIO
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# ----------------------
+# Fallback engine
+# ----------------------
+# Minimal parse / model / pdf functions used by app.py when model_engine (or
+# one of its dependencies) cannot be imported, so the UI keeps working. Kept
+# in a module so they are defined once per process, not on every rerun.
+
+
+def normalize_batch(parsed: list, texts: list, profiles=None) -> list:
+    return parsed
+
+
+@lru_cache(maxsize=None)
+def _numeric_re(label: str):
+    return re.compile(rf"{re.escape(label)}[^\d\.\-]*([\-+]?\d*\.?\d+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=None)
+def _text_re(label: str):
+    return re.compile(rf"{re.escape(label)}[^\n\r:]*[:\-]?\s*([^\n\r]+)", re.IGNORECASE)
+
+
+def parse_parameters(text: str) -> dict:
+    def extract_numeric(labels):
+        for lab in labels:
+            m = _numeric_re(lab).search(text)
+            if m:
+                try:
+                    return float(m.group(1))
+                except:
+                    pass
+        return np.nan
+
+    def extract_text(labels):
+        for lab in labels:
+            m = _text_re(lab).search(text)
+            if m:
+                return m.group(1).strip()
+        return ""
+
+    out = {}
+    out["Patient_ID"] = extract_text(["Patient ID", "Patient No", "Patient Number"]) or ""
+    out["Patient_Name"] = extract_text(["Patient Name", "Name"]) or "Patient"
+    age = extract_numeric(["Age"])
+    out["Age"] = int(age) if not np.isnan(age) else np.nan
+    out["Gender"] = extract_text(["Gender", "Sex"]) or ""
+
+    out["Hemoglobin_g_dL"] = extract_numeric(["Hemoglobin", r"\bHb\b"])
+    out["Triglycerides_mg_dL"] = extract_numeric(["Triglycerides", "TG"])
+    out["LDL_mg_dL"] = extract_numeric(["LDL"])
+    out["HDL_mg_dL"] = extract_numeric(["HDL"])
+    out["CRP_mg_L"] = extract_numeric(["CRP", "C-reactive protein"])
+    out["eGFR_mL_min_1_73m2"] = extract_numeric(["eGFR"])
+    out["Peripheral_Smear_Result"] = extract_text(["Peripheral Smear Result", "Peripheral Smear"])
+    out["Provisional_Diagnosis"] = extract_text(["Provisional Diagnosis", "Diagnosis"])
+    return out
+
+
+def run_models_on_df(df):
+    df = df.copy()
+    df["Triglycerides_mg_dL"] = pd.to_numeric(df.get("Triglycerides_mg_dL"), errors="coerce")
+    df["LDL_mg_dL"] = pd.to_numeric(df.get("LDL_mg_dL"), errors="coerce")
+    df["HDL_mg_dL"] = pd.to_numeric(df.get("HDL_mg_dL"), errors="coerce")
+
+    def cardio_score(r):
+        s = 0
+        ldl = r.get("LDL_mg_dL")
+        hdl = r.get("HDL_mg_dL")
+        tg = r.get("Triglycerides_mg_dL")
+        if pd.notna(ldl) and ldl > 160:
+            s += 3
+        elif pd.notna(ldl) and ldl > 130:
+            s += 2
+        if pd.notna(hdl) and hdl < 40:
+            s += 2
+        if pd.notna(tg) and tg > 200:
+            s += 1
+        return s
+
+    df["Cardiovascular_Risk_Score"] = df.apply(cardio_score, axis=1)
+    df["Infection_Severity"] = df.get("CRP_mg_L").apply(
+        lambda x: "High" if pd.notna(x) and x > 100 else ("Moderate" if pd.notna(x) and x > 10 else "Low")
+    ) if "CRP_mg_L" in df else "Low"
+    df["Liver_Injury_Flag"] = False
+    df["Kidney_Risk_Stage"] = None
+    df["Metabolic_Syndrome_Flags"] = 0
+    df["TC_HDL_Ratio"] = np.nan
+    df["Adjusted_Cardiovascular_Risk"] = df["Cardiovascular_Risk_Score"]
+    return df
+
+
+def synthesize_and_recommend_df(df):
+    rows = []
+    for _, r in df.iterrows():
+        findings = []
+        severity_score = 0
+        tg = r.get("Triglycerides_mg_dL")
+        if pd.notna(tg) and tg > 200:
+            findings.append(("high_tg", f"High triglycerides ({int(tg)} mg/dL)"))
+            severity_score += 1
+        ldl = r.get("LDL_mg_dL")
+        if pd.notna(ldl) and ldl >= 160:
+            findings.append(("high_ldl", f"Markedly elevated LDL ({int(ldl)} mg/dL)"))
+            severity_score += 3
+        cv = r.get("Cardiovascular_Risk_Score", 0)
+        if cv and cv > 0:
+            findings.append(("cv_score", f"Cardiovascular Risk score: {int(cv)}"))
+            severity_score += int(cv)
+        if severity_score >= 8:
+            sev = "high"
+        elif severity_score >= 4:
+            sev = "moderate"
+        else:
+            sev = "low"
+        paragraph = " | ".join([f[1] for f in findings]) if findings else "No significant findings detected."
+        recs = []
+        for code, text in findings:
+            if code in ("high_tg", "high_ldl", "cv_score"):
+                recs.append({
+                    "finding_code": code,
+                    "finding_text": text,
+                    "recommendation": ("Lifestyle: reduce saturated fats and trans fats, increase dietary fiber and oily fish; "
+                                       "Exercise: aim for 150 min/week. Follow-up: repeat lipid panel in 6-12 weeks."),
+                    "urgency": "routine"
+                })
+        rows.append({**r.to_dict(), "Findings_Paragraph": paragraph, "Recommendations_Structured": recs, "Overall_Severity": sev})
+    return pd.DataFrame(rows)
+
+
+def generate_pdf_bytes_from_row(row_dict: dict) -> bytes:
+    """Fallback PDF builder (ReportLab) which supports LLM recommendations and chat history if present."""
+    try:
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, ListFlowable, ListItem
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import cm
+    except Exception:
+        return b""
+
+    buf = BytesIO()
+    doc = SimpleDocTemplate(buf, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
+    styles = getSampleStyleSheet()
+    story = []
+
+    # Title
+    story.append(Paragraph("<b>Personalized Health Recommendation Report</b>", styles["Title"]))
+    story.append(Spacer(1, 12))
+
+    # Findings
+    story.append(Paragraph("<b>Synthesized Findings</b>", styles["Heading2"]))
+    story.append(Spacer(1, 6))
+    story.append(Paragraph(row_dict.get("Findings_Paragraph", "No findings."), styles["BodyText"]))
+    story.append(Spacer(1, 12))
+
+    # Overall severity
+    story.append(Paragraph(f"<b>Overall Severity:</b> {str(row_dict.get('Overall_Severity','unknown')).capitalize()}", styles["BodyText"]))
+    story.append(Spacer(1, 12))
+
+    # Deterministic recommendations
+    recs = row_dict.get("Recommendations_Structured", [])
+    if recs:
+        story.append(Paragraph("<b>Recommendations</b>", styles["Heading2"]))
+        story.append(Spacer(1, 6))
+        items = []
+        for r in recs:
+            text = f"<b>Finding:</b> {r.get('finding_text','')}<br/><b>Recommendation:</b> {r.get('recommendation','')}<br/><b>Urgency:</b> {r.get('urgency','routine').capitalize()}"
+            items.append(ListItem(Paragraph(text, styles["BodyText"])))
+        story.append(ListFlowable(items, bulletType="bullet"))
+        story.append(Spacer(1, 12))
+
+    # LLM expanded recommendations (if provided)
+    llm_text = row_dict.get("LLM_Expanded_Recommendations")
+    if llm_text:
+        story.append(Paragraph("<b>LLM Expanded Recommendations</b>", styles["Heading2"]))
+        story.append(Spacer(1, 6))
+        for chunk in (llm_text if isinstance(llm_text, list) else [llm_text]):
+            story.append(Paragraph(str(chunk), styles["BodyText"]))
+            story.append(Spacer(1, 6))
+
+    # Chat history
+    chat = row_dict.get("Chat_History")
+    if chat:
+        story.append(Paragraph("<b>Assistant Conversation (chat)</b>", styles["Heading2"]))
+        story.append(Spacer(1, 6))
+        for role, text in chat:
+            entry = f"<b>{role.capitalize()}:</b> {text}"
+            story.append(Paragraph(entry, styles["BodyText"]))
+            story.append(Spacer(1, 4))
+
+    # Disclaimer
+    story.append(Spacer(1, 12))
+    story.append(Paragraph("<b>Disclaimer</b>", styles["Heading3"]))
+    story.append(Paragraph("This report is generated by an automated system for research and educational purposes only. It does not replace professional medical advice. Always consult a qualified healthcare provider before making medical decisions.", styles["BodyText"]))
+
+    doc.build(story)
+    buf.seek(0)
+    return buf.read()
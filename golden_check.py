@@ -0,0 +1,426 @@
+import os
+import re
+import sys
+import gzip
+import json
+import math
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# ----------------------
+# Golden-output regression + throughput gate for model_engine
+# ----------------------
+# A seeded set of panels (ordinary values, missing fields and whole missing
+# lab families, string-formatted numbers such as "145 mg/dL", and values
+# sitting exactly on every rule threshold) is scored once and stored with its
+# outputs in golden/. Every registered engine implementation is then run on
+# the same inputs and diffed column by column against those outputs, and its
+# rows/sec is checked against the reference engine's, stored in the golden
+# header when the file was written, so an optimization has to be both
+# identical and no slower, and a slowdown in code every engine shares fails
+# too. Golden rows are sanity-checked against their inputs first, so a wrong
+# output is not frozen.
+#
+#   python golden_check.py                 # sanity + diff + throughput gate (exit 1 on failure)
+#   python golden_check.py --update        # regenerate golden/ (and the baseline rows/sec) from the reference engine
+#   python golden_check.py --engine model_engine --perf-rows 20000
+#   python golden_check.py --no-perf       # outputs only
+#   python golden_check.py --min-score-rps 3500   # override the stored floor (e.g. on a slower machine)
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+GOLDEN_PATH = os.path.join(GOLDEN_DIR, "model_engine_panels.jsonl.gz")
+SEED = 20240611
+N_RANDOM = 2000
+FLOAT_DIGITS = 9
+
+# every engine must reach this share of the baseline rows/sec stored in the golden header, per
+# stage; the baseline is machine-specific, so --min-*-rps overrides it on another machine
+RELATIVE_FLOOR = 0.8
+PERF_ROWS = 4000
+
+
+def _reference_engine():
+    from model_engine import run_models_on_df, synthesize_and_recommend_df
+    return (lambda df: run_models_on_df(df, sparse=False)), (lambda df: synthesize_and_recommend_df(df, sparse=False))
+
+
+def _sparse_engine():
+    from model_engine import run_models_on_df, synthesize_and_recommend_df
+    return run_models_on_df, synthesize_and_recommend_df
+
+
+# name -> () -> (score(df) -> df, synthesize(df) -> df); the first entry writes the golden file
+ENGINES = {
+    "model_engine_dense": _reference_engine,
+    "model_engine": _sparse_engine,
+}
+
+
+# ----------------------
+# Seeded panel set
+# ----------------------
+# (field, mean, sd, lab family)
+FIELDS = [
+    ("Hemoglobin_g_dL", 13.0, 2.2, "cbc"),
+    ("WBC_cells_uL", 8000, 3000, "cbc"),
+    ("Platelets_lakh_uL", 2.5, 0.9, "cbc"),
+    ("Hematocrit_percent", 40, 5, "cbc"),
+    ("Serum_Iron_ug_dL", 90, 35, "iron"),
+    ("Serum_Ferritin_ng_mL", 80, 60, "iron"),
+    ("Vitamin_B12_pg_mL", 400, 180, "vitamin"),
+    ("Folate_ng_mL", 10, 5, "vitamin"),
+    ("Vitamin_D_ng_mL", 25, 12, "vitamin"),
+    ("ALT_U_L", 45, 60, "liver"),
+    ("AST_U_L", 40, 55, "liver"),
+    ("Total_Bilirubin_mg_dL", 1.0, 1.2, "liver"),
+    ("Serum_Creatinine_mg_dL", 1.1, 0.6, "kidney"),
+    ("eGFR_mL_min_1_73m2", 75, 30, "kidney"),
+    ("Total_Cholesterol_mg_dL", 195, 45, "lipid"),
+    ("LDL_mg_dL", 125, 40, "lipid"),
+    ("HDL_mg_dL", 46, 12, "lipid"),
+    ("Triglycerides_mg_dL", 160, 90, "lipid"),
+    ("Fasting_Glucose_mg_dL", 105, 30, "glucose"),
+    ("HbA1c_percent", 5.9, 1.1, "glucose"),
+    ("CRP_mg_L", 12, 30, "infection"),
+    ("Procalcitonin_ng_mL", 0.4, 1.2, "infection"),
+    ("D_Dimer_mg_L", 0.8, 1.2, "infection"),
+    ("Systolic_BP_mmHg", 128, 18, "vitals"),
+    ("Waist_Circumference_cm", 88, 12, "vitals"),
+]
+FAMILIES = sorted({f[3] for f in FIELDS})
+
+# every threshold model_engine compares against, hit exactly and from both sides
+EDGE_VALUES = {
+    "LDL_mg_dL": [130, 160],
+    "HDL_mg_dL": [40],
+    "Triglycerides_mg_dL": [150, 200],
+    "Fasting_Glucose_mg_dL": [100],
+    "Waist_Circumference_cm": [90],
+    "Systolic_BP_mmHg": [140],
+    "CRP_mg_L": [3, 10, 100],
+    "Procalcitonin_ng_mL": [0.5, 2],
+    "D_Dimer_mg_L": [2],
+    "ALT_U_L": [200],
+    "AST_U_L": [200],
+    "Total_Bilirubin_mg_dL": [3],
+    "eGFR_mL_min_1_73m2": [15, 30, 60, 90],
+    "Hemoglobin_g_dL": [11],
+    "Vitamin_D_ng_mL": [20],
+    "Age": [60],
+}
+EDGE_OFFSETS = (-0.01, 0.0, 0.01)
+
+# how numbers show up after OCR / CSV import
+STRING_FORMS = [
+    lambda v, rng: f"{v:.1f}",
+    lambda v, rng: f" {v:.2f} ",
+    lambda v, rng: f"{v:.1f} mg/dL",
+    lambda v, rng: f"H {v:.0f}",
+    lambda v, rng: f"<{v:.1f}",
+    lambda v, rng: f"{v:.0f}*",
+]
+GENDERS = ["Male", "Female", "male", "FEMALE", "M", "", None, 1]
+JUNK = ["", "N/A", "--", "see note", None]
+
+
+def _random_panel(rng: np.random.Generator, i: int) -> dict:
+    present = {fam for fam in FAMILIES if rng.random() < 0.45}
+    if not present:
+        present = {FAMILIES[int(rng.integers(len(FAMILIES)))]}
+    panel = {
+        "Patient_ID": f"G{i:05d}",
+        "Age": float(rng.integers(1, 95)) if rng.random() < 0.9 else np.nan,
+        "Gender": GENDERS[int(rng.integers(len(GENDERS)))],
+    }
+    for field, mean, sd, family in FIELDS:
+        if family not in present or rng.random() < 0.08:
+            continue  # absent family, or one missing value inside a present one
+        v = float(rng.normal(mean, sd))
+        u = rng.random()
+        if u < 0.03:
+            v = 0.0
+        elif u < 0.05:
+            v = -abs(v)
+        else:
+            v = round(abs(v), int(rng.integers(0, 3)))
+        u = rng.random()
+        if u < 0.12:
+            panel[field] = STRING_FORMS[int(rng.integers(len(STRING_FORMS)))](v, rng)
+        elif u < 0.15:
+            panel[field] = JUNK[int(rng.integers(len(JUNK)))]
+        elif u < 0.18:
+            panel[field] = int(round(v))
+        else:
+            panel[field] = v
+    return panel
+
+
+def _edge_panels() -> list:
+    panels = []
+    for field, values in EDGE_VALUES.items():
+        for v in values:
+            for off in EDGE_OFFSETS:
+                x = round(v + off, 4)
+                for form in (x, str(x)):
+                    panels.append({"Patient_ID": f"E-{field}-{x}-{type(form).__name__}", "Age": 45.0,
+                                   "Gender": "Male", field: form})
+    # all families present and all missing
+    panels.append({"Patient_ID": "E-empty"})
+    panels.append({"Patient_ID": "E-full", "Age": 60, "Gender": "male",
+                   **{f: mean for f, mean, _, _ in FIELDS}})
+    return panels
+
+
+def seeded_panels(seed: int = SEED, n: int = N_RANDOM) -> list:
+    rng = np.random.default_rng(seed)
+    return _edge_panels() + [_random_panel(rng, i) for i in range(n)]
+
+
+# ----------------------
+# Canonical cell values
+# ----------------------
+def canon(v):
+    """JSON-stable form of an output cell: floats rounded, NaN/None -> None, containers as JSON text."""
+    if v is None:
+        return None
+    if isinstance(v, (bool, np.bool_)):
+        return bool(v)
+    if isinstance(v, (int, np.integer)):
+        return int(v)
+    if isinstance(v, (float, np.floating)):
+        v = float(v)
+        if math.isnan(v):
+            return None
+        if math.isinf(v):
+            return "inf" if v > 0 else "-inf"
+        return round(v, FLOAT_DIGITS)
+    if isinstance(v, (list, tuple, dict, np.ndarray)):
+        return json.dumps(v.tolist() if isinstance(v, np.ndarray) else v, sort_keys=True, default=str)
+    if v is pd.NA or v is pd.NaT:
+        return None
+    return str(v)
+
+
+def _input_json(v):
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    return v
+
+
+def _frame(inputs: list) -> pd.DataFrame:
+    return pd.DataFrame([{k: (np.nan if v is None and k != "Gender" else v) for k, v in p.items()} for p in inputs])
+
+
+def _records(df: pd.DataFrame) -> list:
+    cols = list(df.columns)
+    return [{c: canon(v) for c, v in zip(cols, row)} for row in df.itertuples(index=False, name=None)]
+
+
+def run_engine(engine, inputs: list) -> pd.DataFrame:
+    score, synthesize = engine
+    return synthesize(score(_frame(inputs)))
+
+
+# ----------------------
+# Sanity checks on outputs
+# ----------------------
+# Independent of the engine: a finding that quotes a lab value must quote the
+# value the panel carries, and a finding about a lab family needs one of its
+# fields in the input (a row index read as a value once froze
+# "High triglycerides (201 mg/dL)" into the golden file).
+QUOTED_VALUES = [
+    (re.compile(r"High triglycerides \((-?[\d.]+) mg/dL\)"), "Triglycerides_mg_dL"),
+    (re.compile(r"Markedly elevated LDL \((-?[\d.]+) mg/dL\)"), "LDL_mg_dL"),
+    (re.compile(r"Low HDL \((-?[\d.]+) mg/dL\)"), "HDL_mg_dL"),
+    (re.compile(r"Low hemoglobin \((-?[\d.]+) g/dL\)"), "Hemoglobin_g_dL"),
+    (re.compile(r"Low Vitamin D \((-?[\d.]+) ng/mL\)"), "Vitamin_D_ng_mL"),
+    (re.compile(r"markers \(CRP (-?[\d.]+)\)"), "CRP_mg_L"),
+]
+FAMILY_FINDINGS = [
+    (re.compile(r"kidney stage|kidney function"), "kidney"),
+    (re.compile(r"liver injury"), "liver"),
+]
+_NUMBER_RE = re.compile(r"-?\d*\.?\d+")
+
+
+def _input_number(v):
+    m = _NUMBER_RE.search(str(v)) if v is not None else None
+    return float(m.group(0)) if m else None
+
+
+def sanity_violations(inputs: list, outputs: list) -> list:
+    """(row, finding, input value) for every finding its input panel does not support."""
+    bad = []
+    for i, (inp, out) in enumerate(zip(inputs, outputs)):
+        text = out.get("Findings_Paragraph") or ""
+        for pattern, field in QUOTED_VALUES:
+            for m in pattern.finditer(text):
+                quoted, v = float(m.group(1)), _input_number(inp.get(field))
+                if v is None or not (quoted == v or quoted == math.trunc(v)):
+                    bad.append((i, m.group(0), inp.get(field)))
+        for pattern, family in FAMILY_FINDINGS:
+            fields = [f for f, _, _, fam in FIELDS if fam == family]
+            if pattern.search(text) and all(_input_number(inp.get(f)) is None for f in fields):
+                bad.append((i, pattern.search(text).group(0), None))
+    return bad
+
+
+def _print_violations(bad: list, max_examples: int = 5):
+    print(f"[FAIL] sanity: {len(bad)} finding(s) not supported by their input")
+    for row, finding, value in bad[:max_examples]:
+        print(f"        row {row}: {finding!r} but input is {value!r}")
+
+
+# ----------------------
+# Golden file
+# ----------------------
+def write_golden(path: str = GOLDEN_PATH, seed: int = SEED, n: int = N_RANDOM, engine: str = None):
+    """
+    Score the seeded panels with `engine` and write them, with its rows/sec as
+    the throughput baseline; refuses (ValueError) when the outputs fail sanity.
+    """
+    engine = engine or next(iter(ENGINES))
+    inputs = seeded_panels(seed, n)
+    outputs = _records(run_engine(ENGINES[engine](), inputs))
+    bad = sanity_violations([{k: _input_json(v) for k, v in p.items()} for p in inputs], outputs)
+    if bad:
+        _print_violations(bad)
+        raise ValueError(f"{engine} produced {len(bad)} unsupported finding(s); golden file not written")
+    stored = [{k: _input_json(v) for k, v in p.items()} for p in inputs]
+    baseline = {stage: round(rps) for stage, rps in throughput(ENGINES[engine](), stored).items()}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # mtime=0 keeps the rows byte-identical across regenerations; only the measured baseline moves
+    with open(path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as fh:
+        header = {"seed": seed, "n_random": n, "engine": engine, "rows": len(inputs),
+                  "rows_per_s": baseline, "perf_rows": PERF_ROWS}
+        fh.write((json.dumps(header) + "\n").encode("utf-8"))
+        for inp, out in zip(inputs, outputs):
+            line = {"input": {k: _input_json(v) for k, v in inp.items()}, "output": out}
+            fh.write((json.dumps(line, sort_keys=True) + "\n").encode("utf-8"))
+    return len(inputs)
+
+
+def read_golden(path: str = GOLDEN_PATH) -> tuple:
+    """(header, inputs, outputs)."""
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        header = json.loads(fh.readline())
+        inputs, outputs = [], []
+        for line in fh:
+            rec = json.loads(line)
+            inputs.append(rec["input"])
+            outputs.append(rec["output"])
+    return header, inputs, outputs
+
+
+def diff_columns(expected: list, got: list, max_examples: int = 3) -> dict:
+    """
+    {column: {"mismatches", "examples": [(row, expected, got), ...]}} for
+    every differing column; missing / extra columns and a row-count change
+    are reported under "__columns__" / "__rows__".
+    """
+    report = {}
+    if len(expected) != len(got):
+        report["__rows__"] = {"mismatches": abs(len(expected) - len(got)),
+                              "examples": [("count", len(expected), len(got))]}
+    exp_cols = list(expected[0]) if expected else []
+    got_cols = list(got[0]) if got else []
+    missing = [c for c in exp_cols if c not in got_cols]
+    extra = [c for c in got_cols if c not in exp_cols]
+    if missing or extra:
+        report["__columns__"] = {"mismatches": len(missing) + len(extra),
+                                 "examples": [("missing", missing, None), ("extra", None, extra)]}
+    for col in exp_cols:
+        if col in missing:
+            continue
+        bad = [(i, e.get(col), g.get(col)) for i, (e, g) in enumerate(zip(expected, got)) if e.get(col) != g.get(col)]
+        if bad:
+            report[col] = {"mismatches": len(bad), "examples": bad[:max_examples]}
+    return report
+
+
+def throughput(engine, inputs: list, rows: int = PERF_ROWS, repeat: int = 3) -> dict:
+    """Best-of-`repeat` rows/sec for the score and synthesize stages on `rows` rows (inputs tiled)."""
+    score, synthesize = engine
+    df = _frame((inputs * (rows // max(len(inputs), 1) + 1))[:rows])
+    best = {"score": 0.0, "synthesize": 0.0}
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        scored = score(df)
+        t1 = time.perf_counter()
+        synthesize(scored)
+        t2 = time.perf_counter()
+        best["score"] = max(best["score"], rows / max(t1 - t0, 1e-9))
+        best["synthesize"] = max(best["synthesize"], rows / max(t2 - t1, 1e-9))
+    return best
+
+
+def check(engines=None, path: str = GOLDEN_PATH, perf: bool = True, perf_rows: int = PERF_ROWS,
+          floors: dict = None) -> bool:
+    """
+    Sanity-check the golden file, then diff (and time) each engine against it;
+    prints a report, returns True when all pass. Throughput must reach
+    RELATIVE_FLOOR x the baseline in the golden header; `floors` ({stage: rows/sec})
+    replace that floor per stage.
+    """
+    floors = floors or {}
+    header, inputs, expected = read_golden(path)
+    print(f"golden: {header['rows']} panels (seed {header['seed']}, written by {header['engine']})")
+    ok = True
+    bad = sanity_violations(inputs, expected)
+    if bad:
+        ok = False
+        _print_violations(bad)
+    baseline = header.get("rows_per_s") or {}
+    if perf and not set(baseline) | set(floors) >= {"score", "synthesize"}:
+        print("[FAIL] throughput: no baseline in the golden header; regenerate with --update or pass --min-*-rps")
+        return False
+    for name in engines or ENGINES:
+        engine = ENGINES[name]()
+        report = diff_columns(expected, _records(run_engine(engine, inputs)))
+        if report:
+            ok = False
+            print(f"[FAIL] {name}: {len(report)} column(s) differ")
+            for col, d in report.items():
+                print(f"    {col}: {d['mismatches']} row(s)")
+                for row, e, g in d["examples"]:
+                    print(f"        row {row}: expected {e!r}, got {g!r}")
+        else:
+            print(f"[ok]   {name}: outputs identical")
+        if perf:
+            for stage, rps in throughput(engine, inputs, perf_rows).items():
+                floor = floors[stage] if stage in floors else RELATIVE_FLOOR * baseline[stage]
+                passed = rps >= floor
+                ok = ok and passed
+                versus = f"{rps / baseline[stage]:.2f}x baseline, " if baseline.get(stage) else ""
+                print(f"[{'ok' if passed else 'FAIL'}]{'   ' if passed else ' '}{name} {stage}: "
+                      f"{rps:,.0f} rows/s ({versus}floor {floor:,.0f})")
+    return ok
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Golden-output regression and throughput gate for the scoring engine.")
+    ap.add_argument("--update", action="store_true",
+                    help="regenerate the golden file and its baseline rows/sec from the reference engine")
+    ap.add_argument("--engine", action="append", choices=sorted(ENGINES), help="engine(s) to check (default: all)")
+    ap.add_argument("--golden", default=GOLDEN_PATH)
+    ap.add_argument("--seed", type=int, default=SEED)
+    ap.add_argument("--rows", type=int, default=N_RANDOM, help="random panels in a regenerated golden file")
+    ap.add_argument("--no-perf", action="store_true", help="skip the throughput gate")
+    ap.add_argument("--perf-rows", type=int, default=PERF_ROWS)
+    ap.add_argument("--min-score-rps", type=float, default=None, help="score floor in rows/sec, replacing the stored baseline's")
+    ap.add_argument("--min-synthesize-rps", type=float, default=None, help="synthesize floor in rows/sec, replacing the stored baseline's")
+    args = ap.parse_args()
+
+    if args.update:
+        try:
+            n = write_golden(args.golden, args.seed, args.rows)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        print(f"wrote {n} panels to {args.golden}")
+        sys.exit(0)
+    floors = {k: v for k, v in (("score", args.min_score_rps), ("synthesize", args.min_synthesize_rps)) if v is not None}
+    sys.exit(0 if check(args.engine, args.golden, not args.no_perf, args.perf_rows, floors) else 1)
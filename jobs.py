@@ -0,0 +1,320 @@
+import os
+import time
+import uuid
+import pickle
+import socket
+import sqlite3
+import threading
+import multiprocessing
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# ----------------------
+# Background jobs
+# ----------------------
+# Slow operations (multi-page OCR, PDF rendering, LLM generation) run outside
+# the Streamlit script thread. A job is a row in an SQLite table; the app
+# stores only the job id in session state and polls it on reruns. A job may
+# also carry a key (the OCR job: the upload's fingerprint), so a reloaded page,
+# or another session uploading the same file, finds the queued, running or
+# finished job instead of starting a new one. One dispatcher thread per server
+# process moves queued jobs onto a process pool (CPU-bound types) or a thread
+# pool (HTTP-bound types) while respecting a concurrency limit per job type.
+# A claimed job records its owner ("host:pid:token", the token unique to one
+# JobQueue), so a starting server re-queues only jobs whose owner is gone and
+# leaves those of other live server processes alone.
+
+STATE_DIR = os.environ.get("HEALTH_AI_STATE_DIR", os.path.join(os.path.expanduser("~"), ".health_ai"))
+JOBS_DB = os.environ.get("JOBS_DB", os.path.join(STATE_DIR, "jobs.sqlite3"))
+DEFAULT_LIMITS = {"ocr": 2, "pdf": 2, "llm": 4}
+POLL_INTERVAL = 0.2
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+FINISHED = (STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    key TEXT,
+    owner TEXT,
+    payload BLOB,
+    result BLOB,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, type, created);
+"""
+_KEY_INDEX = "CREATE INDEX IF NOT EXISTS jobs_key ON jobs (type, key, created)"
+
+
+# ----------------------
+# Job functions (module level so the process pool can pickle them)
+# ----------------------
+_worker_pipelines = {}
+
+
+def _worker_pipeline(confidence: bool, raster: dict):
+    """One pipeline per worker process and configuration, built on first use."""
+    key = (confidence, tuple(sorted((raster or {}).items())))
+    if key not in _worker_pipelines:
+        from pipeline import default_pipeline
+        _worker_pipelines[key] = default_pipeline(confidence=confidence, raster=raster)
+    return _worker_pipelines[key]
+
+
+def ocr_job(file_name: str, file_bytes: bytes, page_range=None, confidence: bool = True, raster: dict = None) -> dict:
+    doc = {"name": file_name, "bytes": file_bytes, "page_range": page_range or None}
+    doc = _worker_pipeline(confidence, raster).run([doc], stop="ocr")[0]
+    return {
+        "text": doc["text"],
+        "page_sources": doc.get("page_sources") or {},
+        "ocr_values": doc.get("ocr_values"),
+        "ocr_low_confidence": doc.get("ocr_low_confidence"),
+    }
+
+
+def pdf_job(row: dict) -> bytes:
+    from model_engine import generate_pdf_bytes_from_row
+    return generate_pdf_bytes_from_row(row)
+
+
+def llm_job(prompt: str, system: str = None, context=None, client_options: dict = None) -> dict:
+    from llm_client import OllamaClient
+    return OllamaClient(**(client_options or {})).complete(prompt, system=system, context=context)
+
+
+# type -> (function, "process" | "thread")
+JOB_TYPES = {
+    "ocr": (ocr_job, "process"),
+    "pdf": (pdf_job, "process"),
+    "llm": (llm_job, "thread"),
+}
+
+
+# ----------------------
+# Queue
+# ----------------------
+_live_owners = set()  # owners of the JobQueues open in this process
+
+
+def _owner_alive(owner) -> bool:
+    """
+    Is the JobQueue that claimed a job still running? Jobs from before owners
+    were recorded count as gone, and so does this process's pid under a token
+    no open JobQueue holds (a restart that reused the pid). A process on
+    another host cannot be checked and is assumed alive.
+    """
+    if not owner:
+        return False
+    host, pid, _ = owner.split(":", 2)
+    if host != socket.gethostname():
+        return True
+    if int(pid) == os.getpid():
+        return owner in _live_owners
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    return True
+
+
+class JobQueue:
+    def __init__(self, db_path: str = JOBS_DB, limits: dict = None, job_types: dict = None):
+        """
+        `limits`: max concurrently running jobs per type (DEFAULT_LIMITS).
+        Jobs left "running" by a server process that is gone are re-queued;
+        finished jobs older than a day are purged.
+        """
+        self.db_path = db_path
+        self.job_types = dict(JOB_TYPES, **(job_types or {}))
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        _live_owners.add(self.owner)
+        with self._connect() as con:
+            con.executescript(_SCHEMA)
+            columns = [row[1] for row in con.execute("PRAGMA table_info(jobs)")]
+            for column in ("key", "owner"):  # database from before job keys / owners
+                if column not in columns:
+                    con.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+            con.execute(_KEY_INDEX)
+            owners = [row[0] for row in con.execute("SELECT DISTINCT owner FROM jobs WHERE status = ?", (STATUS_RUNNING,))]
+            for owner in owners:
+                if not _owner_alive(owner):
+                    con.execute("UPDATE jobs SET status = ?, started = NULL, owner = NULL WHERE status = ? AND owner IS ?",
+                                (STATUS_QUEUED, STATUS_RUNNING, owner))
+        self.purge()
+
+        n_thread = sum(self.limits.get(t, 1) for t, (_, kind) in self.job_types.items() if kind == "thread")
+        self._processes = self._process_pool()
+        self._threads = ThreadPoolExecutor(max_workers=max(n_thread, 1), thread_name_prefix="job")
+        self._running = Counter()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._dispatcher.start()
+
+    def _process_pool(self):
+        n = sum(self.limits.get(t, 1) for t, (_, kind) in self.job_types.items() if kind == "process")
+        # spawn, not fork: the server process is multi-threaded
+        return ProcessPoolExecutor(max_workers=max(n, 1), mp_context=multiprocessing.get_context("spawn"))
+
+    @contextmanager
+    def _connect(self):
+        """Autocommit connection, closed on exit (sqlite3's own context manager only ends a transaction)."""
+        con = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            yield con
+        finally:
+            con.close()
+
+    # --- public API ---
+    def submit(self, job_type: str, *args, key: str = None, **kwargs) -> str:
+        """Queue `job_type` with (args, kwargs); `key` makes the job findable with find()."""
+        if job_type not in self.job_types:
+            raise KeyError(f"Unknown job type {job_type!r}; known: {sorted(self.job_types)}")
+        job_id = uuid.uuid4().hex
+        payload = pickle.dumps((args, kwargs), protocol=pickle.HIGHEST_PROTOCOL)
+        with self._connect() as con:
+            con.execute("INSERT INTO jobs (id, type, status, key, payload, created) VALUES (?, ?, ?, ?, ?, ?)",
+                        (job_id, job_type, STATUS_QUEUED, key, payload, time.time()))
+        self._wake.set()
+        return job_id
+
+    def find(self, job_type: str, key: str):
+        """Id of the newest queued, running or done job of this type and key, else None."""
+        with self._connect() as con:
+            row = con.execute("SELECT id FROM jobs WHERE type = ? AND key = ? AND status IN (?, ?, ?) "
+                              "ORDER BY created DESC LIMIT 1",
+                              (job_type, key, STATUS_QUEUED, STATUS_RUNNING, STATUS_DONE)).fetchone()
+        return row[0] if row else None
+
+    def status(self, job_id: str):
+        """{"id", "type", "status", "error", "created", "started", "finished"}, or None for an unknown id."""
+        with self._connect() as con:
+            row = con.execute("SELECT id, type, status, error, created, started, finished FROM jobs WHERE id = ?",
+                              (job_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("id", "type", "status", "error", "created", "started", "finished"), row))
+
+    def result(self, job_id: str):
+        """The job's return value once it is done, else None."""
+        with self._connect() as con:
+            row = con.execute("SELECT status, result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row[0] != STATUS_DONE or row[1] is None:
+            return None
+        return pickle.loads(row[1])
+
+    def wait(self, job_id: str, timeout: float = None) -> dict:
+        """Block until the job has finished (or timeout); returns its status."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            st = self.status(job_id)
+            if st is None or st["status"] in FINISHED:
+                return st
+            if deadline is not None and time.monotonic() >= deadline:
+                return st
+            time.sleep(POLL_INTERVAL)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not started yet."""
+        with self._connect() as con:
+            cur = con.execute("UPDATE jobs SET status = ?, finished = ? WHERE id = ? AND status = ?",
+                              (STATUS_CANCELLED, time.time(), job_id, STATUS_QUEUED))
+        return cur.rowcount > 0
+
+    def purge(self, older_than: float = 24 * 3600) -> int:
+        """Delete finished jobs older than `older_than` seconds."""
+        with self._connect() as con:
+            cur = con.execute(f"DELETE FROM jobs WHERE status IN ({','.join('?' * len(FINISHED))}) AND finished < ?",
+                              (*FINISHED, time.time() - older_than))
+        return cur.rowcount
+
+    def counts(self) -> dict:
+        """{type: {status: n}} over the whole table."""
+        with self._connect() as con:
+            rows = con.execute("SELECT type, status, COUNT(*) FROM jobs GROUP BY type, status").fetchall()
+        out = {}
+        for job_type, status, n in rows:
+            out.setdefault(job_type, {})[status] = n
+        return out
+
+    def shutdown(self):
+        _live_owners.discard(self.owner)
+        self._stop.set()
+        self._wake.set()
+        self._dispatcher.join()
+        self._processes.shutdown(wait=False, cancel_futures=True)
+        self._threads.shutdown(wait=False, cancel_futures=True)
+
+    # --- dispatch ---
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(POLL_INTERVAL * 5)
+            self._wake.clear()
+            try:
+                self._dispatch()
+            except sqlite3.OperationalError:
+                continue  # database busy; retry on the next tick
+
+    def _dispatch(self):
+        for job_type, (fn, kind) in self.job_types.items():
+            with self._lock:
+                free = self.limits.get(job_type, 1) - self._running[job_type]
+            if free <= 0:
+                continue
+            with self._connect() as con:
+                rows = con.execute("SELECT id, payload FROM jobs WHERE status = ? AND type = ? ORDER BY created LIMIT ?",
+                                   (STATUS_QUEUED, job_type, free)).fetchall()
+                for job_id, payload in rows:
+                    # claim it; another server process sharing the database may have taken it meanwhile
+                    cur = con.execute("UPDATE jobs SET status = ?, started = ?, owner = ? WHERE id = ? AND status = ?",
+                                      (STATUS_RUNNING, time.time(), self.owner, job_id, STATUS_QUEUED))
+                    if cur.rowcount == 0:
+                        continue
+                    with self._lock:
+                        self._running[job_type] += 1
+                    executor = self._processes if kind == "process" else self._threads
+                    try:
+                        args, kwargs = pickle.loads(payload)
+                        future = executor.submit(fn, *args, **kwargs)
+                    except Exception as e:
+                        self._finish(job_id, job_type, None, executor, error=e)
+                        continue
+                    future.add_done_callback(lambda f, j=job_id, t=job_type, x=executor: self._finish(j, t, f, x))
+
+    def _finish(self, job_id: str, job_type: str, future, executor, error: Exception = None):
+        try:
+            if error is not None:
+                raise error
+            result = pickle.dumps(future.result(), protocol=pickle.HIGHEST_PROTOCOL)
+            status, error = STATUS_DONE, None
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # a worker died (e.g. out of memory); later jobs get a fresh pool
+                with self._lock:
+                    if self._processes is executor:
+                        self._processes = self._process_pool()
+            result, status, error = None, STATUS_FAILED, f"{type(e).__name__}: {e}"
+        with self._connect() as con:
+            con.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, payload = NULL WHERE id = ?",
+                        (status, result, error, time.time(), job_id))
+        with self._lock:
+            self._running[job_type] -= 1
+        self._wake.set()
@@ -0,0 +1,250 @@
+import os
+import re
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ----------------------
+# Local LLM (Ollama) client
+# ----------------------
+# One client per process (app.py holds it in st.cache_resource): a single
+# requests.Session keeps TCP connections to Ollama alive and pooled across
+# all user sessions instead of opening a new connection per question.
+
+OLLAMA_URL = "http://127.0.0.1:11434/api/generate"
+DEFAULT_MODEL = "phi3:mini"
+POOL_SIZE = 32
+# keep the model loaded between questions (Ollama unloads it after 5 minutes by default)
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+NUM_CTX = int(os.environ.get("OLLAMA_NUM_CTX", "2048"))   # model context window we ask for
+NUM_PREDICT = 384                                         # tokens reserved for the answer
+
+
+class OllamaClient:
+    def __init__(self, url: str = OLLAMA_URL, model: str = DEFAULT_MODEL, pool_size: int = POOL_SIZE,
+                 keep_alive: str = KEEP_ALIVE, num_ctx: int = NUM_CTX, num_predict: int = NUM_PREDICT):
+        self.url = url
+        self.model = model
+        self.keep_alive = keep_alive
+        self.options = {"num_ctx": num_ctx, "num_predict": num_predict}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def complete(self, prompt: str, system: str = None, context=None, model: str = None, timeout: int = 180) -> dict:
+        """
+        One /api/generate call. `system` goes in Ollama's system slot, ahead of
+        the prompt; `context` (token ids returned by the previous call) lets the
+        server continue from its cached state instead of re-evaluating the
+        conversation. Returns {"text", "context" (None on error), "ok"}.
+        """
+        try:
+            payload = {"model": model or self.model, "prompt": prompt, "stream": False,
+                       "keep_alive": self.keep_alive, "options": self.options}
+            if system:
+                payload["system"] = system
+            if context:
+                payload["context"] = context
+            res = self.session.post(self.url, json=payload, timeout=timeout)
+            if res.status_code == 200:
+                body = res.json()
+                # Best-effort extraction
+                if isinstance(body, dict):
+                    for k in ("response", "text", "result", "content"):
+                        if k in body and isinstance(body[k], str):
+                            return {"text": body[k], "context": body.get("context"), "ok": True}
+                    if "choices" in body and isinstance(body["choices"], list) and body["choices"]:
+                        ch = body["choices"][0]
+                        if isinstance(ch, dict) and "text" in ch:
+                            return {"text": ch["text"], "context": None, "ok": True}
+                return {"text": json.dumps(body), "context": None, "ok": True}
+            else:
+                return {"text": f"Ollama API returned HTTP {res.status_code}: {res.text}", "context": None, "ok": False}
+        except Exception as e:
+            return {"text": f"Could not contact local Ollama API: {e}", "context": None, "ok": False}
+
+    def generate(self, prompt: str, system: str = None, model: str = None, timeout: int = 180) -> str:
+        return self.complete(prompt, system=system, model=model, timeout=timeout)["text"]
+
+
+# ----------------------
+# Prompts
+# ----------------------
+# Fixed instructions go in the system slot and come first, so every call for
+# the same task starts with an identical prefix Ollama can reuse; the
+# variable report content follows.
+RECOMMENDATION_SYSTEM = """You are a responsible AI health assistant.
+
+Given a structured health analysis, provide:
+- General lifestyle suggestions (concise).
+- Diet recommendations (concise).
+- Exercise advice (concise).
+
+IMPORTANT:
+- Do NOT diagnose diseases.
+- Do NOT replace medical professionals.
+- Use supportive and safe language."""
+
+CHAT_SYSTEM = """You are a cautious clinical assistant. STRICT RULES:
+- ONLY use the report context you are given to answer.
+- DO NOT answer unrelated questions or provide programming/political/financial content.
+- If the question is not about the report, respond with:
+  "I can only answer questions related to the provided medical report."
+Answer succinctly, avoid speculation, and add a short suggestion to consult a clinician if appropriate."""
+
+REPORT_HEADER = """Overall severity: {severity}
+Identified conditions: {conditions}"""
+
+CHAT_TURN = """Report context (most relevant entries):
+{report_context}
+
+Reference notes:
+{guideline_context}
+
+User question: {question}"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English with numbers); no tokenizer needed."""
+    return (len(text) + 3) // 4
+
+
+def recommendation_prompt(row: dict) -> tuple:
+    """(system, prompt) for the expanded recommendations."""
+    summary = row.get("Findings_Paragraph", "") or "No findings."
+    return RECOMMENDATION_SYSTEM, f"Structured health analysis:\n{summary}"
+
+
+class PromptBuilder:
+    """
+    Lays out chat prompts as: fixed system prefix -> per-report header ->
+    conversation so far -> this turn (retrieved context + question), and keeps
+    the whole thing within `budget` tokens (context window minus the answer).
+
+    Over budget, the lowest-ranked retrieved entries go first, then the
+    oldest chat turns, which are folded into a one-line "earlier questions"
+    summary instead of being dropped silently.
+    """
+
+    def __init__(self, num_ctx: int = NUM_CTX, num_predict: int = NUM_PREDICT, history_share: float = 0.4):
+        self.budget = num_ctx - num_predict
+        self.history_share = history_share
+
+    def header(self, row: dict) -> str:
+        return REPORT_HEADER.format(
+            severity=row.get("Overall_Severity"),
+            conditions=row.get("Suspected_Diseases") or row.get("Provisional_Diagnosis"),
+        )
+
+    def turn(self, question: str, hits: dict, max_tokens: int) -> str:
+        from retrieval import format_context
+        hits = {"report": list(hits.get("report", [])), "guidelines": list(hits.get("guidelines", []))}
+        while True:
+            report_context, guideline_context = format_context(hits)
+            text = CHAT_TURN.format(report_context=report_context, guideline_context=guideline_context,
+                                    question=question)
+            if estimate_tokens(text) <= max_tokens or not (hits["report"] or hits["guidelines"]):
+                return text
+            # drop the weakest entry: guideline notes before report values
+            hits["guidelines" if hits["guidelines"] else "report"].pop()
+
+    def history(self, chat, max_tokens: int) -> str:
+        """Most recent (role, text) turns that fit, older user questions summarized in one line."""
+        chat = list(chat or [])
+        kept, used = [], 0
+        for role, text in reversed(chat):
+            line = f"{'User' if role == 'user' else 'Assistant'}: {text}"
+            cost = estimate_tokens(line) + 1
+            if used + cost > max_tokens:
+                break
+            kept.append(line)
+            used += cost
+        kept.reverse()
+        older = chat[: len(chat) - len(kept)]
+        asked = [str(text)[:80] for role, text in older if role == "user"]
+        lines = []
+        if asked:
+            summary = "Earlier the user asked about: " + "; ".join(asked)
+            lines.append(summary[: max(max_tokens - used, 0) * 4])
+        return "\n".join(l for l in lines + kept if l)
+
+    def chat_prompt(self, row: dict, question: str, hits: dict = None, chat=None) -> tuple:
+        """(system, prompt) for a fresh conversation state, within budget."""
+        if hits is None:
+            hits = {"report": [{"text": f"Findings: {row.get('Findings_Paragraph')}"}], "guidelines": []}
+        header = self.header(row)
+        fixed = estimate_tokens(CHAT_SYSTEM) + estimate_tokens(header)
+        history = self.history(chat, int((self.budget - fixed) * self.history_share))
+        turn = self.turn(question, hits, self.budget - fixed - estimate_tokens(history))
+        parts = [header] + (["Conversation so far:\n" + history] if history else []) + [turn]
+        return CHAT_SYSTEM, "\n\n".join(parts)
+
+    def continuation(self, question: str, hits: dict, context_tokens: int):
+        """Prompt for the next turn on top of the server's cached context, or None if it would not fit."""
+        room = self.budget - context_tokens
+        if room <= 0:
+            return None
+        text = self.turn(question, hits, room)
+        return text if estimate_tokens(text) <= room else None
+
+
+# ----------------------
+# Health-topic guard
+# ----------------------
+BLOCKED_WORDS = ["code", "python", "program", "linux", "windows", "politics", "president", "crypto", "bitcoin",
+                 "stock", "movie", "game", "weather", "dog", "cat", "pet", "animal", "veterinary"]
+ALLOWED_KEYWORDS = ["blood", "cholesterol", "ldl", "hdl", "triglycerides", "crp", "infection", "hemoglobin",
+                    "platelet", "kidney", "liver", "risk", "diagnosis", "report", "lab", "treatment",
+                    "recommendation", "disease", "symptom", "condition", "severity"]
+# whole words only (an optional plural "s"), so "available" is not "lab" and "decode" not "code"
+_BLOCKED_RE = re.compile(r"\b(?:" + "|".join(map(re.escape, BLOCKED_WORDS)) + r")s?\b")
+_ALLOWED_RE = re.compile(r"\b(?:" + "|".join(map(re.escape, ALLOWED_KEYWORDS)) + r")s?\b")
+
+
+def is_health_related(question: str, retriever=None) -> bool:
+    """
+    Blocked topics are refused outright. Otherwise a question passes on an
+    allowed keyword or, with a retrieval.ChatRetriever, on any of its health
+    terms (one set lookup per query token).
+    """
+    q = question.lower()
+    if _BLOCKED_RE.search(q) is not None:
+        return False
+    if _ALLOWED_RE.search(q) is not None:
+        return True
+    return retriever is not None and retriever.vocabulary_hit(question)
+
+
+# Questions the guard must refuse / accept (python llm_client.py checks them)
+GUARD_OFF_TOPIC = [
+    "Tell me a good joke",
+    "How high is Mount Everest?",
+    "What's the value of the euro?",
+    "How fast can a cheetah run?",
+    "What is a high score in chess?",
+    "available flights",
+    "Explain blood type of dogs",
+]
+GUARD_ON_TOPIC = [
+    "Is my sugar too high?",
+    "What does a low HbA1c mean?",
+    "Should I worry about my ferritin?",
+    "What foods help with anemia?",
+]
+
+
+def guard_mismatches(retriever=None) -> list:
+    """Example questions the guard classifies wrongly (empty when it behaves)."""
+    return ([q for q in GUARD_OFF_TOPIC if is_health_related(q, retriever)]
+            + [q for q in GUARD_ON_TOPIC if not is_health_related(q, retriever)])
+
+
+if __name__ == "__main__":
+    import sys
+    from retrieval import ChatRetriever
+    wrong = guard_mismatches(ChatRetriever())
+    for q in wrong:
+        print(f"misclassified: {q}")
+    sys.exit(1 if wrong else 0)
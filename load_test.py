@@ -0,0 +1,199 @@
+import os
+import time
+import random
+import argparse
+import threading
+
+import numpy as np
+
+import report_service
+from report_cache import ReportCache
+
+# ----------------------
+# Concurrent-session load test
+# ----------------------
+# Drives N simulated app sessions at once against ONE set of shared resources,
+# exactly as the Streamlit server holds them in st.cache_resource (one
+# pipeline, one ReportCache, one Ollama client). Each session repeats what a
+# user does: upload -> Run Report -> Generate PDF (-> LLM recommendations with
+# --llm). Reports latency percentiles per step and overall.
+#
+#   python load_test.py                     # 50 sessions, synthetic report texts
+#   python load_test.py --files reports/    # real uploads through OCR
+#   python load_test.py --sessions 100 --iterations 5 --dup-rate 0.5 --llm
+
+PERCENTILES = (50, 90, 95, 99)
+
+# printed the way lab reports print them; values drawn around typical ranges
+SYNTHETIC_FIELDS = [
+    ("Hemoglobin", "g/dL", 13.5, 2.0),
+    ("Total WBC Count", "cells/cumm", 8000, 2500),
+    ("Platelet Count", "lakh/cumm", 2.5, 0.8),
+    ("Total Cholesterol", "mg/dL", 190, 40),
+    ("Triglycerides", "mg/dL", 150, 60),
+    ("LDL Cholesterol", "mg/dL", 120, 35),
+    ("HDL Cholesterol", "mg/dL", 48, 12),
+    ("Fasting Blood Sugar", "mg/dL", 100, 25),
+    ("HbA1c", "%", 5.8, 1.0),
+    ("Serum Creatinine", "mg/dL", 1.0, 0.3),
+    ("CRP", "mg/L", 6, 8),
+]
+
+
+def synthetic_report(rng: random.Random) -> str:
+    lines = [
+        f"Patient Name: Patient {rng.randint(1, 10_000)}",
+        f"Patient ID: P{rng.randint(100_000, 999_999)}",
+        f"Age: {rng.randint(18, 85)} Years",
+        f"Gender: {rng.choice(['Male', 'Female'])}",
+    ]
+    for label, unit, mean, sd in SYNTHETIC_FIELDS:
+        lines.append(f"{label}    {max(rng.gauss(mean, sd), 0.1):.1f} {unit}")
+    return "\n".join(lines)
+
+
+def percentiles(samples) -> dict:
+    if not samples:
+        return {}
+    arr = np.asarray(samples) * 1000.0
+    out = {f"p{p}": float(np.percentile(arr, p)) for p in PERCENTILES}
+    out["max"] = float(arr.max())
+    out["n"] = len(arr)
+    return out
+
+
+class LoadTest:
+    def __init__(self, pipeline, cache, llm_client=None, files=None, dup_rate: float = 0.3, seed: int = 0):
+        self.pipeline = pipeline
+        self.cache = cache
+        self.llm_client = llm_client
+        self.files = files or []
+        self.dup_rate = dup_rate
+        self.seed = seed
+        self.timings = {}
+        self.errors = []
+        self._lock = threading.Lock()
+        self._pool = []   # earlier uploads, re-sent to model duplicate reports across users
+
+    def _record(self, step: str, seconds: float):
+        with self._lock:
+            self.timings.setdefault(step, []).append(seconds)
+
+    def _timed(self, step, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        out = fn(*args, **kwargs)
+        self._record(step, time.perf_counter() - t0)
+        return out
+
+    def _next_upload(self, rng: random.Random):
+        with self._lock:
+            if self._pool and rng.random() < self.dup_rate:
+                return rng.choice(self._pool)
+        if self.files:
+            path = rng.choice(self.files)
+            with open(path, "rb") as fh:
+                upload = (os.path.basename(path).lower(), fh.read(), None)
+        else:
+            text = synthetic_report(rng)
+            upload = ("synthetic.txt", text.encode("utf-8"), text)
+        with self._lock:
+            self._pool.append(upload)
+        return upload
+
+    def _upload(self, name, data, text):
+        if text is None:
+            return report_service.ocr_upload(self.pipeline, self.cache, name, data)
+        # synthetic: the "OCR" result is the text itself, cached per upload like a real one
+        key = report_service.upload_key(data)
+        entry_id, entry = self.cache.lookup(file_key=key, require="ocr_text")
+        if entry is None:
+            entry_id = self.cache.store(file_key=key, ocr_text=text)
+            entry = self.cache.get(entry_id)
+        return entry_id, entry
+
+    def session(self, sid: int, iterations: int, think: float):
+        rng = random.Random(self.seed * 100_003 + sid)
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            try:
+                name, data, text = self._next_upload(rng)
+                ocr_id, ocr_entry = self._timed("upload", self._upload, name, data, text)
+                report_id, row = self._timed("run_report", report_service.run_report, self.pipeline, self.cache,
+                                             name, ocr_entry["ocr_text"], ocr_id)
+                llm_text = None
+                if self.llm_client is not None:
+                    llm_text = self._timed("llm", report_service.llm_recommendations, self.llm_client, self.cache,
+                                           report_id, row)
+                self._timed("pdf", report_service.render_pdf, self.pipeline, self.cache, report_id, row, llm_text)
+                self._record("interaction", time.perf_counter() - t0)
+            except Exception as e:
+                with self._lock:
+                    self.errors.append(f"session {sid}: {e!r}")
+            if think:
+                time.sleep(rng.uniform(0, think))
+
+    def run(self, sessions: int = 50, iterations: int = 3, think: float = 0.0) -> dict:
+        threads = [threading.Thread(target=self.session, args=(i, iterations, think)) for i in range(sessions)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - t0
+        done = len(self.timings.get("interaction", []))
+        return {
+            "sessions": sessions,
+            "interactions": done,
+            "errors": len(self.errors),
+            "wall_s": wall,
+            "interactions_per_s": done / wall if wall > 0 else 0.0,
+            "latency_ms": {step: percentiles(samples) for step, samples in self.timings.items()},
+            "cache_entries": len(self.cache),
+        }
+
+
+def format_report(result: dict) -> str:
+    lines = [
+        f"{result['sessions']} sessions, {result['interactions']} interactions in {result['wall_s']:.2f}s "
+        f"({result['interactions_per_s']:.1f}/s), {result['errors']} errors, {result['cache_entries']} cache entries",
+        f"{'step':<12}" + "".join(f"{k:>10}" for k in [f"p{p}" for p in PERCENTILES] + ["max", "n"]),
+    ]
+    for step in ("upload", "run_report", "llm", "pdf", "interaction"):
+        pct = result["latency_ms"].get(step)
+        if not pct:
+            continue
+        cells = [f"{pct[f'p{p}']:>10.1f}" for p in PERCENTILES] + [f"{pct['max']:>10.1f}", f"{pct['n']:>10}"]
+        lines.append(f"{step:<12}" + "".join(cells))
+    lines.append("(latencies in ms)")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from pipeline import default_pipeline
+
+    ap = argparse.ArgumentParser(description="Concurrent-session load test on the app's shared resources.")
+    ap.add_argument("--sessions", type=int, default=50)
+    ap.add_argument("--iterations", type=int, default=3, help="interactions per session")
+    ap.add_argument("--think", type=float, default=0.0, help="max random pause between interactions (s)")
+    ap.add_argument("--dup-rate", type=float, default=0.3, help="share of uploads that repeat an earlier one")
+    ap.add_argument("--files", help="folder of real report PDFs/images (OCR'd); default: synthetic texts")
+    ap.add_argument("--llm", action="store_true", help="also request LLM recommendations from local Ollama")
+    ap.add_argument("--cache-size", type=int, default=256)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    files = None
+    if args.files:
+        files = [os.path.join(args.files, f) for f in sorted(os.listdir(args.files))
+                 if f.lower().endswith((".pdf", ".png", ".jpg", ".jpeg"))]
+    llm = None
+    if args.llm:
+        from llm_client import OllamaClient
+        llm = OllamaClient()
+
+    test = LoadTest(default_pipeline(confidence=bool(files)), ReportCache(max_entries=args.cache_size),
+                    llm_client=llm, files=files, dup_rate=args.dup_rate, seed=args.seed)
+    result = test.run(args.sessions, args.iterations, args.think)
+    print(format_report(result))
+    for err in test.errors[:5]:
+        print(err)
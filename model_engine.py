@@ -11,6 +11,8 @@ from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 
+from panel_schema import PanelBatch
+
 # ----------------------
 # Safe numeric helpers
 # ----------------------
@@ -138,26 +140,128 @@ def contextual_adjustments(row, cv_score_col="Cardiovascular_Risk_Score"):
     return adj
 
 
+# ----------------------
+# Panel families (sparse scoring)
+# ----------------------
+# Most uploads carry one or two lab families (a CBC, a lipid profile), yet
+# every rule used to run on every row against NaN-filled columns. Rows are
+# grouped by which families they actually have a value for, each rule set
+# runs only on the groups it reads, and the rest get the value the rule
+# returns on all-NaN input.
+LAB_FAMILIES = {
+    "lipid": ("Total_Cholesterol_mg_dL", "LDL_mg_dL", "HDL_mg_dL", "Triglycerides_mg_dL"),
+    "glucose": ("Fasting_Glucose_mg_dL",),
+    "vitals": ("Systolic_BP_mmHg", "Waist_Circumference_cm"),
+    "infection": ("CRP_mg_L", "Procalcitonin_ng_mL", "D_Dimer_mg_L"),
+    "liver": ("ALT_U_L", "AST_U_L", "Total_Bilirubin_mg_dL"),
+    "kidney": ("eGFR_mL_min_1_73m2",),
+    "anemia": ("Hemoglobin_g_dL",),
+    "vitamin_d": ("Vitamin_D_ng_mL",),
+}
+
+RATIO_COLUMNS = ["TC_HDL_Ratio", "LDL_HDL_Ratio", "Atherogenic_Index"]
+
+# Model 2 output column -> (rule, families it reads, value on all-NaN input)
+MODEL2_RULES = {
+    "Metabolic_Syndrome_Flags": (detect_metabolic_syndrome_flags, ("glucose", "lipid", "vitals"), 0),
+    "Cardiovascular_Risk_Score": (cardiovascular_risk_score, ("lipid", "vitals", "infection"), 0),
+    "Infection_Severity": (infection_severity_label, ("infection",), "Low"),
+    "Liver_Injury_Flag": (liver_injury_flag, ("liver",), False),
+    "Kidney_Risk_Stage": (kidney_risk_stage, ("kidney",), None),
+}
+
+
+def numeric_column(df, field) -> np.ndarray:
+    """as_num over one column (all NaN when the column is missing)."""
+    if field not in df.columns:
+        return np.full(len(df), np.nan)
+    col = df[field]
+    if pd.api.types.is_numeric_dtype(col.dtype):
+        return col.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.fromiter((as_num(v) for v in col), dtype=np.float64, count=len(col))
+
+
+def panel_presence(df, families=None) -> pd.DataFrame:
+    """Boolean frame (row x family): does the row hold at least one value of the family?"""
+    families = families or LAB_FAMILIES
+    return pd.DataFrame(
+        {fam: np.any([~np.isnan(numeric_column(df, f)) for f in fields], axis=0) if len(df) else np.zeros(0, bool)
+         for fam, fields in families.items()},
+        index=df.index,
+    )
+
+
+def panel_groups(presence: pd.DataFrame) -> list:
+    """[(frozenset of present families, row positions)] per distinct presence signature."""
+    if not len(presence):
+        return []
+    names = list(presence.columns)
+    bits = presence.to_numpy()
+    codes = bits.astype(np.int64) @ (1 << np.arange(len(names), dtype=np.int64))
+    groups = []
+    for code in np.unique(codes):
+        rows = np.flatnonzero(codes == code)
+        groups.append((frozenset(n for n, b in zip(names, bits[rows[0]]) if b), rows))
+    return groups
+
+
+def _rows_for(groups, families) -> np.ndarray:
+    """Positions of the rows whose signature includes any of `families`."""
+    hit = [rows for present, rows in groups if present.intersection(families)]
+    return np.sort(np.concatenate(hit)) if hit else np.zeros(0, dtype=np.int64)
+
+
+def _apply_rows(df, rows, fn, default) -> list:
+    """fn over the rows at `rows` (positions), `default` everywhere else."""
+    values = np.empty(len(df), dtype=object)
+    values[:] = [default] * len(df)
+    if len(rows):
+        values[rows] = df.iloc[rows].apply(fn, axis=1).tolist()
+    return values.tolist()
+
+
 # ----------------------
 # Integrator: run models on a DataFrame
 # ----------------------
-def run_models_on_df(df):
-    df = df.copy().reset_index(drop=True)
-    # compute ratios per-row
-    ratio_series = df.apply(compute_ratios, axis=1)
-    ratio_df = pd.DataFrame(list(ratio_series))
-    df = pd.concat([df.reset_index(drop=True), ratio_df.reset_index(drop=True)], axis=1)
+def run_models_on_df(df, sparse: bool = True):
+    """
+    Ratios, Model 2 detectors and Model 3 adjustments per row. With `sparse`
+    (default) each rule runs only on rows that have one of its lab families;
+    sparse=False runs every rule on every row (same output, reference path).
+    """
+    # a PanelBatch is widened into a fresh frame, so there is nothing to protect by copying
+    if isinstance(df, PanelBatch):
+        df = df.to_frame(widen=True)
+    else:
+        df = df.copy().reset_index(drop=True)
+    # one column per name (a duplicated label makes row.get return a Series); the later one wins
+    df = df.loc[:, ~df.columns.duplicated(keep="last")]
+    if sparse:
+        groups = panel_groups(panel_presence(df))
+    else:
+        groups = [(frozenset(LAB_FAMILIES), np.arange(len(df)))] if len(df) else []
+
+    # compute ratios (lipid rows only); TG / glucose come through as numbers
+    ratios = pd.DataFrame(np.nan, index=df.index, columns=RATIO_COLUMNS)
+    lipid_rows = _rows_for(groups, ("lipid",))
+    if len(lipid_rows):
+        computed = pd.DataFrame(list(df.iloc[lipid_rows].apply(compute_ratios, axis=1)))
+        ratios.iloc[lipid_rows] = computed[RATIO_COLUMNS].to_numpy(dtype=np.float64)
+    ratios["Fasting_Glucose_mg_dL"] = numeric_column(df, "Fasting_Glucose_mg_dL")
+    ratios["Triglycerides_mg_dL"] = numeric_column(df, "Triglycerides_mg_dL")
+    # replace, not duplicate, input columns of the same name (a duplicated label makes row.get return a Series)
+    df = pd.concat([df.drop(columns=[c for c in ratios.columns if c in df.columns]), ratios], axis=1)
 
     # Model 2 outputs
-    df["Metabolic_Syndrome_Flags"] = df.apply(detect_metabolic_syndrome_flags, axis=1)
-    df["Cardiovascular_Risk_Score"] = df.apply(cardiovascular_risk_score, axis=1)
-    df["Infection_Severity"] = df.apply(infection_severity_label, axis=1)
-    df["Liver_Injury_Flag"] = df.apply(liver_injury_flag, axis=1)
-    df["Kidney_Risk_Stage"] = df.apply(kidney_risk_stage, axis=1)
+    for col, (rule, families, default) in MODEL2_RULES.items():
+        df[col] = _apply_rows(df, _rows_for(groups, families), rule, default)
 
-    # Model 3
+    # Model 3 (age / gender apply to every row)
     adj_df = df.apply(contextual_adjustments, axis=1, result_type="expand")
-    df = pd.concat([df, adj_df], axis=1)
+    if len(df):
+        df = pd.concat([df.drop(columns=[c for c in adj_df.columns if c in df.columns]), adj_df], axis=1)
+    else:
+        df["Adjusted_Cardiovascular_Risk"] = pd.Series(dtype=np.int64)
 
     return df
 
@@ -165,89 +269,101 @@ def run_models_on_df(df):
 # ----------------------
 # Synthesis + disease identification + recommendations
 # ----------------------
-def synthesize_findings(row):
+def synthesize_findings(row, families=None):
+    """
+    Findings, severity, conditions and recommendations for one scored row.
+    `families`: the SYNTHESIS_FAMILIES the row has (see synthesis_presence);
+    sections for the others are skipped. None runs every section.
+    """
     findings = []
     recommendations = []
     severity_score = 0
     suspected = []
 
     # cardiovascular
-    cv = _num(row.get("Cardiovascular_Risk_Score", np.nan))
-    if cv and cv > 4:
-        suspected.append("High Cardiovascular Risk")
-        findings.append("Elevated cardiovascular risk score.")
-        recommendations.append("Consult cardiology; consider lipid-lowering therapy and lifestyle changes.")
-        severity_score += 4
+    if families is None or "cardio" in families:
+        cv = _num(row.get("Cardiovascular_Risk_Score", np.nan))
+        if cv and cv > 4:
+            suspected.append("High Cardiovascular Risk")
+            findings.append("Elevated cardiovascular risk score.")
+            recommendations.append("Consult cardiology; consider lipid-lowering therapy and lifestyle changes.")
+            severity_score += 4
 
     # lipids
-    tg = _num(row.get("Triglycerides_mg_dL", np.nan))
-    ldl = _num(row.get("LDL_mg_dL", np.nan))
-    hdl = _num(row.get("HDL_mg_dL", np.nan))
-    if tg and tg > 200:
-        suspected.append("Hypertriglyceridemia")
-        findings.append(f"High triglycerides ({int(tg)} mg/dL).")
-        recommendations.append("Reduce refined carbs & alcohol; increase activity; repeat lipid panel.")
-        severity_score += 2
-    if ldl and ldl >= 160:
-        suspected.append("Severe Hypercholesterolemia")
-        findings.append(f"Markedly elevated LDL ({int(ldl)} mg/dL).")
-        recommendations.append("Consider statin therapy after clinical review.")
-        severity_score += 3
-    if hdl and hdl < 40:
-        suspected.append("Low HDL Syndrome")
-        findings.append(f"Low HDL ({int(hdl)} mg/dL).")
-        recommendations.append("Increase physical activity and healthy fats (e.g., oily fish).")
-        severity_score += 1
+    if families is None or "lipid" in families:
+        tg = _num(row.get("Triglycerides_mg_dL", np.nan))
+        ldl = _num(row.get("LDL_mg_dL", np.nan))
+        hdl = _num(row.get("HDL_mg_dL", np.nan))
+        if tg and tg > 200:
+            suspected.append("Hypertriglyceridemia")
+            findings.append(f"High triglycerides ({int(tg)} mg/dL).")
+            recommendations.append("Reduce refined carbs & alcohol; increase activity; repeat lipid panel.")
+            severity_score += 2
+        if ldl and ldl >= 160:
+            suspected.append("Severe Hypercholesterolemia")
+            findings.append(f"Markedly elevated LDL ({int(ldl)} mg/dL).")
+            recommendations.append("Consider statin therapy after clinical review.")
+            severity_score += 3
+        if hdl and hdl < 40:
+            suspected.append("Low HDL Syndrome")
+            findings.append(f"Low HDL ({int(hdl)} mg/dL).")
+            recommendations.append("Increase physical activity and healthy fats (e.g., oily fish).")
+            severity_score += 1
 
     # liver
-    if row.get("Liver_Injury_Flag"):
-        suspected.append("Probable Liver Injury")
-        findings.append("Abnormal transaminases / bilirubin suggest liver injury.")
-        recommendations.append("Immediate clinical review; repeat LFTs and review medications/toxins.")
-        severity_score += 4
+    if families is None or "liver" in families:
+        if row.get("Liver_Injury_Flag"):
+            suspected.append("Probable Liver Injury")
+            findings.append("Abnormal transaminases / bilirubin suggest liver injury.")
+            recommendations.append("Immediate clinical review; repeat LFTs and review medications/toxins.")
+            severity_score += 4
 
     # kidney
-    kstage = row.get("Kidney_Risk_Stage")
-    if isinstance(kstage, str) and kstage in ("G4", "G5"):
-        suspected.append("Advanced Chronic Kidney Disease")
-        findings.append(f"Reduced kidney function (stage {kstage}).")
-        recommendations.append("Urgent nephrology referral; review medications and BP control.")
-        severity_score += 4
-    elif isinstance(kstage, str) and kstage.startswith("G"):
-        suspected.append("Reduced Kidney Function")
-        findings.append(f"Estimated kidney stage: {kstage}.")
-        recommendations.append("Consider urine albumin testing and BP optimization.")
-        severity_score += 1
+    if families is None or "kidney" in families:
+        kstage = row.get("Kidney_Risk_Stage")
+        if isinstance(kstage, str) and kstage in ("G4", "G5"):
+            suspected.append("Advanced Chronic Kidney Disease")
+            findings.append(f"Reduced kidney function (stage {kstage}).")
+            recommendations.append("Urgent nephrology referral; review medications and BP control.")
+            severity_score += 4
+        elif isinstance(kstage, str) and kstage.startswith("G"):
+            suspected.append("Reduced Kidney Function")
+            findings.append(f"Estimated kidney stage: {kstage}.")
+            recommendations.append("Consider urine albumin testing and BP optimization.")
+            severity_score += 1
 
     # infection / inflammation
-    inf = str(row.get("Infection_Severity", "")).lower()
-    crp = _num(row.get("CRP_mg_L", np.nan))
-    if inf == "high" or (crp and crp > 100):
-        suspected.append("Severe Infection / Systemic Inflammation")
-        findings.append(f"High inflammation markers (CRP {crp}).")
-        recommendations.append("Urgent evaluation and targeted microbial testing as indicated.")
-        severity_score += 4
-    elif inf == "moderate" or (crp and crp > 10):
-        suspected.append("Inflammation")
-        findings.append(f"Moderate inflammatory markers (CRP {crp}).")
-        recommendations.append("Clinical correlation and repeat tests recommended.")
-        severity_score += 2
+    if families is None or "infection" in families:
+        inf = str(row.get("Infection_Severity", "")).lower()
+        crp = _num(row.get("CRP_mg_L", np.nan))
+        if inf == "high" or (crp and crp > 100):
+            suspected.append("Severe Infection / Systemic Inflammation")
+            findings.append(f"High inflammation markers (CRP {crp}).")
+            recommendations.append("Urgent evaluation and targeted microbial testing as indicated.")
+            severity_score += 4
+        elif inf == "moderate" or (crp and crp > 10):
+            suspected.append("Inflammation")
+            findings.append(f"Moderate inflammatory markers (CRP {crp}).")
+            recommendations.append("Clinical correlation and repeat tests recommended.")
+            severity_score += 2
 
     # anemia
-    hb = _num(row.get("Hemoglobin_g_dL", np.nan))
-    if hb and hb < 11:
-        suspected.append("Anemia")
-        findings.append(f"Low hemoglobin ({hb} g/dL).")
-        recommendations.append("Check iron studies, B12/folate; evaluate for blood loss.")
-        severity_score += 2
+    if families is None or "anemia" in families:
+        hb = _num(row.get("Hemoglobin_g_dL", np.nan))
+        if hb and hb < 11:
+            suspected.append("Anemia")
+            findings.append(f"Low hemoglobin ({hb} g/dL).")
+            recommendations.append("Check iron studies, B12/folate; evaluate for blood loss.")
+            severity_score += 2
 
     # vitamin D
-    vitd = _num(row.get("Vitamin_D_ng_mL", np.nan))
-    if vitd and vitd < 20:
-        suspected.append("Vitamin D Deficiency")
-        findings.append(f"Low Vitamin D ({int(vitd)} ng/mL).")
-        recommendations.append("Consider supplementation per local guidelines.")
-        severity_score += 1
+    if families is None or "vitamin_d" in families:
+        vitd = _num(row.get("Vitamin_D_ng_mL", np.nan))
+        if vitd and vitd < 20:
+            suspected.append("Vitamin D Deficiency")
+            findings.append(f"Low Vitamin D ({int(vitd)} ng/mL).")
+            recommendations.append("Consider supplementation per local guidelines.")
+            severity_score += 1
 
     # finalize severity
     if severity_score >= 8:
@@ -271,11 +387,59 @@ def synthesize_findings(row):
         "recommendations_list": recommendations if recommendations else ["No recommendations generated."]
     }
 
-def synthesize_and_recommend_df(df):
+# Families synthesize_findings has a section for. Scored outputs count as present
+# unless they hold their absent-family default, so a row scored elsewhere still
+# gets every section that could fire.
+SYNTHESIS_FAMILIES = ("cardio", "lipid", "liver", "kidney", "infection", "anemia", "vitamin_d")
+
+
+def _truthy(v) -> bool:
+    try:
+        return bool(v)
+    except (TypeError, ValueError):
+        return True  # ambiguous (e.g. pd.NA): let the section itself decide
+
+
+def synthesis_presence(df) -> pd.DataFrame:
+    """Boolean frame (row x SYNTHESIS_FAMILIES) of the sections that can produce a finding for each row."""
+    presence = panel_presence(df, {f: LAB_FAMILIES[f] for f in ("lipid", "infection", "anemia", "vitamin_d")})
+    cv = numeric_column(df, "Cardiovascular_Risk_Score")
+    presence["cardio"] = ~np.isnan(cv) & (cv != 0)
+    liver = df["Liver_Injury_Flag"] if "Liver_Injury_Flag" in df.columns else [None] * len(df)
+    presence["liver"] = [v is not None and _truthy(v) for v in liver]
+    kidney = df["Kidney_Risk_Stage"] if "Kidney_Risk_Stage" in df.columns else [None] * len(df)
+    presence["kidney"] = [isinstance(v, str) for v in kidney]
+    if "Infection_Severity" in df.columns:
+        label = df["Infection_Severity"].map(lambda v: str(v).lower() in ("high", "moderate")).to_numpy(dtype=bool)
+        presence["infection"] = presence["infection"].to_numpy() | label
+    return presence[list(SYNTHESIS_FAMILIES)]
+
+
+def synthesize_and_recommend_df(df, sparse: bool = True):
+    """
+    One merged row per scored row. With `sparse`, rows are grouped by their
+    synthesis_presence signature: a group where no section can fire shares one
+    empty result, the others run only their own sections, and rows are read
+    as plain records instead of one Series per row.
+    """
+    if sparse and not df.columns.has_duplicates:
+        records = df.to_dict("records")
+        results = [None] * len(df)
+        for present, positions in panel_groups(synthesis_presence(df)):
+            if not present:
+                empty = synthesize_findings({}, present)
+                for i in positions:
+                    results[i] = empty
+                continue
+            for i in positions:
+                results[i] = synthesize_findings(records[i], present)
+    else:
+        records, results = [], []
+        for _, row in df.iterrows():
+            records.append(row.to_dict())
+            results.append(synthesize_findings(row))
     rows = []
-    for _, row in df.iterrows():
-        s = synthesize_findings(row)
-        merged = {**row.to_dict()}
+    for merged, s in zip(records, results):
         merged.update({
             "Findings_Paragraph": s["findings_paragraph"],
             "Overall_Severity": s["overall_severity"],
@@ -289,6 +453,59 @@ def synthesize_and_recommend_df(df):
 # ----------------------
 # OCR text parser (used by the Streamlit app)
 # ----------------------
+# Label variants per numeric lab field, in the order parse_parameters emits them.
+# Plain labels match literally; labels containing a backslash are regexes (see label_regex).
+NUMERIC_LABELS = {
+    # Hematology
+    "Hemoglobin_g_dL": ["Hemoglobin", r"\bHb\b"],
+    "WBC_cells_uL": ["WBC", "White Blood Cells", "WBC cells", "Total Leukocyte Count", r"\bTLC\b"],
+    "Platelets_lakh_uL": ["Platelets", "Platelet"],
+    "Hematocrit_percent": ["Hematocrit", "Hct"],
+
+    # Iron/vitamins
+    "Serum_Iron_ug_dL": ["Serum Iron"],
+    "Serum_Ferritin_ng_mL": ["Serum Ferritin", "Ferritin"],
+    "Vitamin_B12_pg_mL": ["Vitamin B12", r"\bB12\b"],
+    "Folate_ng_mL": ["Folate"],
+
+    # Biochemistry / liver
+    "ALT_U_L": ["ALT", "SGPT"],
+    "AST_U_L": ["AST", "SGOT"],
+    "Total_Bilirubin_mg_dL": ["Total Bilirubin", "Bilirubin", r"\bT\.Bili\b"],
+
+    # Kidney
+    "Serum_Creatinine_mg_dL": ["Serum Creatinine", "Creatinine"],
+    "eGFR_mL_min_1_73m2": ["eGFR", "eGFR mL"],
+
+    # Lipids / glucose
+    "Total_Cholesterol_mg_dL": ["Total Cholesterol", "Cholesterol"],
+    "LDL_mg_dL": ["LDL"],
+    "HDL_mg_dL": ["HDL"],
+    "Triglycerides_mg_dL": ["Triglycerides", "Triglyceride", r"\bTG\b"],
+    "Fasting_Glucose_mg_dL": ["Fasting Glucose", "Glucose", "Fasting Blood Sugar", "FBS"],
+    "HbA1c_percent": ["HbA1c", "A1c"],
+
+    # Inflammation
+    "CRP_mg_L": ["CRP", "C-reactive protein"],
+    "Procalcitonin_ng_mL": ["Procalcitonin", "PCT"],
+    "D_Dimer_mg_L": ["D-Dimer", "D Dimer"],
+}
+
+
+def label_regex(label: str) -> str:
+    """Regex source for a label: r"\\bHb\\b"-style entries as written, plain labels escaped."""
+    return label if "\\" in label else re.escape(label)
+
+
+def numeric_pattern(label: str) -> str:
+    """
+    Regex for `label ... value` as used by parse_parameters. Named groups:
+    `gap` (text between label and value), `value`, `tail` (rest of the line,
+    where the unit usually is).
+    """
+    return rf"{label_regex(label)}(?P<gap>[^\d\n\r\-]*)[:\-]?\s*(?P<value>[-+]?\d*\.?\d+)(?P<tail>[^\n\r]*)"
+
+
 def parse_parameters(text: str) -> dict:
     """
     Permissive regex-based parser for common lab report labels.
@@ -296,11 +513,10 @@ def parse_parameters(text: str) -> dict:
     """
     def extract_numeric(label_variants):
         for label in label_variants:
-            p = rf"{re.escape(label)}[^\d\n\r\-]*[:\-]?\s*([-+]?\d*\.?\d+)"
-            m = re.search(p, text, re.IGNORECASE)
+            m = re.search(numeric_pattern(label), text, re.IGNORECASE)
             if m:
                 try:
-                    return float(m.group(1))
+                    return float(m.group("value"))
                 except:
                     pass
         return np.nan
@@ -321,39 +537,9 @@ def parse_parameters(text: str) -> dict:
     out["Age"] = int(age) if not np.isnan(age) else np.nan
     out["Gender"] = extract_text(["Gender", "Sex"])
 
-    # Hematology
-    out["Hemoglobin_g_dL"] = extract_numeric(["Hemoglobin", r"\bHb\b"])
-    out["WBC_cells_uL"] = extract_numeric(["WBC", "White Blood Cells", "WBC cells"])
-    out["Platelets_lakh_uL"] = extract_numeric(["Platelets", "Platelet"])
-    out["Hematocrit_percent"] = extract_numeric(["Hematocrit", "Hct"])
-
-    # Iron/vitamins
-    out["Serum_Iron_ug_dL"] = extract_numeric(["Serum Iron"])
-    out["Serum_Ferritin_ng_mL"] = extract_numeric(["Serum Ferritin", "Ferritin"])
-    out["Vitamin_B12_pg_mL"] = extract_numeric(["Vitamin B12", r"\bB12\b"])
-    out["Folate_ng_mL"] = extract_numeric(["Folate"])
-
-    # Biochemistry / liver
-    out["ALT_U_L"] = extract_numeric(["ALT", "SGPT"])
-    out["AST_U_L"] = extract_numeric(["AST", "SGOT"])
-    out["Total_Bilirubin_mg_dL"] = extract_numeric(["Total Bilirubin", "Bilirubin", r"\bT\.Bili\b"])
-
-    # Kidney
-    out["Serum_Creatinine_mg_dL"] = extract_numeric(["Serum Creatinine", "Creatinine"])
-    out["eGFR_mL_min_1_73m2"] = extract_numeric(["eGFR", "eGFR mL"])
-
-    # Lipids / glucose
-    out["Total_Cholesterol_mg_dL"] = extract_numeric(["Total Cholesterol", "Cholesterol"])
-    out["LDL_mg_dL"] = extract_numeric(["LDL"])
-    out["HDL_mg_dL"] = extract_numeric(["HDL"])
-    out["Triglycerides_mg_dL"] = extract_numeric(["Triglycerides", "Triglyceride", r"\bTG\b"])
-    out["Fasting_Glucose_mg_dL"] = extract_numeric(["Fasting Glucose", "Glucose", "Fasting Blood Sugar", "FBS"])
-    out["HbA1c_percent"] = extract_numeric(["HbA1c", "A1c"])
-
-    # Inflammation
-    out["CRP_mg_L"] = extract_numeric(["CRP", "C-reactive protein"])
-    out["Procalcitonin_ng_mL"] = extract_numeric(["Procalcitonin", "PCT"])
-    out["D_Dimer_mg_L"] = extract_numeric(["D-Dimer", "D Dimer"])
+    # Lab values
+    for field, labels in NUMERIC_LABELS.items():
+        out[field] = extract_numeric(labels)
 
     # Misc textual fields
     out["Peripheral_Smear_Result"] = extract_text(["Peripheral Smear Result", "Peripheral Smear"])
@@ -363,6 +549,11 @@ def parse_parameters(text: str) -> dict:
     return out
 
 
+def parse_panels(texts) -> PanelBatch:
+    """Parse many OCR texts straight into a compact PanelBatch."""
+    return PanelBatch.from_records(parse_parameters(t) for t in texts)
+
+
 # ----------------------
 # Simple PDF generator (returns bytes)
 # ----------------------
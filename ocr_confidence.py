@@ -0,0 +1,200 @@
+import re
+
+import numpy as np
+import pytesseract
+from PIL import Image, ImageOps
+
+from model_engine import NUMERIC_LABELS, numeric_pattern, parse_parameters
+
+# ----------------------
+# Confidence-aware OCR
+# ----------------------
+# image_to_string gives no hint that "12.0" was really read as "12.6" with
+# 40% confidence. Here the page is OCR'd once with image_to_data (word boxes +
+# confidences), each extracted value is traced back to its words, and only
+# the low-confidence value crops get a second, digits-only OCR pass at a
+# higher resolution.
+
+LOW_CONFIDENCE = 80.0
+REOCR_SCALE = 3
+REOCR_CONFIG = "--psm 7 -c tessedit_char_whitelist=0123456789.-"
+_NUM_RE = re.compile(r"[-+]?\d*\.?\d+")
+
+
+def ocr_words(images) -> list:
+    """Word-level OCR of every page: text, confidence (0-100), page, box and line id."""
+    words = []
+    for page, img in enumerate(images):
+        d = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+        for i, w in enumerate(d["text"]):
+            if not w or not w.strip():
+                continue
+            words.append({
+                "text": w,
+                "conf": float(d["conf"][i]),
+                "page": page,
+                "box": (d["left"][i], d["top"][i], d["width"][i], d["height"][i]),
+                "line": (page, d["block_num"][i], d["par_num"][i], d["line_num"][i]),
+            })
+    return words
+
+
+def layout_text(words) -> tuple:
+    """
+    Rebuild the text from word boxes (words on one line joined by a space,
+    lines by a newline). Returns (text, spans), spans[i] being the
+    (start, end) offsets of words[i] in text.
+    """
+    parts, spans = [], []
+    pos = 0
+    prev_line = None
+    for w in words:
+        if prev_line is not None:
+            parts.append(" " if w["line"] == prev_line else "\n")
+            pos += 1
+        spans.append((pos, pos + len(w["text"])))
+        parts.append(w["text"])
+        pos += len(w["text"])
+        prev_line = w["line"]
+    return "".join(parts), spans
+
+
+def page_texts(text: str, words, spans, edits: dict, n_pages: int) -> list:
+    """
+    Per-page slices of the layout text (before edits are written back into
+    it), each with the re-read values that fall on it applied. Pages without
+    words come out as "".
+    """
+    bounds = {}
+    for w, (start, end) in zip(words, spans):
+        lo, hi = bounds.get(w["page"], (start, end))
+        bounds[w["page"]] = (min(lo, start), max(hi, end))
+    out = []
+    for page in range(n_pages):
+        if page not in bounds:
+            out.append("")
+            continue
+        lo, hi = bounds[page]
+        t = text[lo:hi]
+        for (start, end), (new_value, _) in sorted(edits.items(), reverse=True):
+            if lo <= start and end <= hi:
+                t = t[:start - lo] + new_value + t[end - lo:]
+        out.append(t)
+    return out
+
+
+def value_spans(text: str) -> dict:
+    """field -> (start, end) of the value parse_parameters reads for it."""
+    out = {}
+    for field, labels in NUMERIC_LABELS.items():
+        for label in labels:
+            m = re.search(numeric_pattern(label), text, re.IGNORECASE)
+            if m:
+                out[field] = m.span("value")
+                break
+    return out
+
+
+def _words_in(spans, start, end) -> list:
+    return [i for i, (ws, we) in enumerate(spans) if ws < end and we > start]
+
+
+def _value_box(word, spans_i, start, end) -> tuple:
+    """Box of the value's characters inside a word (e.g. '12.0' of '12.0g/dL')."""
+    l, t, w, h = word["box"]
+    ws, we = spans_i
+    n = max(we - ws, 1)
+    x0 = l + w * max(start - ws, 0) / n
+    x1 = l + w * min(end - ws, n) / n
+    return int(x0), t, max(int(round(x1 - x0)), 1), h
+
+
+def _union_box(boxes) -> tuple:
+    l = min(b[0] for b in boxes)
+    t = min(b[1] for b in boxes)
+    r = max(b[0] + b[2] for b in boxes)
+    btm = max(b[1] + b[3] for b in boxes)
+    return l, t, r - l, btm - t
+
+
+def reocr_value(image, box, scale: int = REOCR_SCALE, pad: int = 4) -> tuple:
+    """
+    Digits-only OCR of one small crop at `scale`x resolution. `image` is a PIL
+    image or a page file path (rasterize.RasterPages(paths_only=True)), opened
+    just for the crop. Returns (value str or None, confidence).
+    """
+    l, t, w, h = box
+    if isinstance(image, str):
+        with Image.open(image) as page:
+            crop = page.crop((max(l - pad, 0), max(t - pad, 0), l + w + pad, t + h + pad))
+    else:
+        crop = image.crop((max(l - pad, 0), max(t - pad, 0), l + w + pad, t + h + pad))
+    crop = ImageOps.grayscale(crop)
+    crop = crop.resize((crop.width * scale, crop.height * scale), Image.LANCZOS)
+    d = pytesseract.image_to_data(crop, config=REOCR_CONFIG, output_type=pytesseract.Output.DICT)
+    toks = [(t_, float(c)) for t_, c in zip(d["text"], d["conf"]) if t_ and t_.strip() and float(c) >= 0]
+    if not toks:
+        return None, np.nan
+    m = _NUM_RE.search("".join(t_ for t_, _ in toks))
+    if not m:
+        return None, np.nan
+    return m.group(), min(c for _, c in toks)
+
+
+def extract_with_confidence(images, low_confidence: float = LOW_CONFIDENCE, refine: bool = True) -> dict:
+    """
+    OCR `images` (the pages of one report, as PIL images or file paths) and attach a confidence to every
+    numeric field parse_parameters extracts.
+
+    Fields below `low_confidence` are re-OCR'd from their value crop only; the
+    re-read replaces the original when it is more confident, and is written
+    back into the returned text so the editable OCR text and the parsed values
+    agree.
+
+    Returns {"text", "pages" (the text of each page), "values" (parse_parameters output), "confidence"
+    ({field: 0-100}), "refined" ([fields re-read]), "low_confidence" ([fields still below threshold])}.
+    """
+    images = list(images)
+    words = ocr_words(images)
+    text, spans = layout_text(words)
+
+    confidence = {}
+    edits = {}
+    refined = []
+    for field, (start, end) in value_spans(text).items():
+        idx = _words_in(spans, start, end)
+        confs = [words[i]["conf"] for i in idx if words[i]["conf"] >= 0]
+        conf = min(confs) if confs else np.nan
+        confidence[field] = conf
+
+        if not refine or not idx or (not np.isnan(conf) and conf >= low_confidence):
+            continue
+        if (start, end) in edits:
+            # several fields matched the same value: reuse the one re-read
+            new_value, new_conf = edits[(start, end)]
+        else:
+            i = idx[0]
+            if len(idx) == 1:
+                box = _value_box(words[i], spans[i], start, end)
+            else:
+                box = _union_box([words[j]["box"] for j in idx if words[j]["page"] == words[i]["page"]])
+            new_value, new_conf = reocr_value(images[words[i]["page"]], box)
+        if new_value is not None and (np.isnan(conf) or new_conf > conf):
+            edits[(start, end)] = (new_value, new_conf)
+            confidence[field] = new_conf
+            refined.append(field)
+
+    pages = page_texts(text, words, spans, edits, len(images))
+    # write re-read values back, right to left so earlier offsets stay valid
+    for (start, end), (new_value, _) in sorted(edits.items(), reverse=True):
+        text = text[:start] + new_value + text[end:]
+
+    low = sorted(f for f, c in confidence.items() if np.isnan(c) or c < low_confidence)
+    return {
+        "text": text,
+        "pages": pages,
+        "values": parse_parameters(text),
+        "confidence": confidence,
+        "refined": refined,
+        "low_confidence": low,
+    }
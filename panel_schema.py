@@ -0,0 +1,212 @@
+import numpy as np
+import pandas as pd
+
+# ----------------------
+# Panel schema
+# ----------------------
+# A library-level layout for large batches (cohort files, parse_panels,
+# Arrow I/O). The app and pipeline stages still pass parsed dicts, which carry
+# per-report extras (units, confidence, reference-range flags) this fixed
+# schema does not hold; run_models_on_df accepts either.
+# Numeric fields produced by model_engine.parse_parameters, stored as float32.
+LAB_FIELDS = (
+    "Age",
+    "Hemoglobin_g_dL", "WBC_cells_uL", "Platelets_lakh_uL", "Hematocrit_percent",
+    "Serum_Iron_ug_dL", "Serum_Ferritin_ng_mL", "Vitamin_B12_pg_mL", "Folate_ng_mL",
+    "ALT_U_L", "AST_U_L", "Total_Bilirubin_mg_dL",
+    "Serum_Creatinine_mg_dL", "eGFR_mL_min_1_73m2",
+    "Total_Cholesterol_mg_dL", "LDL_mg_dL", "HDL_mg_dL", "Triglycerides_mg_dL",
+    "Fasting_Glucose_mg_dL", "HbA1c_percent",
+    "CRP_mg_L", "Procalcitonin_ng_mL", "D_Dimer_mg_L",
+)
+
+# Free-text fields, stored as pandas categoricals (codes + one copy of each distinct string).
+TEXT_FIELDS = (
+    "Patient_ID", "Patient_Name", "Gender",
+    "Peripheral_Smear_Result", "Provisional_Diagnosis", "Fasting_Status",
+)
+
+PANEL_FIELDS = TEXT_FIELDS[:3] + LAB_FIELDS + TEXT_FIELDS[3:]
+
+_LAB_INDEX = {f: i for i, f in enumerate(LAB_FIELDS)}
+_NUM_RE = r"([-+]?\d*\.?\d+)"
+
+
+def _to_float32(values) -> np.ndarray:
+    """Vectorized equivalent of model_engine.as_num, returning float32."""
+    s = pd.Series(values, dtype=object)
+    out = pd.to_numeric(s, errors="coerce")
+    bad = out.isna() & s.notna()
+    if bad.any():
+        out[bad] = pd.to_numeric(s[bad].astype(str).str.extract(_NUM_RE, expand=False), errors="coerce")
+    return out.to_numpy(dtype=np.float32, na_value=np.nan)
+
+
+WIDEN_DIGITS = 7  # float32 holds ~7.2 significant decimal digits
+
+
+def _widen(col: np.ndarray) -> np.ndarray:
+    """
+    float32 -> float64 rounded to WIDEN_DIGITS significant digits, so 12.3
+    comes back as 12.3 rather than 12.300000190734863 (findings text prints
+    raw values).
+    """
+    x = np.asarray(col, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        exponent = np.floor(np.log10(np.abs(x)))
+    scale = (WIDEN_DIGITS - 1) - np.where(np.isfinite(exponent), exponent, 0).astype(np.int64)
+    factor = 10.0 ** np.abs(scale)
+    up = scale >= 0
+    # divide/multiply by an exact power of ten so the result is the double nearest the decimal
+    return np.where(up, np.round(x * factor) / factor, np.round(x / factor) * factor)
+
+
+# ----------------------
+# Columnar panel batch
+# ----------------------
+class PanelBatch:
+    """
+    A batch of lab panels in a fixed, compact layout.
+
+    `values` is an (n, len(LAB_FIELDS)) float32 matrix in column-major order,
+    so every analyte is one contiguous column and the whole matrix maps onto a
+    single pandas block without copying. `text` maps each TEXT_FIELDS name to a
+    pandas Categorical of length n.
+    """
+
+    __slots__ = ("values", "text")
+
+    def __init__(self, values: np.ndarray, text: dict):
+        self.values = np.asfortranarray(values, dtype=np.float32)
+        self.text = text
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        n = self.values.nbytes
+        for cat in self.text.values():
+            n += cat.codes.nbytes + sum(len(str(c)) for c in cat.categories)
+        return n
+
+    def column(self, field: str) -> np.ndarray:
+        """Contiguous float32 view of one analyte."""
+        return self.values[:, _LAB_INDEX[field]]
+
+    @classmethod
+    def from_records(cls, records):
+        """Build from parse_parameters() dicts."""
+        records = list(records)
+        values = np.empty((len(records), len(LAB_FIELDS)), dtype=np.float32, order="F")
+        for j, f in enumerate(LAB_FIELDS):
+            values[:, j] = _to_float32([r.get(f, np.nan) for r in records])
+        text = {f: pd.Categorical([r.get(f, "") or "" for r in records]) for f in TEXT_FIELDS}
+        return cls(values, text)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        n = len(df)
+        values = np.full((n, len(LAB_FIELDS)), np.nan, dtype=np.float32, order="F")
+        for j, f in enumerate(LAB_FIELDS):
+            if f in df.columns:
+                values[:, j] = _to_float32(df[f].to_numpy())
+        text = {}
+        for f in TEXT_FIELDS:
+            if f in df.columns:
+                text[f] = pd.Categorical(df[f].fillna("").astype(str))
+            else:
+                text[f] = pd.Categorical([""] * n)
+        return cls(values, text)
+
+    def to_frame(self, widen: bool = False) -> pd.DataFrame:
+        """
+        DataFrame view of the batch. By default the float32 matrix is shared,
+        not copied. widen=True returns float64 lab columns with the decimal
+        values as parsed, which is what model_engine scores against.
+        """
+        if widen:
+            frame = pd.DataFrame({f: _widen(self.values[:, j]) for j, f in enumerate(LAB_FIELDS)})
+        else:
+            frame = pd.DataFrame(self.values, columns=list(LAB_FIELDS), copy=False)
+        for f in TEXT_FIELDS:
+            frame[f] = self.text[f]
+        return frame
+
+    def to_arrow(self):
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("PanelBatch.to_arrow requires pyarrow (pip install pyarrow)") from e
+        arrays = {}
+        for f in TEXT_FIELDS[:3]:
+            arrays[f] = pa.array(self.text[f])
+        for j, f in enumerate(LAB_FIELDS):
+            arrays[f] = pa.array(self.values[:, j], from_pandas=True)
+        for f in TEXT_FIELDS[3:]:
+            arrays[f] = pa.array(self.text[f])
+        return pa.table(arrays)
+
+    @classmethod
+    def from_arrow(cls, table):
+        n = table.num_rows
+        values = np.full((n, len(LAB_FIELDS)), np.nan, dtype=np.float32, order="F")
+        for j, f in enumerate(LAB_FIELDS):
+            if f in table.column_names:
+                values[:, j] = table.column(f).to_numpy(zero_copy_only=False)
+        text = {}
+        for f in TEXT_FIELDS:
+            if f in table.column_names:
+                text[f] = pd.Categorical(table.column(f).to_pandas().fillna("").astype(str))
+            else:
+                text[f] = pd.Categorical([""] * n)
+        return cls(values, text)
+
+    def record(self, i: int) -> dict:
+        """Row i as a parse_parameters()-shaped dict."""
+        out = {}
+        for f in TEXT_FIELDS[:3]:
+            out[f] = str(self.text[f][i])
+        for j, f in enumerate(LAB_FIELDS):
+            v = float(_widen(self.values[i:i + 1, j])[0])
+            if f == "Age":
+                out[f] = int(v) if not np.isnan(v) else np.nan
+            else:
+                out[f] = v
+        for f in TEXT_FIELDS[3:]:
+            out[f] = str(self.text[f][i])
+        return out
+
+
+# ----------------------
+# Compact storage for scored cohorts
+# ----------------------
+def compact_frame(df: pd.DataFrame, max_category_ratio: float = 0.5) -> pd.DataFrame:
+    """
+    Shrink a scored cohort for storage / session state: float64 columns become
+    float32 and low-cardinality string columns become categoricals. Columns
+    holding lists or dicts (e.g. Recommendations_Structured) are left as-is.
+    """
+    out = {}
+    n = max(len(df), 1)
+    for col in df.columns:
+        s = df[col]
+        if s.dtype == np.float64:
+            out[col] = s.astype(np.float32)
+        elif s.dtype == object and s.map(lambda v: isinstance(v, str) or v is None).all():
+            if s.nunique(dropna=False) / n <= max_category_ratio:
+                out[col] = s.astype("category")
+            else:
+                out[col] = s
+        else:
+            out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+def widen_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Inverse of compact_frame for numeric columns (float32 -> decimal-exact float64)."""
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == np.float32:
+            df[col] = _widen(df[col].to_numpy())
+    return df
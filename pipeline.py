@@ -0,0 +1,281 @@
+import os
+
+import pandas as pd
+
+# ----------------------
+# Stage-based report pipeline
+# ----------------------
+# One pipeline for both entry points (app.py and Milestone1 health_ai/main.py):
+#
+#   ingest -> ocr -> parse -> validate -> interpret -> score -> synthesize -> render
+#
+# A document is a plain dict that each stage enriches ("path"/"bytes" ->
+# "text" -> "parsed" -> "report_row" -> "pdf"). A stage is any callable
+# taking and returning a list of documents, so every stage sees a whole batch
+# (score/synthesize run the engine once per batch, not once per report) and
+# any stage can be swapped with Pipeline.replace().
+
+# Score columns synthesize_and_recommend_df expects; filled only where the engine did not produce them
+SCORE_DEFAULTS = {
+    "Cardiovascular_Risk_Score": 0,
+    "Adjusted_Cardiovascular_Risk": 0,
+    "Metabolic_Syndrome_Flags": 0,
+    "Infection_Severity": "Low",
+    "Liver_Injury_Flag": 0,
+    "Kidney_Risk_Stage": 0,
+    "TC_HDL_Ratio": 0,
+}
+
+
+class Pipeline:
+    def __init__(self, stages):
+        """`stages`: list of (name, callable(list[dict]) -> list[dict]), in run order."""
+        self.stages = list(stages)
+
+    @property
+    def stage_names(self):
+        return [name for name, _ in self.stages]
+
+    def replace(self, name, fn):
+        """New pipeline with stage `name` swapped for `fn`."""
+        if name not in self.stage_names:
+            raise KeyError(f"No stage named {name!r}; stages are {self.stage_names}")
+        return Pipeline([(n, fn if n == name else f) for n, f in self.stages])
+
+    def _select(self, start=None, stop=None):
+        names = self.stage_names
+        i = names.index(start) if start else 0
+        j = names.index(stop) + 1 if stop else len(names)
+        return self.stages[i:j]
+
+    def iter_run(self, docs, start=None, stop=None, batch_size=None):
+        """Run stages start..stop (inclusive) batch by batch, yielding finished documents."""
+        docs = list(docs)
+        stages = self._select(start, stop)
+        size = batch_size or max(len(docs), 1)
+        for k in range(0, len(docs), size):
+            batch = docs[k:k + size]
+            for _, fn in stages:
+                batch = fn(batch)
+            yield from batch
+
+    def run(self, docs, start=None, stop=None, batch_size=None) -> list:
+        return list(self.iter_run(docs, start=start, stop=stop, batch_size=batch_size))
+
+
+# ----------------------
+# Stage factories
+# ----------------------
+def ingest_stage():
+    def ingest(docs):
+        for d in docs:
+            if "bytes" not in d and "text" not in d and d.get("path"):
+                with open(d["path"], "rb") as fh:
+                    d["bytes"] = fh.read()
+            d.setdefault("name", os.path.basename(d.get("path", "")) or "upload")
+        return docs
+    return ingest
+
+
+def load_pages(name: str, data: bytes, **options):
+    """
+    Page source for one upload (rasterize.RasterPages): a context manager
+    yielding page images, or page file paths with paths_only=True, one at a time.
+    `options` are RasterPages' (page_range, dpi, grayscale, paths_only, lab_pages_only).
+    """
+    from rasterize import RasterPages
+    return RasterPages(name, data, **options)
+
+
+def plain_ocr(images) -> dict:
+    import pytesseract
+    pages = [pytesseract.image_to_string(img) for img in images]
+    return {"text": "".join(pages), "pages": pages}
+
+
+def ocr_stage(extract=None, pages=load_pages, paths_only=None, text_layer=True, **raster_options):
+    """
+    `extract(images) -> dict` with at least "text", and "pages" (one text per image) when it
+    can; ocr_confidence.extract_with_confidence also returns per-field "values" and
+    "low_confidence", kept for the parse stage.
+    Pages are rasterized one at a time; a confidence extractor revisits pages for
+    its re-reads, so by default it gets page files (paths_only) instead of images.
+
+    With text_layer, a PDF's own text (text_layer.split_pages) is used for every
+    page that has a usable one and only the rest are rasterized and OCR'd; the
+    document text keeps page order.
+    A document may carry "page_range" (e.g. "1-3,5"); "page_sources" records
+    {page: "text" | "ocr" | "skipped"} (skipped: not a lab-table page).
+    Documents that already carry text are passed through untouched.
+    """
+    if paths_only is None:
+        paths_only = extract is not None
+    extract = extract or plain_ocr
+
+    def ocr(docs):
+        for d in docs:
+            if d.get("text") is not None:
+                continue
+            split = None
+            if text_layer and d["name"].lower().endswith(".pdf"):
+                from text_layer import split_pages
+                split = split_pages(d["bytes"], d.get("page_range"))
+            if split is None:
+                selected, text_pages, ocr_range = None, {}, d.get("page_range")
+            else:
+                selected, text_pages, ocr_range = split
+
+            result, ocr_pages = {}, []
+            if split is None or ocr_range:
+                with pages(d["name"], d["bytes"], page_range=ocr_range, paths_only=paths_only,
+                           **raster_options) as images:
+                    result = extract(images)
+                    ocr_pages = list(getattr(images, "page_numbers", []))
+
+            sources = {p: "text" for p in text_pages}
+            sources.update({p: "ocr" for p in ocr_pages})
+            for p in selected or []:
+                sources.setdefault(p, "skipped")
+            ocr_by_page = result.get("pages")
+            if ocr_by_page is not None and len(ocr_by_page) == len(ocr_pages):
+                ocr_by_page, ocr_text = dict(zip(ocr_pages, ocr_by_page)), None
+            else:
+                # extractor without per-page text: the OCR'd pages go in as one text, at the first of them
+                ocr_by_page, ocr_text = {}, result.get("text", "")
+            parts = []
+            for p in sorted(sources):
+                if sources[p] == "text":
+                    parts.append(text_pages[p])
+                elif p in ocr_by_page:
+                    parts.append(ocr_by_page[p])
+                elif sources[p] == "ocr" and ocr_text is not None:
+                    parts.append(ocr_text)
+                    ocr_text = None
+            if ocr_text:
+                parts.append(ocr_text)
+            d["text"] = "\n".join(parts) if text_pages else result.get("text", "")
+            d["page_sources"] = dict(sorted(sources.items()))
+            d["ocr_values"] = result.get("values", {})
+            d["ocr_low_confidence"] = result.get("low_confidence", [])
+        return docs
+    return ocr
+
+
+def parse_stage(parse):
+    def parse_docs(docs):
+        for d in docs:
+            parsed = parse(d["text"])
+            # low-confidence OCR reads, unless the value was corrected in the text since
+            ocr_values = d.get("ocr_values") or {}
+            parsed["Low_Confidence_Fields"] = ", ".join(
+                f for f in d.get("ocr_low_confidence") or [] if parsed.get(f) == ocr_values.get(f)
+            )
+            d["parsed"] = parsed
+        return docs
+    return parse_docs
+
+
+def validate_stage(normalize=None, profiles=None):
+    """
+    `normalize(parsed_list, texts, profiles) -> parsed_list` converts the whole
+    batch at once (unit_normalizer.normalize_batch: one normalize_frame pass).
+    """
+    def validate(docs):
+        if normalize is None or not docs:
+            return docs
+        parsed = normalize([d["parsed"] for d in docs], [d.get("text", "") for d in docs], profiles)
+        for d, p in zip(docs, parsed):
+            d["parsed"] = p
+        return docs
+    return validate
+
+
+def interpret_stage(ranges=None):
+    """
+    Reference-range flags for the whole batch in one vectorized pass
+    (reference_ranges.ReferenceRanges). Per document, "interpretation" holds
+    the Status/Deviation columns and parsed["Out_Of_Range"] a readable summary.
+    """
+    def interpret(docs):
+        if ranges is None or not docs:
+            return docs
+        from reference_ranges import out_of_range_column
+        flags = ranges.classify(pd.DataFrame([d["parsed"] for d in docs]))
+        summaries = out_of_range_column(flags)
+        for d, flag_row, summary in zip(docs, flags.to_dict("records"), summaries):
+            d["interpretation"] = flag_row
+            d["parsed"]["Out_Of_Range"] = summary
+        return docs
+    return interpret
+
+
+def score_stage(run_models):
+    def score(docs):
+        if not docs:
+            return docs
+        scored = run_models(pd.DataFrame([d["parsed"] for d in docs]))
+        for col, default in SCORE_DEFAULTS.items():
+            if col not in scored.columns:
+                scored[col] = default
+        for i, d in enumerate(docs):
+            d["scored"] = (scored, i)
+        return docs
+    return score
+
+
+def synthesize_stage(synthesize):
+    def synth(docs):
+        if not docs:
+            return docs
+        frame = docs[0]["scored"][0]
+        if all(d["scored"][0] is frame and d["scored"][1] == i for i, d in enumerate(docs)) and len(frame) == len(docs):
+            # the batch scored together: hand the engine its own frame, no row-by-row rebuild
+            df = frame
+        else:
+            df = pd.DataFrame([d["scored"][0].iloc[d["scored"][1]] for d in docs]).reset_index(drop=True)
+        out = synthesize(df)
+        for d, row in zip(docs, out.to_dict("records")):
+            d["report_row"] = row
+            d.pop("scored", None)
+        return docs
+    return synth
+
+
+def render_stage(render):
+    def render_docs(docs):
+        for d in docs:
+            d["pdf"] = render(d["report_row"])
+        return docs
+    return render_docs
+
+
+def build_pipeline(parse, run_models, synthesize, render, normalize=None, extract=None, profiles=None,
+                   ranges=None, raster=None) -> Pipeline:
+    """
+    Assemble the standard stage order from engine functions (model_engine's, or the app's fallbacks).
+    `raster`: rasterize.RasterPages options for the ocr stage (dpi, max_dpi, grayscale, lab_pages_only).
+    """
+    return Pipeline([
+        ("ingest", ingest_stage()),
+        ("ocr", ocr_stage(extract, **(raster or {}))),
+        ("parse", parse_stage(parse)),
+        ("validate", validate_stage(normalize, profiles)),
+        ("interpret", interpret_stage(ranges)),
+        ("score", score_stage(run_models)),
+        ("synthesize", synthesize_stage(synthesize)),
+        ("render", render_stage(render)),
+    ])
+
+
+def default_pipeline(confidence: bool = True, profiles=None, raster=None) -> Pipeline:
+    """The pipeline on model_engine, unit normalization and (optionally) confidence-aware OCR."""
+    from model_engine import parse_parameters, run_models_on_df, synthesize_and_recommend_df, generate_pdf_bytes_from_row
+    from unit_normalizer import normalize_batch
+    from reference_ranges import ReferenceRanges
+    extract = None
+    if confidence:
+        from ocr_confidence import extract_with_confidence
+        extract = extract_with_confidence
+    return build_pipeline(parse_parameters, run_models_on_df, synthesize_and_recommend_df, generate_pdf_bytes_from_row,
+                          normalize=normalize_batch, extract=extract, profiles=profiles,
+                          ranges=ReferenceRanges(), raster=raster)
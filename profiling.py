@@ -0,0 +1,210 @@
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+
+from pipeline import Pipeline
+
+# ----------------------
+# Opt-in profiling
+# ----------------------
+# Off unless HEALTH_AI_PROFILE=<output dir> is set (app.py, main.py) or
+# main.py gets --profile [DIR]. A profiled pipeline has every stage wrapped:
+#
+#   - cProfile per stage      -> <stage>.prof and stats.txt (cumulative per function)
+#   - a sampling thread       -> stacks.collapsed ("stage;outer;...;inner count" lines,
+#                                for flamegraph.pl, speedscope or inferno)
+#   - top self-time functions -> hotspots.txt, per stage
+#
+# Every stage call gets its own cProfile.Profile, merged into the stage's
+# stats when the call returns, so concurrent stages (executor.PipelinedExecutor,
+# several app sessions) are not serialized. Where the interpreter allows only
+# one active profiler (Python 3.12+), a call that overlaps another one is
+# covered by the stack sampler only. The lock guards the shared counters, never
+# a stage call.
+
+PROFILE_ENV = "HEALTH_AI_PROFILE"
+SAMPLE_INTERVAL = 0.005   # seconds between stack samples
+TOP_N = 15
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profiler:
+    def __init__(self, out_dir: str, interval: float = SAMPLE_INTERVAL):
+        self.out_dir = out_dir
+        self.interval = interval
+        self.profiles = {}      # stage -> pstats.Stats, merged over calls
+        self.calls = Counter()  # stage -> calls
+        self.wall = Counter()   # stage -> seconds
+        self.stacks = Counter()
+        self._active = {}       # thread id -> stage being run
+        self._lock = threading.Lock()
+        self._sampler = None
+        self._stop = threading.Event()
+
+    # --- wrapping ---
+    def wrap(self, name: str, fn):
+        def profiled(docs):
+            ident = threading.get_ident()
+            with self._lock:
+                self._active[ident] = name
+            prof = cProfile.Profile()
+            t0 = time.perf_counter()
+            try:
+                prof.enable()
+            except ValueError:
+                prof = None  # another call holds the interpreter's profiler; sampled only
+            try:
+                return fn(docs)
+            finally:
+                if prof is not None:
+                    prof.disable()
+                elapsed = time.perf_counter() - t0
+                stats = pstats.Stats(prof) if prof is not None else None
+                with self._lock:
+                    self._active.pop(ident, None)
+                    self.wall[name] += elapsed
+                    self.calls[name] += 1
+                    if stats is not None:
+                        if name in self.profiles:
+                            self.profiles[name].add(stats)
+                        else:
+                            self.profiles[name] = stats
+        return profiled
+
+    def wrap_pipeline(self, pipeline: Pipeline) -> Pipeline:
+        self.start()
+        return Pipeline([(name, self.wrap(name, fn)) for name, fn in pipeline.stages])
+
+    # --- stack sampling ---
+    def start(self):
+        if self._sampler is None:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                active = list(self._active.items())
+            sampled = []
+            for ident, stage in active:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                if stack:
+                    sampled.append(";".join([stage] + stack[::-1]))
+            del frames
+            with self._lock:
+                self.stacks.update(sampled)
+
+    def _snapshot(self):
+        """Copies of the per-stage stats, call counts, wall times and stacks, taken under the lock."""
+        with self._lock:
+            profiles = {}
+            for name, stats in self.profiles.items():
+                profiles[name] = pstats.Stats()
+                profiles[name].add(stats)
+            return profiles, Counter(self.calls), Counter(self.wall), Counter(self.stacks)
+
+    # --- reports ---
+    def hotspots(self, top: int = TOP_N) -> dict:
+        """stage -> {"calls", "wall_s", "top": [(function, self seconds, cumulative seconds, ncalls)]}."""
+        profiles, calls, wall, _ = self._snapshot()
+        out = {}
+        for name, prof in profiles.items():
+            rows = sorted(prof.stats.items(), key=lambda kv: kv[1][2], reverse=True)[:top]
+            out[name] = {
+                "calls": calls[name],
+                "wall_s": round(wall[name], 4),
+                "top": [(f"{fn} ({os.path.basename(file)}:{line})", round(tt, 4), round(ct, 4), nc)
+                        for (file, line, fn), (cc, nc, tt, ct, _) in rows],
+            }
+        return out
+
+    def dump(self) -> str:
+        """Write all reports to out_dir from a snapshot (stages may still be running); returns the directory."""
+        os.makedirs(self.out_dir, exist_ok=True)
+        profiles, _, _, stacks = self._snapshot()
+        buf = io.StringIO()
+        for name, prof in profiles.items():
+            prof.dump_stats(os.path.join(self.out_dir, f"{name}.prof"))
+            buf.write(f"===== stage: {name} =====\n")
+            prof.stream = buf
+            prof.sort_stats("cumulative").print_stats(40)
+        with open(os.path.join(self.out_dir, "stats.txt"), "w", encoding="utf-8") as fh:
+            fh.write(buf.getvalue())
+
+        with open(os.path.join(self.out_dir, "stacks.collapsed"), "w", encoding="utf-8") as fh:
+            for stack, count in sorted(stacks.items()):
+                fh.write(f"{stack} {count}\n")
+
+        with open(os.path.join(self.out_dir, "hotspots.txt"), "w", encoding="utf-8") as fh:
+            fh.write(format_hotspots(self.hotspots()))
+        return self.out_dir
+
+
+def format_hotspots(hotspots: dict) -> str:
+    lines = []
+    for name, h in hotspots.items():
+        lines.append(f"{name}: {h['calls']} calls, {h['wall_s']}s")
+        lines.append(f"  {'self s':>8} {'cum s':>8} {'ncalls':>9}  function")
+        for fn, tt, ct, nc in h["top"]:
+            lines.append(f"  {tt:>8.4f} {ct:>8.4f} {nc:>9}  {fn}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def profile_from_env(pipeline: Pipeline):
+    """(pipeline, profiler): wrapped when HEALTH_AI_PROFILE is set, else (pipeline, None)."""
+    out_dir = os.environ.get(PROFILE_ENV)
+    if not out_dir:
+        return pipeline, None
+    profiler = Profiler(out_dir)
+    return profiler.wrap_pipeline(pipeline), profiler
+
+
+# ----------------------
+# CLI: profile the scoring path on a saved cohort
+# ----------------------
+# python profiling.py parsed_panels.csv [--out profile_out] [--batch 256]
+# Rows are parsed reports (model_engine field names); OCR is not involved.
+if __name__ == "__main__":
+    import argparse
+    import pandas as pd
+    from pipeline import default_pipeline
+
+    ap = argparse.ArgumentParser(description="Profile interpret -> score -> synthesize on a cohort file.")
+    ap.add_argument("cohort", help="CSV or Parquet of parsed panels")
+    ap.add_argument("--out", default="profile_out")
+    ap.add_argument("--batch", type=int, default=256)
+    args = ap.parse_args()
+
+    df = pd.read_parquet(args.cohort) if args.cohort.endswith(".parquet") else pd.read_csv(args.cohort)
+    docs = [{"name": f"row{i}", "parsed": rec} for i, rec in enumerate(df.to_dict("records"))]
+    profiler = Profiler(args.out)
+    pipeline = profiler.wrap_pipeline(default_pipeline(confidence=False))
+    t0 = time.perf_counter()
+    pipeline.run(docs, start="validate", stop="synthesize", batch_size=args.batch)
+    elapsed = time.perf_counter() - t0
+    profiler.stop()
+    profiler.dump()
+    print(format_hotspots(profiler.hotspots(top=10)))
+    print(f"{len(docs)} rows in {elapsed:.2f}s ({len(docs) / max(elapsed, 1e-9):.0f} rows/s); reports in {args.out}/")
@@ -0,0 +1,200 @@
+import re
+import shutil
+import tempfile
+
+from PIL import Image, ImageOps
+
+# ----------------------
+# Memory-bounded PDF rasterization
+# ----------------------
+# convert_from_bytes(data) renders every page at once at the default DPI and
+# keeps them all as PIL images, so a 40-page scan costs gigabytes per upload.
+# Here pages are rendered one at a time (first_page == last_page), in
+# grayscale, at a capped DPI, and each image is closed as soon as the caller
+# moves to the next page. With paths_only the pages go to a temporary folder
+# instead and only file paths are held; tesseract reads the files directly.
+
+RASTER_DPI = 200        # tesseract's sweet spot for lab-report font sizes
+MAX_DPI = 300
+MAX_PAGE_PIXELS = 12_000_000   # ~ A4 at 350 dpi; larger pages get a lower DPI
+PROBE_DPI = 150         # lab-page detection pass (opt-in); lowest DPI tesseract reads body text at
+_PAGE_SIZE_RE = re.compile(r"([\d.]+)\s*x\s*([\d.]+)")
+
+
+def parse_page_range(spec, n_pages: int) -> list:
+    """'1-3,5' -> [1, 2, 3, 5] (1-based, clipped to the document). None/'' -> every page."""
+    if spec is None or str(spec).strip() == "":
+        return list(range(1, n_pages + 1))
+    if isinstance(spec, (list, tuple, range)):
+        return [p for p in spec if 1 <= p <= n_pages]
+    pages = []
+    for part in str(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            a, b = part.split("-", 1)
+            lo = int(a) if a.strip() else 1
+            hi = int(b) if b.strip() else n_pages
+            pages.extend(range(lo, hi + 1))
+        else:
+            pages.append(int(part))
+    seen = set()
+    return [p for p in pages if 1 <= p <= n_pages and not (p in seen or seen.add(p))]
+
+
+def pdf_info(data: bytes) -> dict:
+    """Page count and page size in points (poppler's pdfinfo, no rendering)."""
+    from pdf2image import pdfinfo_from_bytes
+    info = pdfinfo_from_bytes(data)
+    m = _PAGE_SIZE_RE.search(str(info.get("Page size", "")))
+    size = (float(m.group(1)), float(m.group(2))) if m else (612.0, 792.0)
+    return {"pages": int(info.get("Pages", 0)), "size_pts": size}
+
+
+def capped_dpi(size_pts, dpi: int = RASTER_DPI, max_dpi: int = MAX_DPI, max_pixels: int = MAX_PAGE_PIXELS) -> int:
+    """DPI no higher than max_dpi and low enough that one page stays under max_pixels."""
+    dpi = min(int(dpi), int(max_dpi))
+    w_in, h_in = size_pts[0] / 72.0, size_pts[1] / 72.0
+    limit = int((max_pixels / max(w_in * h_in, 1e-6)) ** 0.5)
+    return max(min(dpi, limit), 50)
+
+
+def render_page(data: bytes, page: int, dpi: int, grayscale: bool = True, output_folder=None):
+    """One page: a PIL image, or its file path when output_folder is given."""
+    from pdf2image import convert_from_bytes
+    kwargs = {"dpi": dpi, "first_page": page, "last_page": page, "grayscale": grayscale}
+    if output_folder is not None:
+        out = convert_from_bytes(data, output_folder=output_folder, fmt="png", paths_only=True, **kwargs)
+    else:
+        out = convert_from_bytes(data, **kwargs)
+    return out[0] if out else None
+
+
+# ----------------------
+# Lab-table page detection
+# ----------------------
+# Opt-in (lab_pages_only=True): the probe is an extra tesseract pass per page,
+# so it only pays off on long scans with many cover, consent or notes pages.
+# A page is dropped only on strong evidence: it is blank, or the probe read a
+# page's worth of words and none of them is an analyte label.
+MIN_PROBE_WORDS = 40
+_WORD_RE = re.compile(r"[A-Za-z]{2,}")
+_lab_label_re = None
+
+
+def _lab_labels():
+    """One word-bounded alternation over model_engine's label variants, compiled on first use."""
+    global _lab_label_re
+    if _lab_label_re is None:
+        from model_engine import NUMERIC_LABELS, label_regex
+        _lab_label_re = re.compile(
+            "|".join(rf"\b(?:{label_regex(label)})\b" for labels in NUMERIC_LABELS.values() for label in labels),
+            re.IGNORECASE,
+        )
+    return _lab_label_re
+
+
+def is_skippable_page(image, min_words: int = MIN_PROBE_WORDS) -> bool:
+    """True for a blank page, or one whose readable text names no analyte."""
+    gray = ImageOps.grayscale(image) if image.mode != "L" else image
+    hist = gray.histogram()
+    ink = sum(hist[:128]) / max(sum(hist), 1)
+    if ink < 0.002:
+        return True
+    import pytesseract
+    text = pytesseract.image_to_string(gray, config="--psm 6")
+    if _lab_labels().search(text):
+        return False
+    # too little readable text (a table tesseract could not segment, a photo) is no evidence
+    return len(_WORD_RE.findall(text)) >= min_words
+
+
+def detect_lab_pages(data: bytes, pages, probe_dpi: int = PROBE_DPI) -> list:
+    """`pages` minus the skippable ones; all of them if every page is (never drop the whole report)."""
+    keep = []
+    for p in pages:
+        img = render_page(data, p, probe_dpi, grayscale=True)
+        if img is None:
+            continue
+        try:
+            if not is_skippable_page(img):
+                keep.append(p)
+        finally:
+            img.close()
+    return keep or list(pages)
+
+
+# ----------------------
+# Page source
+# ----------------------
+class RasterPages:
+    """
+    Context manager over the pages of one upload, yielding them one at a time:
+
+        with RasterPages(name, data, page_range="1-4") as pages:
+            text = "".join(pytesseract.image_to_string(p) for p in pages)
+
+    PDF pages are rendered lazily at a capped DPI (grayscale by default) and
+    each image is closed when the next one is requested. With paths_only=True
+    the iterator yields PNG file paths in a temporary folder removed on exit;
+    use it when the consumer needs to revisit pages (ocr_confidence re-reads
+    value crops) without holding every page image in memory.
+    `page_numbers` lists the 1-based pages that will be yielded.
+    """
+
+    def __init__(self, name: str, data: bytes, page_range=None, dpi: int = RASTER_DPI, max_dpi: int = MAX_DPI,
+                 grayscale: bool = True, paths_only: bool = False, lab_pages_only: bool = False):
+        self.name = name
+        self.data = data
+        self.page_range = page_range
+        self.dpi = dpi
+        self.max_dpi = max_dpi
+        self.grayscale = grayscale
+        self.paths_only = paths_only
+        self.lab_pages_only = lab_pages_only
+        self.is_pdf = name.lower().endswith(".pdf")
+        self.page_numbers = []
+        self.render_dpi = None
+        self._tmpdir = None
+
+    def __enter__(self):
+        if self.is_pdf:
+            info = pdf_info(self.data)
+            self.render_dpi = capped_dpi(info["size_pts"], self.dpi, self.max_dpi)
+            self.page_numbers = parse_page_range(self.page_range, info["pages"])
+            if self.lab_pages_only and len(self.page_numbers) > 1:
+                self.page_numbers = detect_lab_pages(self.data, self.page_numbers)
+        else:
+            self.page_numbers = [1]
+        if self.paths_only:
+            self._tmpdir = tempfile.mkdtemp(prefix="raster_")
+        return self
+
+    def __exit__(self, *exc):
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+        return False
+
+    def _image_file(self):
+        from io import BytesIO
+        img = Image.open(BytesIO(self.data))
+        img = ImageOps.grayscale(img) if self.grayscale else img.convert("RGB")
+        if self._tmpdir is not None:
+            path = f"{self._tmpdir}/page-1.png"
+            img.save(path)
+            img.close()
+            return path
+        return img
+
+    def __iter__(self):
+        for p in self.page_numbers:
+            page = self._image_file() if not self.is_pdf else render_page(
+                self.data, p, self.render_dpi, self.grayscale, output_folder=self._tmpdir
+            )
+            if page is None:
+                continue
+            yield page
+            if not isinstance(page, str):
+                page.close()
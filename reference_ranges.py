@@ -0,0 +1,247 @@
+import numpy as np
+import pandas as pd
+
+# ----------------------
+# Reference range table
+# ----------------------
+# (analyte, sex, age_lo, age_hi, low, high); sex is "male", "female" or "any",
+# age band is [age_lo, age_hi) in years. Units are the canonical ones in the
+# field names (see unit_normalizer). np.inf marks a one-sided range.
+DEFAULT_RANGES = [
+    ("Hemoglobin_g_dL", "any", 0, 1, 9.5, 14.0),
+    ("Hemoglobin_g_dL", "any", 1, 6, 11.0, 14.0),
+    ("Hemoglobin_g_dL", "any", 6, 12, 11.5, 15.5),
+    ("Hemoglobin_g_dL", "male", 12, 18, 13.0, 16.0),
+    ("Hemoglobin_g_dL", "female", 12, 18, 12.0, 16.0),
+    ("Hemoglobin_g_dL", "male", 18, 150, 13.0, 17.0),
+    ("Hemoglobin_g_dL", "female", 18, 150, 12.0, 15.5),
+
+    ("WBC_cells_uL", "any", 0, 1, 6000, 17500),
+    ("WBC_cells_uL", "any", 1, 6, 5500, 15500),
+    ("WBC_cells_uL", "any", 6, 18, 4500, 13500),
+    ("WBC_cells_uL", "any", 18, 150, 4000, 11000),
+
+    ("Platelets_lakh_uL", "any", 0, 150, 1.5, 4.5),
+
+    ("Hematocrit_percent", "any", 0, 18, 33, 45),
+    ("Hematocrit_percent", "male", 18, 150, 40, 50),
+    ("Hematocrit_percent", "female", 18, 150, 36, 46),
+
+    ("Serum_Iron_ug_dL", "any", 0, 18, 50, 120),
+    ("Serum_Iron_ug_dL", "male", 18, 150, 65, 175),
+    ("Serum_Iron_ug_dL", "female", 18, 150, 50, 170),
+
+    ("Serum_Ferritin_ng_mL", "male", 0, 150, 24, 336),
+    ("Serum_Ferritin_ng_mL", "female", 0, 150, 11, 307),
+
+    ("Vitamin_B12_pg_mL", "any", 0, 150, 200, 900),
+    ("Folate_ng_mL", "any", 0, 150, 3, 17),
+    ("Vitamin_D_ng_mL", "any", 0, 150, 30, 100),
+
+    ("ALT_U_L", "male", 0, 150, 0, 45),
+    ("ALT_U_L", "female", 0, 150, 0, 35),
+    ("AST_U_L", "male", 0, 150, 0, 40),
+    ("AST_U_L", "female", 0, 150, 0, 32),
+    ("Total_Bilirubin_mg_dL", "any", 0, 150, 0.1, 1.2),
+
+    ("Serum_Creatinine_mg_dL", "any", 0, 18, 0.2, 1.0),
+    ("Serum_Creatinine_mg_dL", "male", 18, 150, 0.74, 1.35),
+    ("Serum_Creatinine_mg_dL", "female", 18, 150, 0.59, 1.04),
+    ("eGFR_mL_min_1_73m2", "any", 0, 150, 90, np.inf),
+
+    ("Total_Cholesterol_mg_dL", "any", 0, 18, 0, 170),
+    ("Total_Cholesterol_mg_dL", "any", 18, 150, 0, 200),
+    ("LDL_mg_dL", "any", 0, 18, 0, 110),
+    ("LDL_mg_dL", "any", 18, 150, 0, 130),
+    ("HDL_mg_dL", "any", 0, 18, 45, np.inf),
+    ("HDL_mg_dL", "male", 18, 150, 40, np.inf),
+    ("HDL_mg_dL", "female", 18, 150, 50, np.inf),
+    ("Triglycerides_mg_dL", "any", 0, 18, 0, 90),
+    ("Triglycerides_mg_dL", "any", 18, 150, 0, 150),
+    ("Fasting_Glucose_mg_dL", "any", 0, 150, 70, 100),
+    ("HbA1c_percent", "any", 0, 150, 4.0, 5.6),
+
+    ("CRP_mg_L", "any", 0, 150, 0, 5),
+    ("Procalcitonin_ng_mL", "any", 0, 150, 0, 0.1),
+    ("D_Dimer_mg_L", "any", 0, 150, 0, 0.5),
+]
+
+# Age used when a report has none; adult ranges are the common case.
+DEFAULT_AGE = 30.0
+
+STATUS_LABELS = ["Low", "Normal", "High"]
+_SEXES = ("male", "female")  # codes 0, 1; 2 = unknown
+
+
+def sex_codes(gender) -> np.ndarray:
+    """Vectorized Gender -> 0 (male), 1 (female), 2 (unknown)."""
+    g = pd.Series(gender, dtype=object).fillna("").astype(str).str.strip().str.lower().str[:1]
+    return np.where(g == "m", 0, np.where(g == "f", 1, 2)).astype(np.int8)
+
+
+# ----------------------
+# Range engine
+# ----------------------
+class ReferenceRanges:
+    """
+    Reference ranges keyed by analyte, sex and age band, compiled into dense
+    lookup tables: per analyte, the sorted age-band edges plus (3, n_bands)
+    low/high arrays indexed by sex code. Classifying a column is then one
+    np.searchsorted over the ages and two fancy-index gathers, with no Python
+    loop over rows.
+    """
+
+    def __init__(self, rows=None):
+        rows = DEFAULT_RANGES if rows is None else rows
+        self._tables = {}
+        by_analyte = {}
+        for analyte, sex, age_lo, age_hi, low, high in rows:
+            by_analyte.setdefault(analyte, []).append((str(sex).lower(), float(age_lo), float(age_hi), float(low), float(high)))
+        for analyte, entries in by_analyte.items():
+            self._tables[analyte] = self._compile(entries)
+
+    @classmethod
+    def from_csv(cls, path: str):
+        """CSV with columns analyte, sex, age_lo, age_hi, low, high (empty high = no upper limit)."""
+        df = pd.read_csv(path)
+        df["high"] = df["high"].fillna(np.inf)
+        return cls(df[["analyte", "sex", "age_lo", "age_hi", "low", "high"]].itertuples(index=False, name=None))
+
+    @staticmethod
+    def _compile(entries):
+        edges = np.array(sorted({e[1] for e in entries} | {e[2] for e in entries}), dtype=np.float64)
+        n_bands = len(edges) - 1
+        lo = np.full((3, n_bands), np.nan)
+        hi = np.full((3, n_bands), np.nan)
+        for b in range(n_bands):
+            start = edges[b]
+            covering = [e for e in entries if e[1] <= start < e[2]]
+            for code, sex in enumerate(_SEXES):
+                match = [e for e in covering if e[0] == sex] or [e for e in covering if e[0] == "any"]
+                if match:
+                    lo[code, b], hi[code, b] = match[0][3], match[0][4]
+            # unknown sex: the sex-neutral range, else the span of both sexes
+            anyrow = [e for e in covering if e[0] == "any"]
+            if anyrow:
+                lo[2, b], hi[2, b] = anyrow[0][3], anyrow[0][4]
+            elif not np.isnan(lo[:2, b]).all():
+                lo[2, b], hi[2, b] = np.nanmin(lo[:2, b]), np.nanmax(hi[:2, b])
+        return edges, lo, hi
+
+    @property
+    def analytes(self):
+        return list(self._tables)
+
+    def bounds(self, analyte: str, sex: np.ndarray, age: np.ndarray) -> tuple:
+        """Per-row (low, high) arrays for one analyte."""
+        edges, lo, hi = self._tables[analyte]
+        age = np.where(np.isnan(age), DEFAULT_AGE, age)
+        band = np.searchsorted(edges, age, side="right") - 1
+        outside = (band < 0) | (band >= lo.shape[1])
+        band = np.clip(band, 0, lo.shape[1] - 1)
+        low, high = lo[sex, band], hi[sex, band]
+        low[outside] = np.nan
+        high[outside] = np.nan
+        return low, high
+
+    def classify_column(self, analyte: str, values, sex: np.ndarray, age: np.ndarray) -> tuple:
+        """
+        Returns (status codes int8: -1 missing / 0 Low / 1 Normal / 2 High,
+        deviation float: fraction beyond the violated bound, 0 inside the range).
+        """
+        v = np.asarray(pd.to_numeric(pd.Series(values), errors="coerce"), dtype=np.float64)
+        low, high = self.bounds(analyte, sex, age)
+        below = v < low
+        above = v > high
+        status = np.where(below, 0, np.where(above, 2, 1)).astype(np.int8)
+        status[np.isnan(v) | np.isnan(low)] = -1
+        # a zero bound (e.g. "0 - 5 mg/L") has no relative scale; measure against the range width instead
+        width = high - low
+        low_scale = np.where(low != 0, np.abs(low), width)
+        high_scale = np.where(high != 0, np.abs(high), width)
+        low_scale[low_scale <= 0] = np.nan
+        high_scale[high_scale <= 0] = np.nan
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dev = np.where(below, (v - low) / low_scale, np.where(above, (v - high) / high_scale, 0.0))
+        dev[status < 0] = np.nan
+        return status, dev
+
+    def classify(self, df: pd.DataFrame, analytes=None) -> pd.DataFrame:
+        """
+        Classify a whole cohort. Returns, for every analyte present in `df`,
+        `<analyte>_Status` (categorical Low/Normal/High, NaN if no value or range)
+        and `<analyte>_Deviation`. Uses the `Age` and `Gender` columns when present.
+        """
+        n = len(df)
+        age = pd.to_numeric(df["Age"], errors="coerce").to_numpy(dtype=np.float64) if "Age" in df else np.full(n, np.nan)
+        sex = sex_codes(df["Gender"]) if "Gender" in df else np.full(n, 2, dtype=np.int8)
+        out = {}
+        for analyte in analytes or self.analytes:
+            if analyte not in df.columns or analyte not in self._tables:
+                continue
+            status, dev = self.classify_column(analyte, df[analyte].to_numpy(), sex, age)
+            out[f"{analyte}_Status"] = pd.Categorical.from_codes(status, STATUS_LABELS)
+            out[f"{analyte}_Deviation"] = dev
+        return pd.DataFrame(out, index=df.index)
+
+    def interpret_record(self, record: dict) -> dict:
+        """Single report: {analyte: {"value", "status", "low", "high", "deviation"}} for analytes with a value and range."""
+        age = np.array([pd.to_numeric(record.get("Age"), errors="coerce")], dtype=np.float64)
+        sex = sex_codes([record.get("Gender", "")])
+        result = {}
+        for analyte in self.analytes:
+            if analyte not in record:
+                continue
+            status, dev = self.classify_column(analyte, [record[analyte]], sex, age)
+            if status[0] < 0:
+                continue
+            low, high = self.bounds(analyte, sex, age)
+            result[analyte] = {
+                "value": float(pd.to_numeric(record[analyte], errors="coerce")),
+                "status": STATUS_LABELS[status[0]],
+                "low": float(low[0]),
+                "high": float(high[0]),
+                "deviation": float(dev[0]),
+            }
+        return result
+
+
+def _flag_text(analyte: str, status: str, deviation: float) -> str:
+    return f"{analyte}: {status} ({deviation:+.0%})"
+
+
+def out_of_range_summary(interpretation: dict) -> str:
+    """'Hemoglobin_g_dL: Low (-8%); LDL_mg_dL: High (+31%)' for the abnormal analytes of one report."""
+    return "; ".join(
+        _flag_text(a, r["status"], r["deviation"]) for a, r in interpretation.items() if r["status"] != "Normal"
+    )
+
+
+def out_of_range_column(flags: pd.DataFrame) -> list:
+    """
+    out_of_range_summary for every row of a classify() result, built column by
+    column: each abnormal analyte contributes "<text>; " (else ""), the pieces
+    are concatenated with str.cat and the trailing separator dropped.
+    """
+    pieces = []
+    for col in flags.columns:
+        if not col.endswith("_Status"):
+            continue
+        analyte = col[: -len("_Status")]
+        codes = flags[col].cat.codes.to_numpy()
+        abnormal = (codes == 0) | (codes == 2)
+        if not abnormal.any():
+            continue
+        # _flag_text's {:+.0%}, formatted once per distinct rounded percentage (-0.5 stands for a rounded -0)
+        pct = np.rint(flags[f"{analyte}_Deviation"].to_numpy(dtype=np.float64)[abnormal] * 100)
+        pct[(pct == 0) & np.signbit(pct)] = -0.5
+        values, inverse = np.unique(pct, return_inverse=True)
+        numbers = np.array(["-0" if v == -0.5 else f"{v:+.0f}" for v in values], dtype=object)
+        prefix = np.array([f"{analyte}: {STATUS_LABELS[0]} (", "", f"{analyte}: {STATUS_LABELS[2]} ("], dtype=object)
+        text = np.full(len(flags), "", dtype=object)
+        text[abnormal] = prefix[codes[abnormal]] + numbers[inverse.ravel()] + "%); "
+        pieces.append(pd.Series(text, dtype=object))
+    if not pieces:
+        return [""] * len(flags)
+    joined = pieces[0].str.cat(pieces[1:]) if len(pieces) > 1 else pieces[0]
+    return joined.str.removesuffix("; ").tolist()
@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# ----------------------
+# Fingerprints
+# ----------------------
+# Fields that identify the person a report belongs to. They are part of the
+# values fingerprint so two patients with identical labs never collide.
+IDENTITY_FIELDS = ("Patient_ID", "Patient_Name", "Age", "Gender")
+
+# Free-text findings printed on the report. They end up in the report row, so
+# two uploads that differ only here must not share one.
+TEXT_FIELDS = ("Provisional_Diagnosis", "Peripheral_Smear_Result", "Fasting_Status")
+
+# Minimum number of numeric lab values a parse needs before its values
+# fingerprint is trusted; near-empty parses would otherwise all collide.
+MIN_VALUES_FOR_FINGERPRINT = 3
+
+
+def bytes_fingerprint(file_bytes: bytes) -> str:
+    """Exact fingerprint of the uploaded file."""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapse OCR noise that differs between scans of the same report:
+    case, whitespace, punctuation and stray separators.
+    """
+    t = text.lower()
+    t = re.sub(r"[^a-z0-9.%/]+", " ", t)
+    return re.sub(r"\s+", " ", t).strip()
+
+
+def text_fingerprint(text: str):
+    t = normalize_text(text or "")
+    if not t:
+        return None
+    return hashlib.sha256(t.encode("utf-8")).hexdigest()
+
+
+def values_fingerprint(parsed: dict, digits: int = 12):
+    """
+    Fingerprint of the extracted values. A PDF and a phone photo of the same
+    report OCR to different text but usually parse to the same values, so this
+    is what catches near-duplicates. Returns None if too few values were found.
+
+    Values are hashed at their parsed precision (`digits` significant digits
+    only absorb float noise): folding e.g. 0.46 and 0.54 together would let a
+    report on one side of a model threshold be served the other's results.
+    """
+    canon = {}
+    n_values = 0
+    for k in sorted(parsed):
+        v = parsed[k]
+        if k in IDENTITY_FIELDS or k in TEXT_FIELDS:
+            if isinstance(v, str):
+                v = normalize_text(v)
+            elif v is None or (isinstance(v, float) and np.isnan(v)):
+                v = ""
+            canon[k] = str(v)
+            continue
+        if isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, bool):
+            if np.isnan(v):
+                continue
+            canon[k] = float(f"{float(v):.{digits}g}")
+            n_values += 1
+    if n_values < MIN_VALUES_FOR_FINGERPRINT:
+        return None
+    payload = json.dumps(canon, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ----------------------
+# Report cache
+# ----------------------
+class ReportCache:
+    """
+    In-memory LRU of processed reports, addressable by any of the three
+    fingerprints. Each entry holds whatever has been computed so far for the
+    report: OCR text, report_row, PDF bytes and LLM output.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._index = {"bytes": {}, "text": {}, "values": {}}
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, file_key=None, text_key=None, values_key=None, require=None):
+        """
+        Return (entry_id, entry) for the first fingerprint that hits, else
+        (None, None). With `require`, only entries holding that field count.
+        """
+        with self._lock:
+            for kind, key in (("bytes", file_key), ("text", text_key), ("values", values_key)):
+                if key is None:
+                    continue
+                entry_id = self._index[kind].get(key)
+                if entry_id is None or entry_id not in self._entries:
+                    continue
+                if require is None or self._entries[entry_id].get(require) is not None:
+                    self._entries.move_to_end(entry_id)
+                    return entry_id, self._entries[entry_id]
+        return None, None
+
+    def store(self, entry_id=None, file_key=None, text_key=None, values_key=None, **fields):
+        """
+        Create or update an entry and register the given fingerprints for it.
+        Returns the entry id.
+        """
+        with self._lock:
+            if entry_id is None or entry_id not in self._entries:
+                entry_id = self._next_id
+                self._next_id += 1
+                self._entries[entry_id] = {"keys": {}}
+            entry = self._entries[entry_id]
+            for kind, key in (("bytes", file_key), ("text", text_key), ("values", values_key)):
+                if key is not None:
+                    self._index[kind][key] = entry_id
+                    entry["keys"].setdefault(kind, set()).add(key)
+            entry.update(fields)
+            self._entries.move_to_end(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+            return entry_id
+
+    def get(self, entry_id):
+        with self._lock:
+            return self._entries.get(entry_id)
+
+    def _evict_oldest(self):
+        _, entry = self._entries.popitem(last=False)
+        for kind, keys in entry["keys"].items():
+            for key in keys:
+                self._index[kind].pop(key, None)
+
+
+# ----------------------
+# Batch directory dedupe
+# ----------------------
+def dedupe_directory(folder, extensions=(".pdf", ".png", ".jpg", ".jpeg"), extract_values=None):
+    """
+    Group the files in `folder` into duplicate sets.
+
+    Pass 1 groups byte-identical files. If `extract_values` (path -> parsed
+    dict) is given, pass 2 runs it once per unique file and merges groups whose
+    values fingerprints match, catching re-scans and photos of the same report.
+
+    Returns {"unique": [paths to process], "duplicates": {kept_path: [dupe paths]}}.
+    """
+    by_bytes = {}
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(tuple(extensions)):
+            continue
+        path = os.path.join(folder, name)
+        with open(path, "rb") as fh:
+            key = bytes_fingerprint(fh.read())
+        by_bytes.setdefault(key, []).append(path)
+
+    groups = [paths for paths in by_bytes.values()]
+
+    if extract_values is not None:
+        merged = {}
+        singles = []
+        for paths in groups:
+            key = values_fingerprint(extract_values(paths[0]))
+            if key is None:
+                singles.append(paths)
+            else:
+                merged.setdefault(key, []).extend(paths)
+        groups = singles + list(merged.values())
+
+    groups.sort(key=lambda paths: paths[0])
+    return {
+        "unique": [paths[0] for paths in groups],
+        "duplicates": {paths[0]: paths[1:] for paths in groups if len(paths) > 1},
+    }
@@ -0,0 +1,175 @@
+from report_cache import bytes_fingerprint, text_fingerprint, values_fingerprint
+
+# ----------------------
+# Session-independent report operations
+# ----------------------
+# What one user interaction does, written against the process-wide shared
+# objects (pipeline, ReportCache, OllamaClient) only. app.py keeps nothing
+# per session beyond the ids these return and the chat; load_test.py drives
+# the same functions from many threads.
+
+
+def upload_key(file_bytes: bytes, page_range: str = "") -> str:
+    return bytes_fingerprint(file_bytes) + (f":pages={page_range}" if page_range else "")
+
+
+def cached_ocr(cache, file_bytes: bytes, page_range: str = "") -> tuple:
+    """(entry_id, entry) of an earlier OCR of these bytes, or (None, None)."""
+    return cache.lookup(file_key=upload_key(file_bytes, page_range), require="ocr_text")
+
+
+def store_ocr(cache, file_bytes: bytes, page_range: str, result: dict) -> tuple:
+    """Cache an OCR result ({"text", "page_sources", "ocr_values", "ocr_low_confidence"}); returns (entry_id, entry)."""
+    entry_id = cache.store(file_key=upload_key(file_bytes, page_range), ocr_text=result["text"],
+                           page_sources=result.get("page_sources") or {}, ocr_values=result.get("ocr_values"),
+                           ocr_low_confidence=result.get("ocr_low_confidence"))
+    return entry_id, cache.get(entry_id)
+
+
+def ocr_upload(pipeline, cache, file_name: str, file_bytes: bytes, page_range: str = "") -> tuple:
+    """(entry_id, entry) holding ocr_text / page_sources; OCR runs only for bytes not seen before."""
+    entry_id, entry = cached_ocr(cache, file_bytes, page_range)
+    if entry is not None:
+        return entry_id, entry
+    doc = pipeline.run([{"name": file_name, "bytes": file_bytes, "page_range": page_range or None}], stop="ocr")[0]
+    return store_ocr(cache, file_bytes, page_range, doc)
+
+
+# Report-row fields that describe how this upload was read rather than what it says
+PER_UPLOAD_FIELDS = ("Low_Confidence_Fields", "Units_Converted")
+
+
+def run_report(pipeline, cache, file_name: str, text: str, ocr_entry_id=None) -> tuple:
+    """
+    (report_id, report_row) for the (possibly edited) OCR text. Parse, unit
+    normalization and reference ranges always run; scoring and synthesis are
+    skipped when the text or the parsed values match a report processed before.
+    """
+    # OCR confidences flag reads the user has not corrected
+    ocr_entry = cache.get(ocr_entry_id) or {}
+    doc = {
+        "name": file_name,
+        "text": text,
+        "ocr_values": ocr_entry.get("ocr_values"),
+        "ocr_low_confidence": ocr_entry.get("ocr_low_confidence"),
+    }
+    doc = pipeline.run([doc], start="parse", stop="interpret")[0]
+    text_key = text_fingerprint(text)
+    values_key = values_fingerprint(doc["parsed"])
+
+    # duplicate / near-duplicate of a report processed earlier?
+    report_id, cached = cache.lookup(text_key=text_key, values_key=values_key, require="report_row")
+    if cached is not None:
+        cache.store(entry_id=report_id, text_key=text_key, values_key=values_key)
+        # which reads were low-confidence or rescaled is a property of this upload, not of the values
+        row = dict(cached["report_row"])
+        row.update({f: doc["parsed"][f] for f in PER_UPLOAD_FIELDS if f in doc["parsed"]})
+        return report_id, row
+
+    # report_row is a plain dict (avoids pandas Series truth ambiguity)
+    report_row = pipeline.run([doc], start="score", stop="synthesize")[0]["report_row"]
+
+    # attach to this upload's entry unless it already holds a report from an edited text
+    ocr_entry = cache.get(ocr_entry_id)
+    target_id = ocr_entry_id if ocr_entry is not None and ocr_entry.get("report_row") is None else None
+    report_id = cache.store(entry_id=target_id, text_key=text_key, values_key=values_key, report_row=report_row)
+    return report_id, report_row
+
+
+def cached_llm(cache, report_id):
+    entry = cache.get(report_id)
+    return entry.get("llm_text") if entry is not None else None
+
+
+def store_llm(cache, report_id, llm_text: str):
+    if cache.get(report_id) is not None:
+        cache.store(entry_id=report_id, llm_text=llm_text)
+
+
+def llm_recommendations(client, cache, report_id, row: dict) -> str:
+    """Expanded recommendations for a report, generated once and shared by every session viewing it."""
+    from llm_client import recommendation_prompt
+    llm_text = cached_llm(cache, report_id)
+    if llm_text:
+        return llm_text
+    system, prompt = recommendation_prompt(row)
+    llm_text = client.generate(prompt, system=system)
+    store_llm(cache, report_id, llm_text)
+    return llm_text
+
+
+def pdf_row(row: dict, llm_text=None, chat=None) -> dict:
+    """The report row as the PDF renders it: plus LLM text and chat transcript when given."""
+    merged = dict(row)  # copy
+    if llm_text:
+        merged["LLM_Expanded_Recommendations"] = llm_text
+    if chat:
+        merged["Chat_History"] = chat
+    return merged
+
+
+def cached_pdf(cache, report_id, merged: dict):
+    """
+    Without a chat transcript PDF bytes are cached on the report entry (keyed
+    by the LLM text they include), so they are built once for all sessions; a
+    chat makes the PDF personal and it is rendered fresh (None here).
+    """
+    entry = cache.get(report_id)
+    if entry is None or merged.get("Chat_History"):
+        return None
+    if entry.get("pdf") and entry.get("pdf_llm_text") == merged.get("LLM_Expanded_Recommendations"):
+        return entry["pdf"]
+    return None
+
+
+def store_pdf(cache, report_id, merged: dict, pdf_bytes: bytes):
+    if pdf_bytes and not merged.get("Chat_History") and cache.get(report_id) is not None:
+        cache.store(entry_id=report_id, pdf=pdf_bytes, pdf_llm_text=merged.get("LLM_Expanded_Recommendations"))
+
+
+def render_pdf(pipeline, cache, report_id, row: dict, llm_text=None, chat=None) -> bytes:
+    """PDF for a report, reused from the cache when possible (see cached_pdf)."""
+    merged = pdf_row(row, llm_text, chat)
+    pdf_bytes = cached_pdf(cache, report_id, merged)
+    if pdf_bytes:
+        return pdf_bytes
+    # render stage (fallback or model_engine's generator)
+    pdf_bytes = pipeline.run([{"report_row": merged}], start="render")[0]["pdf"]
+    store_pdf(cache, report_id, merged, pdf_bytes)
+    return pdf_bytes
+
+
+def chat_index(cache, retriever, report_id, row: dict):
+    """The report's retrieval index (cached on its entry), e.g. for the topic guard."""
+    entry = cache.get(report_id)
+    if entry is not None and entry.get("chat_index") is not None:
+        return entry["chat_index"]
+    index = retriever.report_index(row)
+    if entry is not None:
+        cache.store(entry_id=report_id, chat_index=index)
+    return index
+
+
+def chat_answer(client, cache, retriever, report_id, row: dict, question: str, chat=None, state=None) -> tuple:
+    """
+    Answer a chat question from the top-k report entries and guideline notes.
+    The report's BM25 index is built on first use and kept on its cache entry.
+
+    `state` is what the previous answer returned for this session ({"report_id",
+    "context"}): while the conversation still fits the model's window the new
+    turn is sent on top of Ollama's cached context, so earlier turns are not
+    re-evaluated. Otherwise a fresh budgeted prompt (system prefix, report,
+    bounded `chat` history, turn) is sent. Returns (reply, new state).
+    """
+    from llm_client import PromptBuilder
+    builder = PromptBuilder(client.options["num_ctx"], client.options["num_predict"])
+    hits = retriever.retrieve(question, chat_index(cache, retriever, report_id, row))
+    if state and state.get("report_id") == report_id and state.get("context"):
+        prompt = builder.continuation(question, hits, len(state["context"]))
+        if prompt is not None:
+            out = client.complete(prompt, context=state["context"])
+            if out["ok"]:
+                return out["text"], {"report_id": report_id, "context": out["context"]}
+    system, prompt = builder.chat_prompt(row, question, hits, chat)
+    out = client.complete(prompt, system=system)
+    return out["text"], ({"report_id": report_id, "context": out["context"]} if out["ok"] else None)
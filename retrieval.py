@@ -0,0 +1,238 @@
+import os
+import re
+import json
+from collections import Counter
+
+import numpy as np
+
+# ----------------------
+# Chat context retrieval
+# ----------------------
+# The chat prompt used to carry only the findings paragraph, severity and
+# conditions. Here the whole report (every parsed value, score and
+# recommendation) plus a bundled corpus of lab-guideline snippets is split
+# into short chunks and indexed with BM25; each question pulls only its top-k
+# chunks into the prompt, so prompts stay short (faster CPU inference) and
+# answers stay grounded in the report.
+
+GUIDELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lab_guidelines.json")
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in is it its me my of on or our "
+    "should so than that the their them then there these they this to was we what when which who why "
+    "will with you your".split()
+)
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+# Lay terms users type for each report field, so "sugar" finds Fasting_Glucose_mg_dL.
+FIELD_TERMS = {
+    "Hemoglobin_g_dL": "hemoglobin haemoglobin hb anemia anaemia blood",
+    "WBC_cells_uL": "wbc white blood cells leukocyte tlc infection",
+    "Platelets_lakh_uL": "platelets platelet count clotting bleeding",
+    "Hematocrit_percent": "hematocrit haematocrit pcv packed cell volume",
+    "Serum_Iron_ug_dL": "iron serum iron anemia",
+    "Serum_Ferritin_ng_mL": "ferritin iron stores",
+    "Vitamin_B12_pg_mL": "vitamin b12 cobalamin",
+    "Folate_ng_mL": "folate folic acid",
+    "Vitamin_D_ng_mL": "vitamin d bone",
+    "ALT_U_L": "alt sgpt liver enzyme",
+    "AST_U_L": "ast sgot liver enzyme",
+    "Total_Bilirubin_mg_dL": "bilirubin jaundice liver",
+    "Serum_Creatinine_mg_dL": "creatinine kidney renal",
+    "eGFR_mL_min_1_73m2": "egfr kidney function filtration renal",
+    "Total_Cholesterol_mg_dL": "total cholesterol lipid",
+    "LDL_mg_dL": "ldl bad cholesterol lipid",
+    "HDL_mg_dL": "hdl good cholesterol lipid",
+    "Triglycerides_mg_dL": "triglycerides tg fats lipid",
+    "Fasting_Glucose_mg_dL": "fasting glucose sugar diabetes",
+    "HbA1c_percent": "hba1c a1c sugar diabetes glycated",
+    "CRP_mg_L": "crp c-reactive protein inflammation infection",
+    "Procalcitonin_ng_mL": "procalcitonin bacterial infection",
+    "D_Dimer_mg_L": "d-dimer clot thrombosis",
+    "Cardiovascular_Risk_Score": "cardiovascular heart risk score",
+    "Adjusted_Cardiovascular_Risk": "cardiovascular heart risk adjusted",
+    "Metabolic_Syndrome_Flags": "metabolic syndrome",
+    "Infection_Severity": "infection severity inflammation",
+    "Liver_Injury_Flag": "liver injury",
+    "Kidney_Risk_Stage": "kidney stage ckd renal",
+    "TC_HDL_Ratio": "cholesterol hdl ratio",
+}
+
+
+# Health words beyond the field and topic vocabularies that make a question
+# on-topic for the report chat. Only words that are about health on their own:
+# "high", "value" or "fast" would let "How high is Mount Everest?" through.
+HEALTH_TERMS = (
+    "health healthy nutrition exercise medicine medication doctor clinician symptom symptoms fatigue fever "
+    "supplement deficiency lifestyle alcohol smoking diabetes cholesterol"
+)
+
+# Words of the field and topic vocabularies that are everyday English, not
+# health terms; they stay searchable but do not put a question on-topic.
+GENERIC_TERMS = (
+    "good bad high low total ratio score stage count cell white adjusted function stores volume packed "
+    "protection reference range lowering rich work before seek care guidance up"
+)
+
+
+def _stem(token: str) -> str:
+    # light plural folding: "triglycerides" ~ "triglyceride", "platelets" ~ "platelet"
+    if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list:
+    return [_stem(t) for t in _TOKEN_RE.findall(str(text).lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a list of chunks ({"text", "source", ...}). The index is
+    an inverted list per term (chunk ids + term frequencies as numpy arrays);
+    a query touches only the postings of its own terms.
+    """
+
+    def __init__(self, chunks, k1: float = BM25_K1, b: float = BM25_B):
+        self.chunks = list(chunks)
+        self.k1, self.b = k1, b
+        docs = [tokenize(c.get("index_text", c["text"])) for c in self.chunks]
+        self.doc_len = np.array([len(d) for d in docs], dtype=np.float64)
+        self.avg_len = float(self.doc_len.mean()) if len(docs) else 0.0
+        postings = {}
+        for i, d in enumerate(docs):
+            for term, tf in Counter(d).items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(i)
+                postings[term][1].append(tf)
+        n = len(docs)
+        self._postings = {}
+        for term, (ids, tfs) in postings.items():
+            idf = np.log(1.0 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            self._postings[term] = (np.array(ids, dtype=np.int32), np.array(tfs, dtype=np.float64), idf)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @property
+    def vocabulary(self):
+        return self._postings.keys()
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.chunks))
+        if not self.chunks:
+            return scores
+        norm = self.k1 * (1.0 - self.b + self.b * self.doc_len / max(self.avg_len, 1e-9))
+        for term in set(tokenize(query)):
+            hit = self._postings.get(term)
+            if hit is None:
+                continue
+            ids, tf, idf = hit
+            scores[ids] += idf * tf * (self.k1 + 1.0) / (tf + norm[ids])
+        return scores
+
+    def search(self, query: str, k: int = 4) -> list:
+        """Top-k chunks with a positive score, best first, each with its "score"."""
+        scores = self.scores(query)
+        if not len(scores):
+            return []
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [{**self.chunks[i], "score": float(scores[i])} for i in top if scores[i] > 0]
+
+
+# ----------------------
+# Chunk sources
+# ----------------------
+def load_guidelines(path: str = GUIDELINES_PATH) -> list:
+    """Bundled guideline snippets as chunks; [] if the file is missing."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as fh:
+        items = json.load(fh)
+    return [{"text": f"{it['topic']}: {it['text']}", "source": "guideline", "topic": it["topic"]} for it in items]
+
+
+_UNIT_SUFFIXES = [("_mL_min_1_73m2", " (mL/min/1.73m2)"), ("_cells_uL", " (cells/uL)"), ("_lakh_uL", " (lakh/uL)"),
+                  ("_g_dL", " (g/dL)"), ("_mg_dL", " (mg/dL)"), ("_ug_dL", " (ug/dL)"), ("_ng_mL", " (ng/mL)"),
+                  ("_pg_mL", " (pg/mL)"), ("_mg_L", " (mg/L)"), ("_U_L", " (U/L)"), ("_percent", " (%)")]
+
+
+def _field_label(field: str) -> str:
+    """'LDL_mg_dL' -> 'LDL (mg/dL)'."""
+    for suffix, unit in _UNIT_SUFFIXES:
+        if field.endswith(suffix):
+            return field[: -len(suffix)].replace("_", " ") + unit
+    return field.replace("_", " ")
+
+
+def _is_missing(v) -> bool:
+    if v is None:
+        return True
+    if isinstance(v, float) and np.isnan(v):
+        return True
+    return isinstance(v, str) and not v.strip()
+
+
+def report_chunks(row: dict) -> list:
+    """
+    One chunk per report fact: each parsed value or score (with its lay
+    terms for matching), the findings, the out-of-range summary and each
+    structured recommendation.
+    """
+    chunks = []
+    for field, terms in FIELD_TERMS.items():
+        v = row.get(field)
+        if _is_missing(v):
+            continue
+        text = f"{_field_label(field)}: {v}"
+        chunks.append({"text": text, "index_text": f"{text} {terms}", "source": "report", "field": field})
+    for field, label in (("Findings_Paragraph", "Findings"), ("Out_Of_Range", "Outside reference range"),
+                         ("Suspected_Diseases", "Identified conditions"), ("Overall_Severity", "Overall severity"),
+                         ("Units_Converted", "Units converted"), ("Low_Confidence_Fields", "Low OCR confidence")):
+        if not _is_missing(row.get(field)):
+            chunks.append({"text": f"{label}: {row[field]}", "source": "report", "field": field})
+    for r in row.get("Recommendations_Structured") or []:
+        finding = r.get("finding_text") or r.get("finding") or ""
+        rec = r.get("recommendation") or r.get("recommendation_text") or ""
+        if finding or rec:
+            chunks.append({"text": f"Recommendation for {finding}: {rec}".strip(), "source": "recommendation"})
+    return chunks
+
+
+class ChatRetriever:
+    """
+    Top-k context for the report chat: a report index (built per report and
+    cached with it) searched together with the shared guideline index.
+    """
+
+    def __init__(self, guidelines: BM25Index = None):
+        self.guidelines = guidelines if guidelines is not None else BM25Index(load_guidelines())
+        topics = " ".join(c.get("topic", "") for c in self.guidelines.chunks)
+        generic = set(tokenize(GENERIC_TERMS))
+        terms = tokenize(" ".join(FIELD_TERMS.values()) + " " + topics + " " + HEALTH_TERMS)
+        # single letters ("vitamin d", "c-reactive") match every other question
+        self.guard_terms = frozenset(t for t in terms if len(t) > 1 and t not in generic)
+
+    def report_index(self, row: dict) -> BM25Index:
+        return BM25Index(report_chunks(row))
+
+    def retrieve(self, question: str, report_index: BM25Index, k_report: int = 5, k_guidelines: int = 3) -> dict:
+        return {
+            "report": report_index.search(question, k_report) if report_index is not None else [],
+            "guidelines": self.guidelines.search(question, k_guidelines),
+        }
+
+    def vocabulary_hit(self, question: str) -> bool:
+        """Does the question use a health term (lab field lay terms, guideline topics, HEALTH_TERMS)?"""
+        return any(t in self.guard_terms for t in tokenize(question))
+
+
+def format_context(hits: dict) -> tuple:
+    """(report context, guideline context) as bullet lists for the prompt."""
+    report = "\n".join(f"- {h['text']}" for h in hits.get("report", [])) or "- (no matching report values)"
+    guide = "\n".join(f"- {h['text']}" for h in hits.get("guidelines", [])) or "- (none)"
+    return report, guide
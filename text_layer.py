@@ -0,0 +1,92 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+# ----------------------
+# PDF text-layer fast path
+# ----------------------
+# Most lab PDFs are generated digitally and already carry their text. Reading
+# it with poppler's pdftotext (the same poppler install pdf2image renders
+# with) takes milliseconds per page; rasterizing and running tesseract takes
+# seconds. Pages whose text layer is missing or unusable (scans, text drawn as
+# curves, broken font encodings) are left to OCR. So are hybrid pages, a
+# digital letterhead over a scanned table: their text layer is clean but holds
+# no lab values, so a page must show analyte labels with values to skip OCR.
+
+MIN_TEXT_CHARS = 40       # fewer non-space characters: treat the page as a scan
+MIN_CLEAN_RATIO = 0.85    # share of characters that are printable and not U+FFFD
+MIN_LAB_VALUES = 2        # analytes with a "label ... value" line in the text layer
+PDFTOTEXT_TIMEOUT = 30
+_value_patterns = None
+
+
+def _lab_value_patterns() -> list:
+    """Per analyte, parse_parameters' label-value regexes, compiled on first use."""
+    global _value_patterns
+    if _value_patterns is None:
+        from model_engine import NUMERIC_LABELS, numeric_pattern
+        _value_patterns = [[re.compile(numeric_pattern(label), re.IGNORECASE) for label in labels]
+                           for labels in NUMERIC_LABELS.values()]
+    return _value_patterns
+
+
+def lab_value_count(text: str) -> int:
+    """Number of analytes the parser would find a value for in `text`."""
+    return sum(any(p.search(text) for p in patterns) for patterns in _lab_value_patterns())
+
+
+def usable_text(text: str, min_chars: int = MIN_TEXT_CHARS, min_clean: float = MIN_CLEAN_RATIO,
+                min_values: int = MIN_LAB_VALUES) -> bool:
+    """A page's text layer is worth using instead of OCR: enough characters, mostly clean, lab values on it."""
+    if not text:
+        return False
+    chars = [c for c in text if not c.isspace()]
+    if len(chars) < min_chars:
+        return False
+    clean = sum(1 for c in chars if c.isprintable() and c != "\ufffd")
+    return clean / len(chars) >= min_clean and lab_value_count(text) >= min_values
+
+
+def read_text_layer(data: bytes) -> list:
+    """
+    Text layer of every page, one pdftotext call (-layout keeps a label and
+    its value on one line; pages come separated by form feeds). Returns a
+    list of page texts, or None when pdftotext is not installed or fails,
+    so callers simply fall back to OCR.
+    """
+    exe = shutil.which("pdftotext")
+    if exe is None:
+        return None
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        proc = subprocess.run([exe, "-layout", "-enc", "UTF-8", path, "-"], capture_output=True,
+                              timeout=PDFTOTEXT_TIMEOUT)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    finally:
+        os.remove(path)
+    if proc.returncode != 0:
+        return None
+    chunks = proc.stdout.decode("utf-8", errors="replace").split("\f")
+    if chunks and not chunks[-1].strip():
+        chunks.pop()  # form feed after the last page
+    return chunks
+
+
+def split_pages(data: bytes, page_range=None):
+    """
+    Decide per page between the text layer and OCR. Returns (selected pages,
+    {page: text} for pages with a usable text layer, [pages that need OCR]),
+    or None when the text layer could not be read at all.
+    """
+    from rasterize import parse_page_range
+    layer = read_text_layer(data)
+    if layer is None:
+        return None
+    selected = parse_page_range(page_range, len(layer))
+    text_pages = {p: layer[p - 1] for p in selected if usable_text(layer[p - 1])}
+    return selected, text_pages, [p for p in selected if p not in text_pages]
@@ -0,0 +1,281 @@
+import re
+import json
+
+import numpy as np
+import pandas as pd
+
+from model_engine import NUMERIC_LABELS, numeric_pattern
+
+# ----------------------
+# Conversion tables
+# ----------------------
+# For every field model_engine scores, the factors that bring a detected unit
+# to the field's canonical unit (the one in its name): canonical = value * scale + offset.
+CONVERSIONS = {
+    "Hemoglobin_g_dL": {"g/dL": (1.0, 0.0), "g/L": (0.1, 0.0), "mmol/L": (1.611, 0.0)},
+    "WBC_cells_uL": {"cells/uL": (1.0, 0.0), "10^3/uL": (1000.0, 0.0), "lakh/uL": (1e5, 0.0)},
+    "Platelets_lakh_uL": {"lakh/uL": (1.0, 0.0), "10^3/uL": (0.01, 0.0), "cells/uL": (1e-5, 0.0)},
+    "Hematocrit_percent": {"%": (1.0, 0.0), "L/L": (100.0, 0.0)},
+    "Serum_Iron_ug_dL": {"ug/dL": (1.0, 0.0), "umol/L": (5.585, 0.0)},
+    "Serum_Ferritin_ng_mL": {"ng/mL": (1.0, 0.0), "ug/L": (1.0, 0.0), "pmol/L": (0.445, 0.0)},
+    "Vitamin_B12_pg_mL": {"pg/mL": (1.0, 0.0), "ng/L": (1.0, 0.0), "pmol/L": (1.355, 0.0)},
+    "Folate_ng_mL": {"ng/mL": (1.0, 0.0), "ug/L": (1.0, 0.0), "nmol/L": (0.4413, 0.0)},
+    "Vitamin_D_ng_mL": {"ng/mL": (1.0, 0.0), "nmol/L": (0.4006, 0.0)},
+    "ALT_U_L": {"U/L": (1.0, 0.0)},
+    "AST_U_L": {"U/L": (1.0, 0.0)},
+    "Total_Bilirubin_mg_dL": {"mg/dL": (1.0, 0.0), "umol/L": (1 / 17.1, 0.0)},
+    "Serum_Creatinine_mg_dL": {"mg/dL": (1.0, 0.0), "umol/L": (1 / 88.42, 0.0)},
+    "Total_Cholesterol_mg_dL": {"mg/dL": (1.0, 0.0), "mmol/L": (38.67, 0.0)},
+    "LDL_mg_dL": {"mg/dL": (1.0, 0.0), "mmol/L": (38.67, 0.0)},
+    "HDL_mg_dL": {"mg/dL": (1.0, 0.0), "mmol/L": (38.67, 0.0)},
+    "Triglycerides_mg_dL": {"mg/dL": (1.0, 0.0), "mmol/L": (88.57, 0.0)},
+    "Fasting_Glucose_mg_dL": {"mg/dL": (1.0, 0.0), "mmol/L": (18.016, 0.0)},
+    "HbA1c_percent": {"%": (1.0, 0.0), "mmol/mol": (0.09148, 2.152)},
+    "CRP_mg_L": {"mg/L": (1.0, 0.0), "mg/dL": (10.0, 0.0)},
+    "Procalcitonin_ng_mL": {"ng/mL": (1.0, 0.0), "ug/L": (1.0, 0.0)},
+    "D_Dimer_mg_L": {"mg/L": (1.0, 0.0), "ug/mL": (1.0, 0.0), "ng/mL": (0.001, 0.0)},
+}
+
+# Physiologically possible range of each field in its canonical unit,
+# critical values included. A value printed without a recognisable unit is
+# only ever reinterpreted when it is impossible in the canonical unit: then the
+# alternative units are tried in table order and the first that lands inside
+# the range is used (e.g. Platelets 250 -> 10^3/uL, Hemoglobin 135 -> g/L).
+# A critical reading such as Creatinine 25 or Glucose 15 is kept as printed;
+# an impossible value no unit explains is kept too and reported as ambiguous.
+PLAUSIBLE = {
+    "Hemoglobin_g_dL": (1.0, 25.0),
+    "WBC_cells_uL": (50.0, 500000.0),
+    "Platelets_lakh_uL": (0.01, 20.0),
+    "Hematocrit_percent": (5.0, 80.0),
+    "Total_Bilirubin_mg_dL": (0.05, 50.0),
+    "Serum_Creatinine_mg_dL": (0.1, 40.0),
+    "Total_Cholesterol_mg_dL": (20.0, 1500.0),
+    "Fasting_Glucose_mg_dL": (10.0, 2000.0),
+    "HbA1c_percent": (3.0, 20.0),
+}
+
+# Unit spellings found on Indian and international lab reports, matched
+# against the lower-cased, space-free text right after a value. Order matters:
+# longer / more specific spellings first.
+UNIT_PATTERNS = [
+    (r"la(kh|c)s?/(ul|cumm|mm3)", "lakh/uL"),
+    (r"(x)?10(\^|\*|e)?3/(ul|cumm|mm3)|(x)?10(\^|\*|e)?9/l|k/ul|thou(sand)?s?/(ul|cumm)", "10^3/uL"),
+    (r"(cells)?/(ul|cumm|mm3)", "cells/uL"),
+    (r"mmol/mol", "mmol/mol"),
+    (r"mmol/l", "mmol/L"),
+    (r"umol/l", "umol/L"),
+    (r"nmol/l", "nmol/L"),
+    (r"pmol/l", "pmol/L"),
+    (r"mg/dl|mg%", "mg/dL"),
+    (r"mg/l", "mg/L"),
+    (r"(g|gm|gms)/dl|gm?%", "g/dL"),
+    (r"(g|gm)/l", "g/L"),
+    (r"(ug|mcg)/dl", "ug/dL"),
+    (r"(ug|mcg)/ml", "ug/mL"),
+    (r"(ug|mcg)/l", "ug/L"),
+    (r"ng/ml", "ng/mL"),
+    (r"ng/l", "ng/L"),
+    (r"pg/ml", "pg/mL"),
+    (r"i?u/l", "U/L"),
+    (r"l/l", "L/L"),
+    (r"%", "%"),
+]
+_UNIT_RE = [(re.compile(p), unit) for p, unit in UNIT_PATTERNS]
+_FLAG_RE = re.compile(r"^\s*[\(\[]?\s*(h|l|high|low|\*+)?\s*[\)\]]?\s+(?=\S)", re.IGNORECASE)
+
+
+def normalize_unit(token: str):
+    """Map a raw unit spelling to a key of CONVERSIONS, or None."""
+    if not token:
+        return None
+    t = token.replace("µ", "u").replace("μ", "u").replace("³", "3").lower()
+    t = re.sub(r"\s+", "", t)
+    t = t.replace("cu.mm", "cumm").replace("cmm", "cumm").replace("mcl", "ul").lstrip("([:-")
+    for rx, unit in _UNIT_RE:
+        if rx.match(t):
+            return unit
+    return None
+
+
+def detect_units(text: str, fields=None) -> dict:
+    """
+    Find the unit printed next to each field's value in OCR text, using the
+    same label variants and first match as model_engine.parse_parameters.
+    Returns {field: unit or None}.
+    """
+    out = {}
+    for field in fields or NUMERIC_LABELS:
+        unit = None
+        for label in NUMERIC_LABELS.get(field, []):
+            m = re.search(numeric_pattern(label), text, re.IGNORECASE)
+            if m:
+                tail = _FLAG_RE.sub("", m.group("tail"), count=1)
+                unit = normalize_unit(tail) or normalize_unit(m.group("gap").strip(" :-"))
+                break
+        out[field] = unit
+    return out
+
+
+# ----------------------
+# Per-lab unit profiles
+# ----------------------
+class UnitProfiles:
+    """
+    Default units per laboratory, for reports that print units only in a
+    column header (or not at all). Lookup is one dict access per field; lab
+    detection is a single pass of one compiled alternation over the report header.
+    """
+
+    def __init__(self, profiles: dict = None):
+        self._profiles = {}
+        self._lab_re = None
+        for lab, units in (profiles or {}).items():
+            self.add(lab, units)
+
+    @classmethod
+    def load(cls, path: str):
+        """JSON file: {"Lab name": {"Field_name": "unit", ...}, ...}"""
+        with open(path, "r", encoding="utf-8") as fh:
+            return cls(json.load(fh))
+
+    def add(self, lab: str, units: dict):
+        self._profiles[lab.lower()] = {f: normalize_unit(u) or u for f, u in units.items()}
+        names = sorted(self._profiles, key=len, reverse=True)
+        self._lab_re = re.compile("|".join(re.escape(n) for n in names), re.IGNORECASE)
+
+    def detect_lab(self, text: str, header_chars: int = 600):
+        if self._lab_re is None or not text:
+            return None
+        m = self._lab_re.search(text[:header_chars])
+        return m.group(0).lower() if m else None
+
+    def units_for(self, lab) -> dict:
+        return self._profiles.get(lab.lower(), {}) if lab else {}
+
+
+# ----------------------
+# Vectorized normalization
+# ----------------------
+def _infer_units(field: str, values: np.ndarray, units: np.ndarray) -> np.ndarray:
+    """Fill unknown units from value magnitude (see PLAUSIBLE); None where no unit explains the value."""
+    rng = PLAUSIBLE.get(field)
+    canonical = next(iter(CONVERSIONS[field]))
+    unknown = pd.isna(units) & ~np.isnan(values)
+    if rng is None or not unknown.any():
+        units = units.copy()
+        units[unknown] = canonical
+        return units
+    lo, hi = rng
+    units = units.copy()
+    pending = unknown & ((values < lo) | (values > hi))
+    units[unknown & ~pending] = canonical
+    for unit, (scale, offset) in list(CONVERSIONS[field].items())[1:]:
+        conv = values * scale + offset
+        hit = pending & (conv >= lo) & (conv <= hi)
+        units[hit] = unit
+        pending &= ~hit
+    # nothing plausible: the value stays as printed, with the unit left unresolved
+    return units
+
+
+def rescales(field: str, unit) -> bool:
+    """Does `unit` change the value of `field` (not the canonical unit or an identity alias such as ug/L)?"""
+    return CONVERSIONS[field].get(unit, (1.0, 0.0)) != (1.0, 0.0)
+
+
+def ambiguous(values: np.ndarray, resolved: np.ndarray) -> np.ndarray:
+    """Rows whose value is present but whose unit could not be resolved (normalize_column output)."""
+    return pd.isna(resolved) & ~np.isnan(values)
+
+
+def normalize_column(field: str, values, units) -> tuple:
+    """
+    Convert one field to its canonical unit. `values` is array-like numeric,
+    `units` array-like of unit keys / None. Returns (converted values, resolved units).
+    A unit this field has no conversion for (e.g. "%" next to Hemoglobin) is
+    treated as undetected, so magnitude inference decides. A resolved unit of
+    None next to a value marks it ambiguous (see ambiguous); the value is kept.
+    Unit -> (scale, offset) lookup is done once per distinct unit, then applied
+    as a single multiply-add over the column.
+    """
+    values = np.asarray(pd.to_numeric(pd.Series(values), errors="coerce"), dtype=np.float64)
+    units = np.asarray(units, dtype=object).copy()
+    known = CONVERSIONS[field]
+    units[[u not in known for u in units]] = None
+    units = _infer_units(field, values, units)
+    codes, uniques = pd.factorize(units, use_na_sentinel=True)
+    table = np.array([CONVERSIONS[field].get(u, (1.0, 0.0)) for u in uniques] + [(1.0, 0.0)], dtype=np.float64)
+    factors = table[codes]  # code -1 (missing) picks the identity row appended last
+    return values * factors[:, 0] + factors[:, 1], units
+
+
+def normalize_frame(df: pd.DataFrame, units: pd.DataFrame = None, profile: dict = None) -> pd.DataFrame:
+    """
+    Normalize every convertible column of a parsed cohort. `units` holds the
+    detected unit per row and field (e.g. pd.DataFrame(detect_units(t) for t in texts));
+    `profile` supplies a default unit per field where none was detected.
+    Adds a `Units_Converted` column listing the fields that were rescaled (non-identity factor),
+    and appends fields whose unit is ambiguous (kept unconverted) to `Low_Confidence_Fields`.
+    """
+    df = df.copy()
+    converted = [[] for _ in range(len(df))]
+    unclear = [[] for _ in range(len(df))]
+    for field in CONVERSIONS:
+        if field not in df.columns:
+            continue
+        if units is not None and field in units.columns:
+            u = units[field].to_numpy(dtype=object)
+        else:
+            u = np.full(len(df), None, dtype=object)
+        if profile and profile.get(field):
+            u = np.where(pd.isna(u), profile[field], u)
+        df[field], resolved = normalize_column(field, df[field].to_numpy(), u)
+        for i in np.flatnonzero([rescales(field, r) for r in resolved]):
+            converted[i].append(f"{field} ({resolved[i]})")
+        for i in np.flatnonzero(ambiguous(df[field].to_numpy(dtype=np.float64), resolved)):
+            unclear[i].append(f"{field} (unit unclear)")
+    df["Units_Converted"] = [", ".join(c) for c in converted]
+    if any(unclear):
+        previous = df["Low_Confidence_Fields"] if "Low_Confidence_Fields" in df.columns else [""] * len(df)
+        df["Low_Confidence_Fields"] = [", ".join(([p] if isinstance(p, str) and p else []) + u)
+                                       for p, u in zip(previous, unclear)]
+    return df
+
+
+def normalize_batch(parsed: list, texts: list, profiles: UnitProfiles = None) -> list:
+    """
+    Batch entry point (the pipeline's validate stage): per report, detect units
+    in its text and fill the rest from its lab profile, then convert the whole
+    batch with one normalize_frame pass. Returns new dicts, one per report.
+    """
+    if not parsed:
+        return []
+    units = []
+    for p, text in zip(parsed, texts):
+        fields = [f for f in CONVERSIONS if f in p]
+        detected = detect_units(text, fields) if text else {}
+        profile = profiles.units_for(profiles.detect_lab(text)) if profiles is not None else {}
+        units.append({f: detected.get(f) or profile.get(f) for f in fields})
+    frame = normalize_frame(pd.DataFrame(parsed), pd.DataFrame(units))
+    columns = {f: frame[f].to_numpy(dtype=np.float64) for f in CONVERSIONS if f in frame.columns}
+    converted = frame["Units_Converted"].tolist()
+    low = frame["Low_Confidence_Fields"].tolist() if "Low_Confidence_Fields" in frame.columns else [None] * len(frame)
+    out = []
+    for i, p in enumerate(parsed):
+        row = dict(p)
+        row.update({f: float(col[i]) for f, col in columns.items() if f in p})
+        row["Units_Converted"] = converted[i]
+        if isinstance(low[i], str) and ("Low_Confidence_Fields" in p or low[i]):
+            row["Low_Confidence_Fields"] = low[i]
+        out.append(row)
+    return out
+
+
+def normalize_units(parsed: dict, text: str = "", profiles: UnitProfiles = None) -> dict:
+    """
+    Single-report entry point: detect units in `text`, fall back to the
+    matching lab profile, convert in place of the parsed values.
+    Returns a new dict; `Units_Converted` lists what was rescaled.
+    """
+    return normalize_batch([parsed], [text], profiles)[0]